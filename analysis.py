@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+from audio_io import open_audio
+from audio_tools import LoudnessMeter, librosa, report_progress, to_db
+from render_cache import content_hash
+
+# single-pass file analysis. the file is decoded once, in blocks, and every feature is gathered
+# from the same pass: levels and loudness, clipping, silence, stereo correlation, the long-term
+# spectrum and, from one shared STFT, the onset envelope the tempo is estimated from.
+# results are stored in SQLite by content hash, so an unchanged file is only analyzed once.
+ANALYSIS_DB_FILE = "analysis.db"
+ANALYSIS_VERSION = 1  # bump when features change so older results are recomputed
+
+ANALYSIS_BLOCK_FRAMES = 1 << 18
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+CLIP_LEVEL = 0.999
+SILENCE_THRESHOLD_DB = -40.0
+SILENCE_WINDOW_MS = 10.0
+MIN_SILENCE_MS = 1000.0
+ROLLOFF_FRACTION = 0.85
+BANDS = (("low", 0.0, 250.0), ("mid", 250.0, 4000.0), ("high", 4000.0, None))
+
+
+def finite_or_none(value):
+    return float(value) if value is not None and np.isfinite(value) else None
+
+
+# computes every feature for a file. progress is called with the fraction decoded.
+def analyze_audio(file_path, progress=None):
+    with open_audio(file_path) as source:
+        sample_rate, channels, total = source.sample_rate, source.channels, source.frames
+        meter = LoudnessMeter(sample_rate, channels)
+        window = np.hanning(N_FFT + 1)[:-1]
+        mel_basis = librosa.filters.mel(sr=sample_rate, n_fft=N_FFT, n_mels=N_MELS)
+        silence_window = max(1, int(sample_rate * SILENCE_WINDOW_MS / 1000.0))
+        silence_floor = 10 ** (SILENCE_THRESHOLD_DB / 20.0)
+
+        spectrum_sum = np.zeros(N_FFT // 2 + 1)
+        onset = []
+        previous_mel = None
+        pending = np.zeros(N_FFT // 2)  # centred frames, as librosa pads
+        silence_pending = np.zeros((0, channels))
+        silent_windows = []
+        clipped = 0
+        cross = np.zeros(3)  # sum of L*R, L*L, R*R
+        done = 0
+
+        def add_frames(samples):
+            nonlocal previous_mel
+            count = (len(samples) - N_FFT) // HOP_LENGTH + 1
+            if count <= 0:
+                return samples
+            frames = np.lib.stride_tricks.sliding_window_view(samples, N_FFT)[::HOP_LENGTH][:count]
+            power = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2
+            spectrum_sum[:] += power.sum(axis=0)
+            mel_db = 10 * np.log10(np.maximum(power @ mel_basis.T, 1e-10))
+            if previous_mel is not None:
+                mel_db_with_previous = np.vstack((previous_mel, mel_db))
+            else:
+                mel_db_with_previous = np.vstack((mel_db[:1], mel_db))
+            onset.append(np.maximum(0.0, np.diff(mel_db_with_previous, axis=0)).mean(axis=1))
+            previous_mel = mel_db[-1:]
+            return samples[count * HOP_LENGTH:]
+
+        for _, block in source.blocks(ANALYSIS_BLOCK_FRAMES):
+            done += len(block)
+
+            meter.add(block)
+            clipped += int(np.count_nonzero(np.abs(block) >= CLIP_LEVEL))
+            if channels >= 2:
+                left, right = block[:, 0], block[:, 1]
+                cross += (np.dot(left, right), np.dot(left, left), np.dot(right, right))
+
+            silence_pending = np.concatenate((silence_pending, block))
+            whole = len(silence_pending) // silence_window
+            if whole:
+                windows = silence_pending[:whole * silence_window].reshape(whole, silence_window, channels)
+                rms = np.sqrt(np.einsum('ijk,ijk->ik', windows, windows) / silence_window)
+                silent_windows.append(np.all(rms < silence_floor, axis=1))
+                silence_pending = silence_pending[whole * silence_window:]
+
+            pending = add_frames(np.concatenate((pending, block.mean(axis=1))))
+            report_progress(progress, 0.9 * done / max(1, total))
+
+        add_frames(np.concatenate((pending, np.zeros(N_FFT // 2))))
+        meter.finish()
+
+    levels = meter.results()
+    frequencies = np.fft.rfftfreq(N_FFT, 1.0 / sample_rate)
+    spectrum_total = spectrum_sum.sum()
+    results = {
+        "duration": done / sample_rate,
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "peak_dbfs": finite_or_none(to_db(levels["peak"])),
+        "true_peak_dbtp": finite_or_none(to_db(levels["true_peak"])),
+        "rms_dbfs": finite_or_none(to_db(levels["rms"])),
+        "lufs": finite_or_none(levels["lufs"]),
+        "crest_db": finite_or_none(to_db(levels["peak"]) - to_db(levels["rms"])) if levels["rms"] > 0 else None,
+        "clipped_samples": clipped,
+        "silence_ratio": silence_ratio(np.concatenate(silent_windows) if silent_windows else np.zeros(0, bool),
+                                       silence_window, sample_rate),
+        "stereo_correlation": (finite_or_none(cross[0] / np.sqrt(cross[1] * cross[2]))
+                               if channels >= 2 and cross[1] > 0 and cross[2] > 0 else None),
+        "spectral_centroid_hz": None,
+        "rolloff_hz": None,
+        "band_balance": None,
+        "bpm": None,
+    }
+    if spectrum_total > 0:
+        results["spectral_centroid_hz"] = float(np.dot(frequencies, spectrum_sum) / spectrum_total)
+        cumulative = np.cumsum(spectrum_sum)
+        results["rolloff_hz"] = float(frequencies[np.searchsorted(cumulative, ROLLOFF_FRACTION * spectrum_total)])
+        results["band_balance"] = {
+            name: float(spectrum_sum[(frequencies >= low) & (frequencies < (high or np.inf))].sum() / spectrum_total)
+            for name, low, high in BANDS}
+
+    envelope = np.concatenate(onset) if onset else np.zeros(0)
+    results["bpm"] = tempo_from_onsets(envelope, sample_rate)
+    report_progress(progress, 1.0)
+    return results
+
+
+# the share of the file inside silent runs at least MIN_SILENCE_MS long
+def silence_ratio(silent, window, sample_rate):
+    if not len(silent):
+        return 0.0
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    lengths = ends - starts
+    minimum = MIN_SILENCE_MS / 1000.0 * sample_rate / window
+    return float(lengths[lengths >= minimum].sum() / len(silent))
+
+
+def tempo_from_onsets(envelope, sample_rate):
+    if len(envelope) < 2 or not np.any(envelope):
+        return None
+    tempo, _ = librosa.beat.beat_track(onset_envelope=envelope, sr=sample_rate, hop_length=HOP_LENGTH)
+    tempo = tempo.item() if isinstance(tempo, np.ndarray) else tempo
+    return finite_or_none(tempo) or None
+
+
+def create_analysis_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analyses (
+            hash TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            file_name TEXT NOT NULL,
+            analyzed_at TEXT NOT NULL,
+            results TEXT NOT NULL,
+            PRIMARY KEY (hash, version)
+        )
+    ''')
+
+
+# the analysis of a file, computed on the first request and read from the database afterwards
+def analyze_file(file_path, progress=None, db_file=ANALYSIS_DB_FILE):
+    file_hash = content_hash(file_path, db_file)
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        create_analysis_table(conn)
+        row = conn.execute("SELECT results FROM analyses WHERE hash = ? AND version = ?",
+                           (file_hash, ANALYSIS_VERSION)).fetchone()
+    finally:
+        conn.close()
+    if row is not None:
+        return json.loads(row[0])
+
+    results = analyze_audio(file_path, progress)
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        create_analysis_table(conn)
+        conn.execute("INSERT OR REPLACE INTO analyses (hash, version, file_name, analyzed_at, results) "
+                     "VALUES (?, ?, ?, ?, ?)", (file_hash, ANALYSIS_VERSION, os.path.basename(file_path),
+                                                time.strftime("%Y-%m-%d %H:%M:%S"), json.dumps(results)))
+        conn.commit()
+    finally:
+        conn.close()
+    return results
+
+
+# readable lines for the AI summary
+def describe_analysis(results):
+    def level(value, unit):
+        return f"{value:.1f} {unit}" if value is not None else "silent"
+
+    lines = [
+        f"Duration: {results['duration']:.1f} s, {results['sample_rate']} Hz, {results['channels']} channel(s)",
+        f"Sample peak: {level(results['peak_dbfs'], 'dBFS')}, true peak: {level(results['true_peak_dbtp'], 'dBTP')}",
+        f"RMS: {level(results['rms_dbfs'], 'dBFS')}, integrated loudness: {level(results['lufs'], 'LUFS')}",
+    ]
+    if results["crest_db"] is not None:
+        lines.append(f"Crest factor: {results['crest_db']:.1f} dB")
+    lines.append(f"Clipped samples: {results['clipped_samples']}")
+    lines.append(f"Silence: {results['silence_ratio'] * 100:.1f}% of the file is in pauses of "
+                 f"{MIN_SILENCE_MS / 1000:g} s or more")
+    if results["stereo_correlation"] is not None:
+        lines.append(f"Stereo correlation: {results['stereo_correlation']:.2f} (1 = mono, 0 = wide, <0 = out of phase)")
+    if results["band_balance"] is not None:
+        balance = results["band_balance"]
+        lines.append(f"Spectral balance: low (<250 Hz) {balance['low'] * 100:.0f}%, mid {balance['mid'] * 100:.0f}%, "
+                     f"high (>4 kHz) {balance['high'] * 100:.0f}% of the energy")
+        lines.append(f"Spectral centroid: {results['spectral_centroid_hz']:.0f} Hz, "
+                     f"85% rolloff: {results['rolloff_hz']:.0f} Hz")
+    if results["bpm"] is not None:
+        lines.append(f"Estimated tempo: {results['bpm']:.1f} BPM")
+    return lines
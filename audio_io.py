@@ -0,0 +1,248 @@
+import os
+import struct
+import threading
+import numpy as np
+import soundfile as sf
+import instrumentation
+
+# the one way audio is read and written. AudioBuffer opens a file and hands out any frame range
+# as float frames x channels, scaled the way soundfile scales (PCM / 2^(bits-1), so every bit
+# depth reads the same). PCM and float WAVs are memory-mapped and only the requested frames are
+# converted; other formats (FLAC, OGG, ...) are decoded by soundfile. AudioWriter writes blocks
+# of the same layout. both count their bytes and samples for instrumentation.
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+# finds the fmt and data chunks of a RIFF/WAVE file.
+# returns (fmt chunk bytes, data offset, data size in bytes, bytes per frame)
+def read_wav_layout(file_path):
+    with open(file_path, "rb") as wav_file:
+        header = wav_file.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            raise ValueError("not a RIFF/WAVE file")
+
+        fmt = None
+        while True:
+            chunk_header = wav_file.read(8)
+            if len(chunk_header) < 8:
+                raise ValueError("WAV file has no data chunk")
+            chunk_id, size = struct.unpack("<4sI", chunk_header)
+            if chunk_id == b"fmt ":
+                fmt = wav_file.read(size)
+                wav_file.seek(size & 1, 1)
+            elif chunk_id == b"data":
+                data_offset = wav_file.tell()
+                break
+            else:
+                wav_file.seek(size + (size & 1), 1)
+
+    if fmt is None:
+        raise ValueError("WAV file has no fmt chunk")
+    block_align = struct.unpack("<H", fmt[12:14])[0]
+    # some writers leave the data size unset, so never trust it past the end of the file
+    data_size = min(size, os.path.getsize(file_path) - data_offset)
+    return fmt, data_offset, data_size - data_size % block_align, block_align
+
+
+def write_wav_header(wav_file, fmt, data_size):
+    fmt_padding = len(fmt) & 1
+    riff_size = 4 + 8 + len(fmt) + fmt_padding + 8 + data_size + (data_size & 1)
+    wav_file.write(struct.pack("<4sI4s", b"RIFF", riff_size, b"WAVE"))
+    wav_file.write(struct.pack("<4sI", b"fmt ", len(fmt)) + fmt + b"\0" * fmt_padding)
+    wav_file.write(struct.pack("<4sI", b"data", data_size))
+
+
+# the sample encoding of a WAV fmt chunk as ("pcm" or "float", bits), or None if it is
+# something else (ADPCM, mu-law, ...) that has to go through soundfile
+def wav_sample_format(fmt):
+    format_tag, _, _, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        format_tag = struct.unpack("<H", fmt[24:26])[0]
+    if format_tag == WAVE_FORMAT_PCM and bits in (8, 16, 24, 32):
+        return "pcm", bits
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        return "float", bits
+    return None
+
+
+# processing precision. "float64" is the reference; "float32" halves the memory and bandwidth of
+# every buffer, converts straight from the file's samples to float32, and dithers when the result
+# is written to an integer format (see AudioWriter).
+PRECISIONS = {"float64": np.float64, "float32": np.float32}
+DEFAULT_PRECISION = "float64"
+
+# integer subtypes and their bits, for dithering
+PCM_SUBTYPE_BITS = {"PCM_S8": 8, "PCM_U8": 8, "PCM_16": 16, "PCM_24": 24}
+DITHER_SEED = 0  # dither noise is seeded, so the same input and settings write the same file
+
+# how close float32 has to stay to float64: every audio_tools chain operation below, run on the
+# same buffer in both precisions, may differ by at most PRECISION_BOUND_DB dBFS, far under the
+# 16-bit noise floor (about -96 dB) and the dither added when float32 results are written as 16 or
+# 24-bit PCM. checked by tests/test_precision.py and benchmark.py --check-precision.
+PRECISION_BOUND_DB = -120.0
+PRECISION_CHECKS = (
+    ("remove_silence", {"fade_ms": 5.0}),
+    ("equalize", {}),
+    ("equalize", {"bands": [{"frequency": 30, "gain": 12.0, "q": 4.0}]}),
+    ("bass_boost", {}),
+    ("reverb", {}),
+    ("reverb", {"mode": "convolution"}),
+    ("normalize", {"mode": "lufs"}),
+    ("reverse", {}),
+    ("trim", {"start_seconds": 1.0}),
+)
+
+
+def precision_dtype(precision):
+    if precision not in PRECISIONS:
+        raise ValueError(f"unknown precision '{precision}' (choose from {', '.join(PRECISIONS)})")
+    return PRECISIONS[precision]
+
+
+class AudioBuffer:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        info = sf.info(file_path)
+        self.sample_rate = info.samplerate
+        self.channels = info.channels
+        self.frames = info.frames
+        self.subtype = info.subtype
+        self.format = info.format
+        self._samples = None  # memory map of a WAV's data chunk
+        self._encoding = None
+        self._source = None  # soundfile decoder for everything else
+        self._lock = threading.Lock()
+        self._bytes_per_frame = os.path.getsize(file_path) / max(1, self.frames)
+        if info.format not in ("WAV", "WAVEX") or not self._map_wav():
+            self._source = sf.SoundFile(file_path)
+
+    def _map_wav(self):
+        try:
+            fmt, offset, size, block_align = read_wav_layout(self.file_path)
+        except ValueError:
+            return False
+        encoding = wav_sample_format(fmt)
+        if encoding is None or block_align != self.channels * encoding[1] // 8:
+            return False
+        self._encoding = encoding
+        self.frames = size // block_align
+        self._bytes_per_frame = block_align
+        kind, bits = encoding
+        if not self.frames:
+            self._samples = np.zeros((0, self.channels, 3) if bits == 24 else (0, self.channels), dtype=np.uint8)
+        elif bits == 24:
+            self._samples = np.memmap(self.file_path, dtype=np.uint8, mode="r", offset=offset,
+                                      shape=(self.frames, self.channels, 3))
+        else:
+            dtype = {8: "u1", 16: "<i2", 32: "<i4"}[bits] if kind == "pcm" else f"<f{bits // 8}"
+            self._samples = np.memmap(self.file_path, dtype=dtype, mode="r", offset=offset,
+                                      shape=(self.frames, self.channels))
+        return True
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate
+
+    def __len__(self):
+        return self.frames
+
+    # frames [start, stop) as frames x channels of dtype (float64 or float32)
+    def read(self, start=0, stop=None, dtype=np.float64):
+        stop = self.frames if stop is None else min(stop, self.frames)
+        start = max(0, min(start, stop))
+        with instrumentation.stage("decode"):
+            if self._samples is not None:
+                data = self._convert(self._samples[start:stop], dtype)
+            else:
+                with self._lock:
+                    self._source.seek(start)
+                    data = self._source.read(stop - start, dtype=np.dtype(dtype).name, always_2d=True)
+        instrumentation.count(bytes_read=int((stop - start) * self._bytes_per_frame), samples=data.size)
+        return data
+
+    def __getitem__(self, frames):
+        if not isinstance(frames, slice) or frames.step not in (None, 1):
+            raise TypeError("audio buffers are indexed by frame ranges, e.g. audio[start:stop]")
+        start, stop, _ = frames.indices(self.frames)
+        return self.read(start, stop)
+
+    # up to 24 bits every sample converts to float32 exactly; only 32-bit PCM loses its low bits
+    def _convert(self, raw, dtype=np.float64):
+        kind, bits = self._encoding
+        if kind == "float":
+            return raw.astype(dtype)
+        if bits == 8:
+            return (raw.astype(dtype) - 128.0) / 128.0
+        if bits == 24:
+            raw = raw.astype(np.int32)
+            raw = (raw[:, :, 0] | (raw[:, :, 1] << 8) | (raw[:, :, 2] << 16)) << 8 >> 8
+        return raw.astype(dtype) / float(1 << (bits - 1))
+
+    # yields (start frame, block) for consecutive blocks of block_size frames
+    def blocks(self, block_size, start=0, stop=None, dtype=np.float64):
+        stop = self.frames if stop is None else min(stop, self.frames)
+        for block_start in range(start, stop, block_size):
+            yield block_start, self.read(block_start, min(stop, block_start + block_size), dtype)
+
+    def close(self):
+        self._samples = None
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_audio(file_path):
+    return AudioBuffer(file_path)
+
+
+# writes frames x channels float blocks. subtype (e.g. "PCM_24", "FLOAT") defaults to
+# soundfile's default for the format, 16-bit PCM for WAV.
+# dither=True adds TPDF dither (two uniform noises of one LSB each, summed) before samples are
+# rounded to an 8, 16 or 24-bit integer format, which turns the rounding error into a constant,
+# signal-independent noise floor instead of distortion. float and 32-bit formats are not dithered.
+class AudioWriter:
+    def __init__(self, file_path, sample_rate, channels, subtype=None, format=None, dither=False):
+        self.file_path = file_path
+        self._file = sf.SoundFile(file_path, "w", sample_rate, channels, subtype=subtype, format=format)
+        bits = PCM_SUBTYPE_BITS.get(self._file.subtype)
+        self._lsb = 1.0 / (1 << (bits - 1)) if dither and bits else None
+        self._rng = np.random.default_rng(DITHER_SEED)
+
+    def write(self, block):
+        with instrumentation.stage("encode"):
+            if self._lsb is not None and len(block):
+                dtype = block.dtype if block.dtype == np.float32 else np.float64
+                noise = self._rng.random(block.shape, dtype=dtype) - self._rng.random(block.shape, dtype=dtype)
+                block = np.clip(block + noise * self._lsb, -1.0, 1.0)
+            self._file.write(block)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            instrumentation.count(bytes_written=os.path.getsize(self.file_path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_audio(file_path, dtype=np.float64):
+    with open_audio(file_path) as audio:
+        return audio.read(dtype=dtype), audio.sample_rate
+
+
+def write_audio(file_path, data, sample_rate, subtype=None, dither=False):
+    with AudioWriter(file_path, sample_rate, data.shape[1] if data.ndim > 1 else 1, subtype,
+                     dither=dither) as writer:
+        writer.write(data)
@@ -1,75 +1,747 @@
-import warnings
-
-warnings.filterwarnings("ignore", message="Couldn't find ffmpeg or avconv*", category=RuntimeWarning)
-from pydub import AudioSegment
-import librosa
+import copy
+import functools
 import numpy as np
-import scipy.io.wavfile as wavfile
 import soundfile as sf
-import scipy.signal as signal
-import wave
+import os
+import struct
 import threading
-import time
-import simpleaudio as sa
+from concurrent.futures import ThreadPoolExecutor
+import instrumentation
+import tempo
+from audio_io import AudioWriter, open_audio, read_audio, write_audio, read_wav_layout, write_wav_header, \
+    wav_sample_format, precision_dtype, DEFAULT_PRECISION
+from lazy_imports import LazyModule
+
+# heavy modules load the first time an operation uses them, not when the GUI starts
+librosa = LazyModule("librosa")
+signal = LazyModule("scipy.signal")
+ndimage = LazyModule("scipy.ndimage")
+
+# modules worth importing in the background once the window is up
+WARM_UP_MODULES = ("scipy.signal", "librosa", "sounddevice")
 
 
 # this file contains the code for all audio operations.
+# every operation has an in-memory version (*_buffer) working on float frames x channels
+# arrays, and a file version that decodes, calls it and encodes the result.
+# all decoding and encoding goes through audio_io (open_audio / AudioWriter).
+# precision="float32" reads, processes and writes float32 buffers instead of float64, with dither
+# when the output is an integer format. buffer functions keep the dtype they are given.
+
+
+# streaming mode: files are read, processed and written block_size frames at a time,
+# so peak memory depends on the block size instead of the file length
+DEFAULT_BLOCK_SIZE = 65536
+LARGE_FILE_BYTES = 256 * 1024 * 1024
+
+
+# calls an optional progress callback. progress callbacks are also where a background job
+# gets the chance to cancel, so long operations call this between stages.
+def report_progress(progress, fraction):
+    if progress is not None:
+        progress(fraction)
+
+
+# picks streaming for files too large to comfortably decode at once
+def auto_block_size(file_path):
+    return DEFAULT_BLOCK_SIZE if os.path.getsize(file_path) > LARGE_FILE_BYTES else None
+
+
+# parallel mode: scipy's filters and numpy's FFTs and ufuncs release the GIL, so a thread pool
+# spreads one operation over several cores. workers=None runs serially, 0 uses every core.
+# filters with feedback (EQ, bass boost, echo) can only be split by channel; convolution, gain,
+# reverse and level analysis also cut long material into time segments.
+PARALLEL_MIN_FRAMES = 1 << 17  # shorter buffers are not worth cutting into segments
+
+_worker_pools = {}
+_worker_pools_lock = threading.Lock()
+
+
+def resolve_workers(workers):
+    if workers is None:
+        return 1
+    return max(1, int(workers) or os.cpu_count() or 1)
+
+
+# one shared pool per size, so repeated operations don't keep starting threads
+def worker_pool(workers):
+    with _worker_pools_lock:
+        if workers not in _worker_pools:
+            _worker_pools[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dsp")
+        return _worker_pools[workers]
+
+
+# like map(), on the worker pool. tasks must not submit more work to the pool themselves.
+def parallel_map(function, items, workers):
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+    return list(worker_pool(workers).map(function, items))
+
+
+# splits the channels into at most `workers` contiguous groups, as slices
+def channel_groups(channels, workers):
+    parts = np.array_split(np.arange(channels), max(1, min(channels, workers)))
+    return [slice(int(part[0]), int(part[-1]) + 1) for part in parts if len(part)]
+
+
+# cuts frames into about `count` (start, stop) segments whose boundaries are multiples of align
+def segment_bounds(frames, count, align=1):
+    if frames < PARALLEL_MIN_FRAMES:
+        count = 1
+    step = -(-frames // max(1, count))
+    step = max(align, -(-step // align) * align)
+    return [(start, min(frames, start + step)) for start in range(0, frames, step)] or [(0, 0)]
+
+
+# runs function(index, block[:, groups[index]]) for every channel group on the pool and joins
+# the outputs back into one frames x channels block. stateful processors keep a state per group.
+def map_channel_groups(function, block, groups, workers):
+    if len(groups) == 1:
+        return function(0, block)
+    outputs = parallel_map(lambda index: function(index, block[:, groups[index]]), range(len(groups)), workers)
+    return np.concatenate(outputs, axis=1)
+
+
+# writes function(data[start:stop]) into the matching rows of a new array, segment by segment.
+# only for operations where every frame is independent of its neighbours (gain, clipping).
+def map_segments(function, data, workers):
+    output = np.empty_like(data)
+
+    def run(bounds):
+        start, stop = bounds
+        output[start:stop] = function(data[start:stop])
+
+    parallel_map(run, segment_bounds(len(data), workers), workers)
+    return output
+
+
+# recursive filters lose too much in float32 at low frequencies (a narrow 30 Hz band is off by about
+# -64 dB), so float32 blocks are filtered in float64 FILTER_CHUNK_FRAMES at a time and stored back
+# as float32: the buffers stay half size and the recursion keeps float64 accuracy.
+FILTER_CHUNK_FRAMES = 16384
+
+
+def sosfilt_chunked(sos, block, state):
+    if block.dtype == np.float64:
+        return signal.sosfilt(sos, block, axis=0, zi=state)
+    output = np.empty_like(block)
+    for start in range(0, len(block), FILTER_CHUNK_FRAMES):
+        stop = start + FILTER_CHUNK_FRAMES
+        output[start:stop], state = signal.sosfilt(sos, block[start:stop], axis=0, zi=state)
+    return output, state
+
+
+# make_processor(sample_rate, channels) returns (process, flush). process maps an input
+# block to an output block and carries its own filter state between calls; flush (or None)
+# returns any frames still owed after the input ends, such as a reverb tail.
+# progress, if given, is called with the fraction of the file done after every block.
+def stream_audio(input_file, output_file, make_processor, block_size=DEFAULT_BLOCK_SIZE, progress=None,
+                 subtype=None, precision=DEFAULT_PRECISION):
+    dtype = precision_dtype(precision)
+    with open_audio(input_file) as source:
+        process, flush = make_processor(source.sample_rate, source.channels)
+        with AudioWriter(output_file, source.sample_rate, source.channels, subtype,
+                         dither=dtype != np.float64) as destination:
+            for start, block in source.blocks(block_size, dtype=dtype):
+                destination.write(process(block))
+                if progress is not None:
+                    progress((start + len(block)) / max(1, source.frames))
+            if flush is not None:
+                destination.write(flush())
+
+
+# detects the selected audio files bpm. the fast estimate from tempo.py is used unless its
+# confidence is low, then the whole file is beat tracked at its native rate.
+def detect_bpm(file_path, progress=None):
+    estimate = tempo.estimate_tempo(file_path, progress)
+    if estimate["bpm"] is not None and estimate["confidence"] >= tempo.MIN_CONFIDENCE:
+        return f"Detected BPM: {estimate['bpm']:.2f}"
+    with open_audio(file_path) as audio:
+        y, sr = audio.read().mean(axis=1), audio.sample_rate
+    bpm, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
+    bpm = bpm.item() if isinstance(bpm, np.ndarray) else bpm
+    return f"Detected BPM: {bpm:.2f}"
+
+
+# K-weighting pre-filter from ITU-R BS.1770, designed for any sample rate.
+# stage 1 is a high shelf modelling the head, stage 2 the RLB high-pass.
+@functools.lru_cache(maxsize=16)
+def k_weighting_sos(sample_rate):
+    K = np.tan(np.pi * 1681.974450955533 / sample_rate)
+    Q = 0.7071752369554196
+    Vh = 10 ** (3.999843853973347 / 20.0)
+    Vb = Vh ** 0.4996667741545416
+    a0 = 1 + K / Q + K * K
+    shelf = [(Vh + Vb * K / Q + K * K) / a0, 2 * (K * K - Vh) / a0, (Vh - Vb * K / Q + K * K) / a0,
+             1.0, 2 * (K * K - 1) / a0, (1 - K / Q + K * K) / a0]
+
+    K = np.tan(np.pi * 38.13547087602444 / sample_rate)
+    Q = 0.5003270373238773
+    a0 = 1 + K / Q + K * K
+    high_pass = [1.0, -2.0, 1.0, 1.0, 2 * (K * K - 1) / a0, (1 - K / Q + K * K) / a0]
+
+    sos = np.array([shelf, high_pass])
+    sos.setflags(write=False)
+    return sos
+
+
+# BS.1770 channel weights: surrounds count 1.41, the LFE of a 5.1 file is left out
+def loudness_channel_weights(channels):
+    if channels == 5:
+        return np.array([1.0, 1.0, 1.0, 1.41, 1.41])
+    if channels == 6:
+        return np.array([1.0, 1.0, 1.0, 0.0, 1.41, 1.41])
+    return np.ones(channels)
+
+
+TRUE_PEAK_OVERSAMPLING = 4
+TRUE_PEAK_CONTEXT = 64  # frames of context on each side when oversampling a block
+
+
+# measures sample peak, RMS, true peak (4x oversampled) and integrated loudness (LUFS, with the
+# BS.1770 absolute and relative gates) from blocks fed to add(). only 100 ms energy totals are
+# kept, so a whole file can be measured in bounded memory. call finish() once after the last block.
+# oversample=False skips the true-peak measurement (the parallel path measures it separately).
+class LoudnessMeter:
+    def __init__(self, sample_rate, channels, oversample=True):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.oversample = oversample
+        self.sos = k_weighting_sos(sample_rate).copy()
+        self.filter_state = np.zeros((self.sos.shape[0], 2, channels))
+        self.step = max(1, int(round(0.1 * sample_rate)))
+
+        self.step_energies = []
+        self.partial_energy = np.zeros(channels)
+        self.partial_frames = 0
+
+        self.peak = 0.0
+        self.true_peak = 0.0
+        self.sum_squares = 0.0
+        self.frames = 0
+        # frames still waiting for true-peak measurement, with the context before them
+        self.true_peak_buffer = np.zeros((TRUE_PEAK_CONTEXT, channels))
+
+    def add(self, block):
+        if not len(block):
+            return
+        self.frames += len(block)
+        self.peak = max(self.peak, float(np.max(np.abs(block))))
+        self.sum_squares += float(np.einsum('ij,ij->', block, block, dtype=np.float64))
+
+        weighted, self.filter_state = sosfilt_chunked(self.sos, block, self.filter_state)
+        squared = weighted * weighted
+
+        # complete the 100 ms step left open by the previous block, then whole steps, then keep the rest
+        need = self.step - self.partial_frames
+        if len(squared) < need:
+            self.partial_energy += squared.sum(axis=0)
+            self.partial_frames += len(squared)
+        else:
+            self.step_energies.append(self.partial_energy + squared[:need].sum(axis=0))
+            rest = squared[need:]
+            whole = len(rest) // self.step
+            if whole:
+                self.step_energies.extend(rest[:whole * self.step].reshape(whole, self.step, -1).sum(axis=1))
+            self.partial_energy = rest[whole * self.step:].sum(axis=0)
+            self.partial_frames = len(rest) - whole * self.step
+
+        if self.oversample:
+            self._measure_true_peak(np.concatenate((self.true_peak_buffer.astype(block.dtype, copy=False), block)))
+
+    # oversamples everything but the last TRUE_PEAK_CONTEXT frames, which wait for the next block
+    def _measure_true_peak(self, buffered):
+        context = TRUE_PEAK_CONTEXT
+        if len(buffered) < 3 * context:
+            self.true_peak_buffer = buffered
+            return
+        factor = TRUE_PEAK_OVERSAMPLING
+        upsampled = signal.resample_poly(buffered, factor, 1, axis=0)
+        measured = upsampled[context * factor:(len(buffered) - context) * factor]
+        self.true_peak = max(self.true_peak, float(np.max(np.abs(measured))))
+        self.true_peak_buffer = buffered[-2 * context:]
+
+    def finish(self):
+        tail = np.concatenate((self.true_peak_buffer, np.zeros((TRUE_PEAK_CONTEXT, self.channels))))
+        if self.oversample and len(tail) > 2 * TRUE_PEAK_CONTEXT:
+            factor = TRUE_PEAK_OVERSAMPLING
+            upsampled = signal.resample_poly(tail, factor, 1, axis=0)
+            measured = upsampled[TRUE_PEAK_CONTEXT * factor:(len(tail) - TRUE_PEAK_CONTEXT) * factor]
+            self.true_peak = max(self.true_peak, float(np.max(np.abs(measured))))
+        self.true_peak = max(self.true_peak, self.peak)
+        if self.partial_frames:
+            self.step_energies.append(self.partial_energy)
+            self.partial_frames = 0
+
+    def integrated_loudness(self):
+        if not self.step_energies:
+            return float("-inf")
+        steps = np.array(self.step_energies)
+        # 400 ms gating blocks with 75% overlap are four consecutive 100 ms steps
+        if len(steps) >= 4:
+            cumulative = np.concatenate((np.zeros((1, self.channels)), np.cumsum(steps, axis=0)))
+            blocks = (cumulative[4:] - cumulative[:-4]) / (4 * self.step)
+        else:
+            blocks = steps.sum(axis=0, keepdims=True) / (len(steps) * self.step)
+        power = blocks @ loudness_channel_weights(self.channels)
+
+        with np.errstate(divide='ignore'):
+            block_loudness = -0.691 + 10 * np.log10(power)
+        gated = power[block_loudness > -70.0]
+        if not len(gated):
+            return float("-inf")
+        relative_gate = -0.691 + 10 * np.log10(np.mean(gated)) - 10.0
+        gated = power[(block_loudness > -70.0) & (block_loudness > relative_gate)]
+        if not len(gated):
+            return float("-inf")
+        return float(-0.691 + 10 * np.log10(np.mean(gated)))
+
+    def results(self):
+        rms = np.sqrt(self.sum_squares / max(1, self.frames * self.channels))
+        return {
+            "peak": self.peak,
+            "true_peak": self.true_peak,
+            "rms": float(rms),
+            "lufs": self.integrated_loudness(),
+        }
 
-# detects the selected audio files bpm
-def detect_bpm(file_path):
-    y, sr = librosa.load(file_path, sr=None)
-    tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
-    tempo = tempo.item() if isinstance(tempo, np.ndarray) else tempo
-    return f"Detected BPM: {tempo:.2f}"
 
+    # combines finished meters that each measured a group of channels of the same audio
+    @classmethod
+    def merge(cls, meters, sample_rate):
+        merged = cls(sample_rate, sum(meter.channels for meter in meters))
+        merged.frames = meters[0].frames
+        merged.step_energies = [np.concatenate(steps) for steps in zip(*(meter.step_energies for meter in meters))]
+        merged.peak = max(meter.peak for meter in meters)
+        merged.true_peak = max(meter.true_peak for meter in meters)
+        merged.sum_squares = sum(meter.sum_squares for meter in meters)
+        return merged
 
-# normalizes the selected audio file
-def normalize_audio(file_path, output_path, headroom=1.0):
-    audio = AudioSegment.from_wav(file_path)
-    normalized_audio = audio.normalize(headroom=headroom)
-    normalized_audio.export(output_path, format="wav")
-    return f"Normalized audio saved to {output_path}"
 
+# the largest 4x oversampled value of frames start to stop, with zeros beyond the buffer's ends
+# (as LoudnessMeter assumes), so segments measured separately agree with one pass
+def segment_true_peak(data, start, stop):
+    if stop <= start:
+        return 0.0
+    context = TRUE_PEAK_CONTEXT
+    low, high = max(0, start - context), min(len(data), stop + context)
+    buffered = np.zeros((stop - start + 2 * context, data.shape[1]))
+    buffered[context - (start - low):context + (high - start)] = data[low:high]
+    factor = TRUE_PEAK_OVERSAMPLING
+    upsampled = signal.resample_poly(buffered, factor, 1, axis=0)
+    return float(np.max(np.abs(upsampled[context * factor:(context + stop - start) * factor])))
 
-# removes silence from the selected audio file
-def remove_silence(input_file, output_file, threshold=-40.0, min_silence_len=1000):
+
+# workers splits the K-weighting by channel group and the true-peak oversampling by time segment
+def measure_loudness(data, sample_rate, workers=None):
+    workers = resolve_workers(workers)
+    if workers == 1:
+        meter = LoudnessMeter(sample_rate, data.shape[1])
+        meter.add(data)
+        meter.finish()
+        return meter.results()
+
+    def measure_group(group):
+        meter = LoudnessMeter(sample_rate, group.stop - group.start, oversample=False)
+        meter.add(data[:, group])
+        meter.finish()
+        return meter
+
+    groups = channel_groups(data.shape[1], workers)
+    tasks = [functools.partial(measure_group, group) for group in groups]
+    tasks += [functools.partial(segment_true_peak, data, start, stop)
+              for start, stop in segment_bounds(len(data), workers)]
+    results = parallel_map(lambda task: task(), tasks, workers)
+
+    meter = LoudnessMeter.merge(results[:len(groups)], sample_rate)
+    meter.true_peak = max([meter.peak] + results[len(groups):])
+    return meter.results()
+
+
+def to_db(level):
+    return 20 * np.log10(level) if level > 0 else float("-inf")
+
+
+# lookahead true-peak limiter. every frame gets the gain that keeps its 4x oversampled peak (the
+# same detector LoudnessMeter uses) under the ceiling; the gain curve is the minimum of those over
+# LIMITER_RELEASE_SECONDS behind to LIMITER_LOOKAHEAD_SECONDS ahead, smoothed over half the
+# lookahead, so it has already ramped down when a peak arrives and never exceeds what any frame
+# needs. all channels share one gain curve, which keeps the stereo image.
+LIMITER_LOOKAHEAD_SECONDS = 0.005
+LIMITER_RELEASE_SECONDS = 0.05
+LIMITER_MARGIN_DB = 0.05  # room for the interpolation and rounding of the written file
+LIMITER_BLOCK_FRAMES = 65536
+
+
+# a streaming processor like the others: process(block) returns the limited frames delayed by
+# self.delay, flush() returns the rest, so the output is as long as the input
+class TruePeakLimiter:
+    def __init__(self, sample_rate, channels, ceiling_db):
+        self.ceiling = 10 ** ((ceiling_db - LIMITER_MARGIN_DB) / 20.0)
+        self.lookahead = max(2, int(round(LIMITER_LOOKAHEAD_SECONDS * sample_rate)))
+        self.release = max(self.lookahead, int(round(LIMITER_RELEASE_SECONDS * sample_rate)))
+        self.smooth = self.lookahead // 2
+        # frames before and after a frame that its gain depends on, including the detector's context
+        self.behind = TRUE_PEAK_CONTEXT + self.release + self.smooth
+        self.ahead = TRUE_PEAK_CONTEXT + self.lookahead + self.smooth
+        self.delay = self.ahead
+        self.channels = channels
+        # silence before the start of the input
+        self.buffer = np.zeros((self.behind, channels))
+
+    # gains of buffered frames behind to len - ahead
+    def _gains(self, buffered):
+        factor = TRUE_PEAK_OVERSAMPLING
+        upsampled = np.abs(signal.resample_poly(buffered, factor, 1, axis=0)).max(axis=1)
+        peaks = np.maximum(upsampled.reshape(len(buffered), factor).max(axis=1), np.abs(buffered).max(axis=1))
+        # in float64 whatever the block's dtype: the running sum below spans the whole block
+        needed = np.minimum(1.0, self.ceiling / np.maximum(peaks.astype(np.float64), 1e-12))
+        # window [n - release, n + lookahead]
+        size = self.release + self.lookahead + 1
+        held = ndimage.minimum_filter1d(needed, size, origin=self.release - size // 2)
+        cumulative = np.concatenate(([0.0], np.cumsum(held)))
+        width = 2 * self.smooth + 1
+        start, stop = self.behind, len(buffered) - self.ahead
+        return (cumulative[start + self.smooth + 1:stop + self.smooth + 1]
+                - cumulative[start - self.smooth:stop - self.smooth]) / width
+
+    def process(self, block):
+        buffered = np.concatenate((self.buffer.astype(block.dtype, copy=False), block))
+        stop = len(buffered) - self.ahead
+        if stop <= self.behind:
+            self.buffer = buffered
+            return block[:0]
+        gains = self._gains(buffered)
+        output = (buffered[self.behind:stop] * gains[:, None]).astype(block.dtype, copy=False)
+        self.buffer = buffered[stop - self.behind:]
+        return output
+
+    # the frames still held back, followed by silence so the lookahead reaches past the end
+    def flush(self):
+        return self.process(np.zeros((self.ahead, self.channels), dtype=self.buffer.dtype))
+
+
+# the limited copy of an in-memory buffer, LIMITER_BLOCK_FRAMES at a time so the oversampled
+# detector never holds more than one block
+def limit_buffer(data, sample_rate, ceiling_db):
+    limiter = TruePeakLimiter(sample_rate, data.shape[1], ceiling_db)
+    output = np.empty_like(data)
+    done = 0
+    for start in range(0, len(data), LIMITER_BLOCK_FRAMES):
+        limited = limiter.process(data[start:start + LIMITER_BLOCK_FRAMES])
+        output[done:done + len(limited)] = limited
+        done += len(limited)
+    output[done:] = limiter.flush()
+    return output
+
+
+# normalization targets: "peak" in dBFS sample peak (defaults to -headroom), "rms" in dBFS and
+# "lufs" in LUFS integrated loudness. with a true_peak_ceiling (dBTP) the gained audio goes through
+# TruePeakLimiter, so peaks the gain would push over the ceiling are limited instead of the gain
+# being lowered; it defaults to -1 dBTP for the rms and lufs modes.
+NORMALIZE_MODES = ("peak", "rms", "lufs")
+DEFAULT_NORMALIZE_TARGETS = {"rms": -20.0, "lufs": -14.0}
+DEFAULT_TRUE_PEAK_CEILING = -1.0
+
+# limiting lowers the level a little, so the gain is raised and the limited output measured again
+# until it is within NORMALIZE_TOLERANCE_DB of the target, at most NORMALIZE_LIMIT_PASSES times
+NORMALIZE_TOLERANCE_DB = 0.05
+NORMALIZE_LIMIT_PASSES = 6
+
+
+# the requested level (with the mode's default filled in) and the measured one, in the mode's unit
+def normalization_levels(stats, mode="peak", target=None, headroom=1.0):
+    if mode == "peak":
+        return (-headroom if target is None else target), to_db(stats["peak"])
+    if mode == "rms":
+        return (DEFAULT_NORMALIZE_TARGETS["rms"] if target is None else target), to_db(stats["rms"])
+    if mode == "lufs":
+        return (DEFAULT_NORMALIZE_TARGETS["lufs"] if target is None else target), stats["lufs"]
+    raise ValueError(f"unknown normalize mode '{mode}'")
+
+
+def resolve_ceiling(mode, true_peak_ceiling=None):
+    if mode != "peak" and true_peak_ceiling is None:
+        return DEFAULT_TRUE_PEAK_CEILING
+    return true_peak_ceiling
+
+
+# the gain that moves the measured level to the target, before any limiting
+def normalization_gain(stats, mode="peak", target=None, headroom=1.0):
+    target, level_db = normalization_levels(stats, mode, target, headroom)
+    # silence (or anything below the loudness gate) is left alone
+    if not np.isfinite(level_db):
+        return 1.0
+    # a python float, so multiplying a float32 buffer by it keeps float32
+    return float(10 ** ((target - level_db) / 20.0))
+
+
+# the gain to apply before the limiter and the stats of the output it gives. measure(gain) returns
+# the stats of the limited output at that gain; it is only called when the gain would push the true
+# peak over the ceiling; otherwise the limiter has nothing to do and the returned stats are None.
+def limited_normalization(stats, measure, mode="peak", target=None, true_peak_ceiling=None, headroom=1.0):
+    gain = normalization_gain(stats, mode, target, headroom)
+    ceiling = resolve_ceiling(mode, true_peak_ceiling)
+    if ceiling is None or to_db(stats["true_peak"] * gain) <= ceiling - LIMITER_MARGIN_DB:
+        return gain, None
+    target, _ = normalization_levels(stats, mode, target, headroom)
+    gain_db, previous = to_db(gain), None
+    for attempt in range(NORMALIZE_LIMIT_PASSES):
+        limited = measure(10 ** (gain_db / 20.0))
+        reached = normalization_levels(limited, mode, target, headroom)[1]
+        if abs(target - reached) <= NORMALIZE_TOLERANCE_DB or attempt == NORMALIZE_LIMIT_PASSES - 1:
+            break
+        # dB of level gained per dB of gain over the last step: the harder the limiter works, the less
+        # a dB of gain raises the level
+        slope = 1.0
+        if previous is not None:
+            slope = (reached - previous[1]) / (gain_db - previous[0])
+            # more gain no longer raises the level (a peak target above the ceiling)
+            if slope < 0.01:
+                break
+        previous = gain_db, reached
+        gain_db += (target - reached) / min(1.0, slope)
+    return float(10 ** (gain_db / 20.0)), limited
+
+
+# a warning when the limited output still missed the target, with the level actually reached; an
+# empty string when the target was met
+def normalization_shortfall(limited, mode="peak", target=None, true_peak_ceiling=None, headroom=1.0):
+    if limited is None:
+        return ""
+    target, reached = normalization_levels(limited, mode, target, headroom)
+    if not np.isfinite(reached) or abs(target - reached) <= 2 * NORMALIZE_TOLERANCE_DB:
+        return ""
+    unit = "LUFS" if mode == "lufs" else "dBFS"
+    ceiling = resolve_ceiling(mode, true_peak_ceiling)
+    return (f". Warning: with the {ceiling:g} dBTP true-peak ceiling the level reached {reached:.1f} {unit}, "
+            f"not the {target:g} {unit} target.")
+
+
+# the gained and, when a ceiling is given, limited copy of an in-memory buffer
+def normalized_buffer(data, sample_rate, gain, ceiling, workers=None):
+    if ceiling is None:
+        return apply_gain(data, gain, workers)
+    return np.clip(limit_buffer(data * gain, sample_rate, ceiling), -1.0, 1.0)
+
+
+# streaming version of normalized_buffer, for stream_audio
+def normalize_processor(sample_rate, channels, gain, ceiling):
+    if ceiling is None:
+        return lambda block: np.clip(block * gain, -1.0, 1.0), None
+    limiter = TruePeakLimiter(sample_rate, channels, ceiling)
+    return (lambda block: np.clip(limiter.process(block * gain), -1.0, 1.0),
+            lambda: np.clip(limiter.flush(), -1.0, 1.0))
+
+
+# loudness stats of blocks from a streaming source, measured in parallel by channel group
+def measure_blocks(blocks, sample_rate, channels, workers, progress=None):
+    groups = channel_groups(channels, workers)
+    meters = [LoudnessMeter(sample_rate, group.stop - group.start) for group in groups]
+    for fraction, block in blocks:
+        parallel_map(lambda index: meters[index].add(block[:, groups[index]]), range(len(groups)), workers)
+        report_progress(progress, fraction)
+    for meter in meters:
+        meter.finish()
+    return LoudnessMeter.merge(meters, sample_rate).results()
+
+
+# normalizes the selected audio file to a peak, RMS or LUFS target. with block_size set this is a
+# two-pass streaming job: pass one measures, pass two applies the gain, both in bounded memory.
+# when the gain needs limiting, the limited output is measured in extra passes before it is written.
+def normalize_audio(file_path, output_path, headroom=1.0, mode="peak", target=None, true_peak_ceiling=None,
+                    block_size=None, progress=None, workers=None, precision=DEFAULT_PRECISION):
     try:
-        sample_rate, data = wavfile.read(input_file)
-
-        if len(data.shape) == 1:
-            data = data[:, np.newaxis]
-
-        original_dtype = data.dtype
-        data = data.astype(np.float32) / np.iinfo(original_dtype).max
-
-        dBFS = 20 * np.log10(np.abs(data) + 1e-10)
-        silence_mask = dBFS < threshold
-        silence_mask = np.all(silence_mask, axis=1)
-
-        silence_indices = np.where(silence_mask)[0]
-        silence_segments = []
-        start = None
-        for i in range(len(silence_indices)):
-            if start is None:
-                start = silence_indices[i]
-            if i + 1 < len(silence_indices) and silence_indices[i + 1] - silence_indices[i] > 1:
-                end = silence_indices[i]
-                if (end - start + 1) * 1000 / sample_rate >= min_silence_len:
-                    silence_segments.append((start, end + 1))
-                start = None
-        if start is not None:
-            end = silence_indices[-1]
-            if (end - start + 1) * 1000 / sample_rate >= min_silence_len:
-                silence_segments.append((start, end + 1))
-
-        if silence_segments:
-            indices_to_remove = np.concatenate([np.arange(start, end) for start, end in silence_segments])
-            non_silent_data = np.delete(data, indices_to_remove, axis=0)
+        subtype = sf.info(file_path).subtype
+        dtype = precision_dtype(precision)
+        ceiling = resolve_ceiling(mode, true_peak_ceiling)
+        workers = resolve_workers(workers)
+        if block_size:
+            with open_audio(file_path) as source:
+                sample_rate, channels, frames = source.sample_rate, source.channels, source.frames
+
+            # (fraction done, block) pairs of one pass over the file, optionally through a processor
+            def read_pass(process=None, flush=None):
+                with open_audio(file_path) as source:
+                    for start, block in source.blocks(block_size, dtype=dtype):
+                        if process is not None:
+                            block = process(block)
+                        yield min(1.0, (start + len(block)) / max(1, frames)), block
+                if flush is not None:
+                    yield 1.0, flush()
+
+            # the limited output at a gain, measured without writing it (each pass reads the whole file)
+            def measure(gain):
+                return measure_blocks(read_pass(*normalize_processor(sample_rate, channels, gain, ceiling)),
+                                      sample_rate, channels, workers)
+
+            stats = measure_blocks(read_pass(), sample_rate, channels, workers,
+                                   None if progress is None else (lambda fraction: progress(0.4 * fraction)))
+            gain, limited = limited_normalization(stats, measure, mode, target, true_peak_ceiling, headroom)
+            ceiling = None if limited is None else ceiling
+            stage_progress = None if progress is None else (lambda fraction: progress(0.5 + 0.5 * fraction))
+            stream_audio(file_path, output_path,
+                         lambda sample_rate, channels: normalize_processor(sample_rate, channels, gain, ceiling),
+                         block_size, stage_progress, subtype=subtype, precision=precision)
         else:
-            non_silent_data = data
+            data, sample_rate = read_audio(file_path, dtype)
+            report_progress(progress, 0.3)
+            data, limited = normalize_limited(data, sample_rate, headroom, mode, target, true_peak_ceiling, workers)
+            report_progress(progress, 0.8)
+            write_audio(output_path, data, sample_rate, subtype=subtype, dither=dtype != np.float64)
+        return (f"Normalized audio saved to {output_path}"
+                + normalization_shortfall(limited, mode, target, true_peak_ceiling, headroom))
+
+    except Exception as e:
+        return f"Error normalizing audio: {str(e)}"
+
+
+# finds silent runs as (starts, ends) frame arrays. a frame is silent when the windowed RMS
+# of every channel is below threshold dBFS, and only runs of at least min_silence_len ms count.
+# read_frames(start, stop) returns frames x channels, so the same code scans an in-memory
+# buffer or a file on disk one block at a time (each block reads window/2 frames of context
+# on either side, so the envelope is the same however the file is split).
+def find_silent_runs(read_frames, frames, sample_rate, threshold=-40.0, min_silence_len=1000, window_ms=10.0,
+                     block_size=DEFAULT_BLOCK_SIZE, progress=None):
+    window = max(1, int(sample_rate * window_ms / 1000.0))
+    before = window // 2
+    after = window - 1 - before
+    power_threshold = 10 ** (threshold / 10.0)
+
+    starts, ends = [], []
+    open_start = None  # a silent run still running at the end of the previous block
+    for block_start in range(0, frames, block_size):
+        block_end = min(frames, block_start + block_size)
+        low = max(0, block_start - before)
+        high = min(frames, block_end + after)
+        # the running sum needs float64 whatever the buffer's precision; it is one block at a time
+        chunk = np.asarray(read_frames(low, high), dtype=np.float64)
+        chunk = np.pad(chunk, ((before - (block_start - low), after - (high - block_end)), (0, 0)))
+
+        # moving mean of the squared signal via a cumulative sum, loudest channel wins
+        cumulative = np.cumsum(chunk ** 2, axis=0)
+        cumulative = np.concatenate((np.zeros((1, chunk.shape[1])), cumulative))
+        power = (cumulative[window:] - cumulative[:-window]) / window
+        silent = np.all(power < power_threshold, axis=1)
+
+        edges = np.diff(np.concatenate(([0], silent.view(np.int8), [0])))
+        run_starts = np.flatnonzero(edges == 1) + block_start
+        run_ends = np.flatnonzero(edges == -1) + block_start
+
+        if open_start is not None:
+            if silent[0]:
+                run_starts[0] = open_start
+            else:
+                run_starts = np.concatenate(([open_start], run_starts))
+                run_ends = np.concatenate(([block_start], run_ends))
+            open_start = None
+        if silent[-1] and block_end < frames:
+            open_start = run_starts[-1]
+            run_starts, run_ends = run_starts[:-1], run_ends[:-1]
+
+        starts.append(run_starts)
+        ends.append(run_ends)
+        if progress is not None:
+            progress(block_end / frames)
+
+    if not starts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    starts = np.concatenate(starts)
+    ends = np.concatenate(ends)
+    long_enough = (ends - starts) * 1000 / sample_rate >= min_silence_len
+    return starts[long_enough], ends[long_enough]
+
+
+# shrinks each silent run by padding frames on both sides so a little silence is kept at the cut
+def pad_silent_runs(starts, ends, padding):
+    starts = starts + padding
+    ends = ends - padding
+    keep = ends > starts
+    return starts[keep], ends[keep]
+
+
+# for frames [start, stop) returns a keep mask (False inside silent runs) and a gain curve
+# that fades out over fade frames before every cut and back in after it
+def silence_cut_mask(starts, ends, start, stop, fade=0):
+    length = stop - start
+    first = np.searchsorted(ends, start, side='right')
+    last = np.searchsorted(starts, stop, side='left')
+    run_starts = np.clip(starts[first:last] - start, 0, length)
+    run_ends = np.clip(ends[first:last] - start, 0, length)
+
+    marks = np.zeros(length + 1, dtype=np.int64)
+    np.add.at(marks, run_starts, 1)
+    np.add.at(marks, run_ends, -1)
+    keep = np.cumsum(marks[:-1]) == 0
+
+    gain = np.ones(length)
+    if fade > 0:
+        first = np.searchsorted(ends, start - fade, side='right')
+        last = np.searchsorted(starts, stop + fade, side='left')
+        steps = np.arange(fade)
+        fade_out = (fade - steps) / (fade + 1.0)
+        fade_in = (steps + 1) / (fade + 1.0)
+        for positions, ramp in ((starts[first:last, np.newaxis] - fade + steps, fade_out),
+                                (ends[first:last, np.newaxis] + steps, fade_in)):
+            positions = positions - start
+            ramps = np.broadcast_to(ramp, positions.shape)
+            inside = (positions >= 0) & (positions < length)
+            np.minimum.at(gain, positions[inside], ramps[inside])
+
+    return keep, gain
+
+
+# removes silence from an in-memory buffer (float samples, frames x channels).
+# padding_ms keeps that much silence on each side of a cut, fade_ms fades in/out at the cut.
+def remove_silence_buffer(data, sample_rate, threshold=-40.0, min_silence_len=1000, window_ms=10.0,
+                          padding_ms=0.0, fade_ms=0.0):
+    starts, ends = find_silent_runs(lambda start, stop: data[start:stop], len(data), sample_rate, threshold,
+                                    min_silence_len, window_ms)
+    starts, ends = pad_silent_runs(starts, ends, int(sample_rate * padding_ms / 1000.0))
+    keep, gain = silence_cut_mask(starts, ends, 0, len(data), int(sample_rate * fade_ms / 1000.0))
+    return data[keep] * gain[keep, np.newaxis].astype(data.dtype, copy=False)
 
-        non_silent_data = (non_silent_data * np.iinfo(original_dtype).max).astype(original_dtype)
-        sf.write(output_file, non_silent_data, sample_rate)
+
+# two-pass streaming version: pass one finds the silent runs, pass two copies the kept frames
+def stream_remove_silence(input_file, output_file, threshold=-40.0, min_silence_len=1000, window_ms=10.0,
+                          padding_ms=0.0, fade_ms=0.0, block_size=DEFAULT_BLOCK_SIZE, progress=None,
+                          precision=DEFAULT_PRECISION):
+    dtype = precision_dtype(precision)
+    with open_audio(input_file) as source:
+        sample_rate = source.sample_rate
+        scan_progress = None if progress is None else (lambda fraction: progress(0.5 * fraction))
+        starts, ends = find_silent_runs(source.read, source.frames, sample_rate, threshold, min_silence_len,
+                                        window_ms, block_size, scan_progress)
+        starts, ends = pad_silent_runs(starts, ends, int(sample_rate * padding_ms / 1000.0))
+        fade = int(sample_rate * fade_ms / 1000.0)
+
+        with AudioWriter(output_file, sample_rate, source.channels, source.subtype,
+                         dither=dtype != np.float64) as destination:
+            for start, block in source.blocks(block_size, dtype=dtype):
+                keep, gain = silence_cut_mask(starts, ends, start, start + len(block), fade)
+                destination.write(block[keep] * gain[keep, np.newaxis].astype(dtype, copy=False))
+                if progress is not None:
+                    progress(0.5 + 0.5 * (start + len(block)) / source.frames)
+
+
+# removes silence from the selected audio file. works on 16/24/32-bit PCM and float WAVs
+# and keeps the input's sample format; block_size streams files larger than memory.
+def remove_silence(input_file, output_file, threshold=-40.0, min_silence_len=1000, window_ms=10.0,
+                   padding_ms=0.0, fade_ms=0.0, block_size=None, progress=None, precision=DEFAULT_PRECISION):
+    try:
+        dtype = precision_dtype(precision)
+        if block_size:
+            stream_remove_silence(input_file, output_file, threshold, min_silence_len, window_ms, padding_ms,
+                                  fade_ms, block_size, progress, precision)
+        else:
+            data, sample_rate = read_audio(input_file, dtype)
+            report_progress(progress, 0.3)
+            non_silent_data = remove_silence_buffer(data, sample_rate, threshold, min_silence_len, window_ms,
+                                                    padding_ms, fade_ms)
+            report_progress(progress, 0.8)
+            write_audio(output_file, non_silent_data, sample_rate, subtype=sf.info(input_file).subtype,
+                        dither=dtype != np.float64)
 
         return f"Silence removed and saved to {output_file}"
 
@@ -77,18 +749,46 @@ def remove_silence(input_file, output_file, threshold=-40.0, min_silence_len=100
         return f"Error removing silence: {str(e)}"
 
 
-# creates EQ for the user to interact with
-def design_biquad_filter(frequency, sample_rate, gain, q=1.0):
+# creates EQ for the user to interact with.
+# band_type is "peak" (the original bell), "low_shelf", "high_shelf" or "notch" (gain is ignored)
+def design_biquad_filter(frequency, sample_rate, gain, q=1.0, band_type="peak"):
     w0 = 2 * np.pi * frequency / sample_rate
     alpha = np.sin(w0) / (2 * q)
     A = 10 ** (gain / 40.0)
+    cos_w0 = np.cos(w0)
 
-    b0 = 1 + alpha * A
-    b1 = -2 * np.cos(w0)
-    b2 = 1 - alpha * A
-    a0 = 1 + alpha / A
-    a1 = -2 * np.cos(w0)
-    a2 = 1 - alpha / A
+    if band_type == "peak":
+        b0 = 1 + alpha * A
+        b1 = -2 * cos_w0
+        b2 = 1 - alpha * A
+        a0 = 1 + alpha / A
+        a1 = -2 * cos_w0
+        a2 = 1 - alpha / A
+    elif band_type == "low_shelf":
+        shelf = 2 * np.sqrt(A) * alpha
+        b0 = A * ((A + 1) - (A - 1) * cos_w0 + shelf)
+        b1 = 2 * A * ((A - 1) - (A + 1) * cos_w0)
+        b2 = A * ((A + 1) - (A - 1) * cos_w0 - shelf)
+        a0 = (A + 1) + (A - 1) * cos_w0 + shelf
+        a1 = -2 * ((A - 1) + (A + 1) * cos_w0)
+        a2 = (A + 1) + (A - 1) * cos_w0 - shelf
+    elif band_type == "high_shelf":
+        shelf = 2 * np.sqrt(A) * alpha
+        b0 = A * ((A + 1) + (A - 1) * cos_w0 + shelf)
+        b1 = -2 * A * ((A - 1) + (A + 1) * cos_w0)
+        b2 = A * ((A + 1) + (A - 1) * cos_w0 - shelf)
+        a0 = (A + 1) - (A - 1) * cos_w0 + shelf
+        a1 = 2 * ((A - 1) - (A + 1) * cos_w0)
+        a2 = (A + 1) - (A - 1) * cos_w0 - shelf
+    elif band_type == "notch":
+        b0 = 1
+        b1 = -2 * cos_w0
+        b2 = 1
+        a0 = 1 + alpha
+        a1 = -2 * cos_w0
+        a2 = 1 - alpha
+    else:
+        raise ValueError(f"unknown EQ band type '{band_type}'")
 
     b = np.array([b0, b1, b2]) / a0
     a = np.array([a0, a1, a2]) / a0
@@ -96,144 +796,620 @@ def design_biquad_filter(frequency, sample_rate, gain, q=1.0):
     return b, a
 
 
-def apply_equalizer(input_file, output_file, bands=None):
-    if bands is None:
-        # Default EQ settings: mild shaping
-        bands = [
-            {'frequency': 60, 'gain': 6.0},
-            {'frequency': 250, 'gain': -4.0},
-            {'frequency': 1000, 'gain': 5.0},
-            {'frequency': 4000, 'gain': -5.0},
-        ]
+EQ_BAND_TYPES = ("peak", "low_shelf", "high_shelf", "notch")
+
+
+# one second-order section per band design. designs are memoized because the same
+# (type, frequency, gain, Q, rate) bands are requested over and over from the EQ window.
+@functools.lru_cache(maxsize=512)
+def design_band_section(band_type, frequency, gain, q, sample_rate):
+    b, a = design_biquad_filter(frequency, sample_rate, gain, q, band_type)
+    section = np.concatenate((b, a))
+    section.setflags(write=False)
+    return section
+
+
+# compiles a list of bands into one SOS cascade. bands are dicts with 'frequency' and 'gain',
+# plus optional 'q' (default 1.0) and 'type' (default "peak")
+def design_eq_sos(bands, sample_rate):
+    if not bands:
+        return np.array([[1.0, 0.0, 0.0, 1.0, 0.0, 0.0]])
+    return np.vstack([
+        design_band_section(band.get('type', "peak"), float(band['frequency']), float(band['gain']),
+                            float(band.get('q', 1.0)), sample_rate)
+        for band in bands
+    ])
+
+
+# Default EQ settings: mild shaping
+DEFAULT_EQ_BANDS = [
+    {'frequency': 60, 'gain': 6.0},
+    {'frequency': 250, 'gain': -4.0},
+    {'frequency': 1000, 'gain': 5.0},
+    {'frequency': 4000, 'gain': -5.0},
+]
+
+
+# returns a stateful process(block) that runs the whole band cascade over all channels in
+# one sosfilt pass (one per channel group with workers). the filter state is carried between
+# calls, so blocks give the same result as one pass over the file.
+def equalizer_processor(bands, sample_rate, channels, workers=None):
+    sos = design_eq_sos(bands, sample_rate)
+    workers = resolve_workers(workers)
+    groups = channel_groups(channels, workers)
+    states = [np.zeros((sos.shape[0], 2, group.stop - group.start)) for group in groups]
+
+    def filter_group(index, part):
+        output, states[index] = sosfilt_chunked(sos, part, states[index])
+        return output
+
+    def process(block):
+        return map_channel_groups(filter_group, block, groups, workers)
+
+    return process
+
+
+# the equalizer for live preview. process(block) filters like equalizer_processor, and
+# set_bands(bands) may be called from another thread at any time: the new cascade takes over
+# between blocks, with the coefficients moved from the old to the new values in EQ_RAMP_STEP
+# frame steps over EQ_RAMP_SECONDS so the change doesn't click (zipper noise).
+# interpolating biquad coefficients is safe: a mix of two stable denominators is stable.
+EQ_RAMP_SECONDS = 0.05
+EQ_RAMP_STEP = 64
+IDENTITY_SECTION = np.array([1.0, 0.0, 0.0, 1.0, 0.0, 0.0])
+
+
+class LiveEqualizer:
+    def __init__(self, bands, sample_rate, channels):
+        self.sample_rate = sample_rate
+        self.sos = np.array(design_eq_sos(bands, sample_rate))
+        self.start = self.target = self.sos
+        self.state = np.zeros((len(self.sos), 2, channels))
+        self.ramp_frames = max(1, int(EQ_RAMP_SECONDS * sample_rate))
+        self.ramp_done = self.ramp_frames
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def set_bands(self, bands):
+        sos = design_eq_sos(bands, self.sample_rate)
+        with self._lock:
+            self._pending = sos
+
+    # bands added or removed are ramped in from (or out to) a pass-through section
+    def _begin_ramp(self, target):
+        sections = max(len(self.sos), len(target))
+        self.start = self._padded(self.sos, sections)
+        self.target = self._padded(target, sections)
+        self.state = np.concatenate((self.state, np.zeros((sections - len(self.state),) + self.state.shape[1:])))
+        self.ramp_done = 0
+
+    @staticmethod
+    def _padded(sos, sections):
+        return np.vstack([sos] + [IDENTITY_SECTION] * (sections - len(sos)))
+
+    def process(self, block):
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            self._begin_ramp(pending)
+
+        output = np.empty(block.shape)
+        position = 0
+        while position < len(block):
+            if self.ramp_done < self.ramp_frames:
+                step = min(EQ_RAMP_STEP, self.ramp_frames - self.ramp_done, len(block) - position)
+                self.ramp_done += step
+                if self.ramp_done == self.ramp_frames:
+                    self.sos = self.target
+                else:
+                    self.sos = self.start + (self.target - self.start) * (self.ramp_done / self.ramp_frames)
+            else:
+                step = len(block) - position
+                # pass-through sections left at the end by removed bands can go once their state has run out
+                while len(self.sos) > 1 and np.array_equal(self.sos[-1], IDENTITY_SECTION) and \
+                        not np.any(self.state[-1]):
+                    self.sos, self.state = self.sos[:-1], self.state[:-1]
+            part = block[position:position + step]
+            output[position:position + step], self.state = signal.sosfilt(self.sos, part, axis=0, zi=self.state)
+            position += step
+        return output
 
-    try:
-        data, sample_rate = sf.read(input_file)
 
-        if len(data.shape) == 1:
-            data = data[:, np.newaxis]
+def equalize_buffer(data, sample_rate, bands=None, workers=None):
+    if bands is None:
+        bands = DEFAULT_EQ_BANDS
+    return equalizer_processor(bands, sample_rate, data.shape[1], workers)(data)
+
 
-        for channel in range(data.shape[1]):
-            for band in bands:
-                b, a = design_biquad_filter(band['frequency'], sample_rate, band['gain'])
-                data[:, channel] = signal.lfilter(b, a, data[:, channel])
+# block_size streams the file instead of decoding it all at once
+def apply_equalizer(input_file, output_file, bands=None, block_size=None, progress=None, workers=None,
+                    precision=DEFAULT_PRECISION):
+    if bands is None:
+        bands = DEFAULT_EQ_BANDS
 
-        sf.write(output_file, data, sample_rate)
+    try:
+        dtype = precision_dtype(precision)
+        if block_size:
+            stream_audio(input_file, output_file,
+                         lambda sample_rate, channels: (
+                             equalizer_processor(bands, sample_rate, channels, workers), None),
+                         block_size, progress, precision=precision)
+        else:
+            data, sample_rate = read_audio(input_file, dtype)
+            report_progress(progress, 0.3)
+            data = equalize_buffer(data, sample_rate, bands, workers)
+            report_progress(progress, 0.8)
+            write_audio(output_file, data, sample_rate, dither=dtype != np.float64)
         return f"Equalized audio saved to {output_file}"
 
     except Exception as e:
         return f"Error applying equalizer: {str(e)}"
 
 
-# boosts all bass frequencies for the user
-def bass_boost(input_file, output_file, gain_db=10.0, cutoff=150.0):
-    try:
-        data, sample_rate = sf.read(input_file)
+def bass_boost_processor(sample_rate, channels, gain_db=10.0, cutoff=150.0, workers=None):
+    # Create a low-shelf filter
+    nyquist = 0.5 * sample_rate
+    norm_cutoff = cutoff / nyquist
 
-        if len(data.shape) == 1:
-            data = data[:, np.newaxis]
+    # second-order butterworth filter
+    sos = signal.butter(N=2, Wn=norm_cutoff, btype='low', output='sos')
+    workers = resolve_workers(workers)
+    groups = channel_groups(channels, workers)
+    states = [np.zeros((sos.shape[0], 2, group.stop - group.start)) for group in groups]
 
-        # Create a low-shelf filter
-        nyquist = 0.5 * sample_rate
-        norm_cutoff = cutoff / nyquist
+    # Convert gain in dB to a linear scale
+    gain_factor = 10 ** (gain_db / 20.0)
 
-        # second-order butterworth filter
-        sos = signal.butter(N=2, Wn=norm_cutoff, btype='low', output='sos')
+    # Apply filter and boost
+    def boost_group(index, part):
+        low_freq, states[index] = sosfilt_chunked(sos, part, states[index])
+        # Prevent clipping
+        return np.clip(part + low_freq * gain_factor, -1.0, 1.0)
 
-        # Convert gain in dB to a linear scale
-        gain_factor = 10 ** (gain_db / 20.0)
+    def process(block):
+        return map_channel_groups(boost_group, block, groups, workers)
 
-        # Apply filter and boost
-        for ch in range(data.shape[1]):
-            low_freq = signal.sosfilt(sos, data[:, ch])
-            data[:, ch] += low_freq * gain_factor
+    return process
 
-        # Prevent clipping
-        data = np.clip(data, -1.0, 1.0)
 
-        sf.write(output_file, data, sample_rate)
+# boosts all bass frequencies in an in-memory buffer
+def bass_boost_buffer(data, sample_rate, gain_db=10.0, cutoff=150.0, workers=None):
+    return bass_boost_processor(sample_rate, data.shape[1], gain_db, cutoff, workers)(data)
+
+
+# boosts all bass frequencies for the user
+def bass_boost(input_file, output_file, gain_db=10.0, cutoff=150.0, block_size=None, progress=None, workers=None,
+               precision=DEFAULT_PRECISION):
+    try:
+        dtype = precision_dtype(precision)
+        if block_size:
+            stream_audio(input_file, output_file,
+                         lambda sample_rate, channels: (
+                             bass_boost_processor(sample_rate, channels, gain_db, cutoff, workers), None),
+                         block_size, progress, precision=precision)
+        else:
+            data, sample_rate = read_audio(input_file, dtype)
+            report_progress(progress, 0.3)
+            data = bass_boost_buffer(data, sample_rate, gain_db, cutoff, workers)
+            report_progress(progress, 0.8)
+            write_audio(output_file, data, sample_rate, dither=dtype != np.float64)
         return f"Bass boost applied and saved to {output_file}"
 
     except Exception as e:
         return f"Error applying bass boost: {str(e)}"
 
 
-def apply_reverb(input_file, output_file, delay_ms=50, decay=0.4):
-    try:
-        data, sample_rate = sf.read(input_file)
+# feedback comb (echo) computed as one vectorized IIR: y[n] = x[n] + decay * y[n - delay].
+# each row of `delay_samples` frames only depends on the row before it, so a single
+# first-order lfilter pass down the rows replaces the per-sample python loop.
+# history holds the last `delay_samples` output frames so blocks can be chained.
+def comb_filter(data, delay_samples, decay, history=None):
+    frames, channels = data.shape
+    if delay_samples <= 0:
+        return data * (1.0 + decay), history
+
+    if history is None:
+        history = np.zeros((delay_samples, channels), dtype=data.dtype)
+
+    rows = -(-frames // delay_samples)
+    padded = np.zeros((rows * delay_samples, channels), dtype=data.dtype)
+    padded[:frames] = data
+    padded = padded.reshape(rows, delay_samples, channels)
+
+    zi = decay * history[np.newaxis, :, :]
+    filtered, _ = signal.lfilter(np.array([1.0], dtype=data.dtype), np.array([1.0, -decay], dtype=data.dtype),
+                                 padded, axis=0, zi=zi)
+    output = filtered.reshape(-1, channels)[:frames]
+
+    history = np.concatenate((history, output))[-delay_samples:]
+    return output, history
+
+
+# builds a synthetic room impulse response: exponentially decaying noise that
+# falls 60 dB over reverb_time seconds, scaled to unit energy per channel
+def generate_impulse_response(sample_rate, reverb_time=1.5, channels=1, seed=0):
+    length = max(1, int(sample_rate * reverb_time))
+    t = np.arange(length) / sample_rate
+    envelope = np.exp(-6.9 * t / reverb_time)
+    noise = np.random.default_rng(seed).standard_normal((length, channels))
+    ir = noise * envelope[:, np.newaxis]
+    return ir / np.sqrt(np.sum(ir ** 2, axis=0))
+
+
+# uniformly partitioned FFT convolution (overlap-add with a frequency domain delay line).
+# the impulse response is split into block_size partitions, so each input block costs
+# one FFT pair plus a multiply-accumulate per partition no matter how long the tail is.
+# dtype float32 keeps the spectra in complex64, half the memory of the frequency domain delay line.
+class PartitionedConvolver:
+    def __init__(self, impulse_response, channels, block_size=4096, dtype=np.float64):
+        ir = np.asarray(impulse_response, dtype=dtype)
+        if ir.ndim == 1:
+            ir = ir[:, np.newaxis]
+        if ir.shape[1] != channels:
+            ir = np.repeat(ir[:, :1], channels, axis=1)
+
+        self.block_size = block_size
+        self.channels = channels
+        self.partitions = -(-len(ir) // block_size)
+        self.tail_length = len(ir) - 1
+
+        parts = np.zeros((self.partitions * block_size, channels), dtype=dtype)
+        parts[:len(ir)] = ir
+        parts = parts.reshape(self.partitions, block_size, channels)
+        self.spectra = np.fft.rfft(parts, n=2 * block_size, axis=1)
+
+        self.delay_line = np.zeros_like(self.spectra)
+        self.head = 0
+        self.overlap = np.zeros((block_size, channels), dtype=dtype)
+
+    # a convolver sharing this impulse response's spectra but with empty history,
+    # for convolving another segment of the same signal at the same time
+    def clone(self):
+        fresh = copy.copy(self)
+        fresh.delay_line = np.zeros_like(self.spectra)
+        fresh.head = 0
+        fresh.overlap = np.zeros_like(self.overlap)
+        return fresh
+
+    # convolves one block of exactly block_size frames (pad the final block with zeros)
+    def process(self, block):
+        size = self.block_size
+        self.head = (self.head + 1) % self.partitions
+        self.delay_line[self.head] = np.fft.rfft(block, n=2 * size, axis=0)
+
+        order = (self.head - np.arange(self.partitions)) % self.partitions
+        spectrum = np.sum(self.delay_line[order] * self.spectra, axis=0)
+        result = np.fft.irfft(spectrum, n=2 * size, axis=0)
+
+        output = result[:size] + self.overlap
+        self.overlap = result[size:]
+        return output
+
+
+# the impulse response columns for one channel group (a mono response is shared by all channels)
+def group_impulse_response(impulse_response, group, channels):
+    ir = np.asarray(impulse_response)
+    if ir.ndim == 2 and ir.shape[1] == channels:
+        return ir[:, group]
+    return ir
+
+
+# runs a segment through a fresh convolver and returns its first `total` output frames
+def convolve_segment(convolver, segment, total):
+    size = convolver.block_size
+    padded = np.zeros((-(-total // size) * size, segment.shape[1]), dtype=segment.dtype)
+    padded[:len(segment)] = segment
+    output = np.empty_like(padded)
+    for start in range(0, len(padded), size):
+        output[start:start + size] = convolver.process(padded[start:start + size])
+    return output[:total]
+
+
+# convolves the whole buffer with an impulse response and mixes it with the dry signal.
+# the output keeps the reverb tail, so it is len(data) + len(ir) - 1 frames long.
+# convolution is linear, so with workers each channel group and time segment is convolved
+# on its own and the overlapping tails are added back together.
+def convolution_reverb(data, impulse_response, wet=0.3, block_size=4096, workers=None):
+    frames, channels = data.shape
+    workers = resolve_workers(workers)
+    groups = channel_groups(channels, workers)
+    convolvers = [PartitionedConvolver(group_impulse_response(impulse_response, group, channels),
+                                       group.stop - group.start, block_size, data.dtype) for group in groups]
+    tail = convolvers[0].tail_length
+    total = frames + tail
+
+    segments = segment_bounds(frames, max(1, workers // len(groups)), align=block_size)
+    tasks = [(index, start, stop) for index in range(len(groups)) for start, stop in segments]
+
+    def run(task):
+        index, start, stop = task
+        return convolve_segment(convolvers[index].clone(), data[start:stop, groups[index]], stop - start + tail)
+
+    wet_signal = np.zeros((total, channels), dtype=data.dtype)
+    for (index, start, stop), part in zip(tasks, parallel_map(run, tasks, workers)):
+        wet_signal[start:stop + tail, groups[index]] += part
+
+    output = wet * wet_signal
+    output[:frames] += (1.0 - wet) * data
+    return output
+
+
+def load_impulse_response(impulse_response, sample_rate, reverb_time=1.5):
+    if impulse_response is None:
+        return generate_impulse_response(sample_rate, reverb_time)
+    ir, ir_rate = read_audio(impulse_response)
+    if ir_rate != sample_rate:
+        ir = signal.resample_poly(ir, sample_rate, ir_rate, axis=0)
+    return ir
+
+
+# mode="echo" is the original feedback echo, mode="convolution" convolves with an
+# impulse response file (or a synthetic room of reverb_time seconds if none is given)
+def reverb_buffer(data, sample_rate, delay_ms=50, decay=0.4, mode="echo", impulse_response=None,
+                  reverb_time=1.5, wet=0.3, workers=None):
+    if mode == "echo":
         delay_samples = int(sample_rate * (delay_ms / 1000.0))
+        workers = resolve_workers(workers)
+        output = map_channel_groups(lambda index, part: comb_filter(part, delay_samples, decay)[0], data,
+                                    channel_groups(data.shape[1], workers), workers)
+    elif mode == "convolution":
+        ir = load_impulse_response(impulse_response, sample_rate, reverb_time)
+        output = convolution_reverb(data, ir, wet, workers=workers)
+    else:
+        raise ValueError(f"unknown reverb mode '{mode}'")
 
-        if len(data.shape) == 1:
-            data = data[:, np.newaxis]
+    # Prevent clipping
+    return np.clip(output, -1.0, 1.0)
 
-        output = np.copy(data)
 
-        for ch in range(data.shape[1]):
-            for i in range(delay_samples, len(data)):
-                output[i, ch] += decay * output[i - delay_samples, ch]
+# streaming version of reverb_buffer. the echo carries its comb history between blocks;
+# convolution uses block_size partitions and flush() returns the reverb tail.
+def reverb_processor(sample_rate, channels, delay_ms=50, decay=0.4, mode="echo", impulse_response=None,
+                     reverb_time=1.5, wet=0.3, block_size=DEFAULT_BLOCK_SIZE, workers=None, dtype=np.float64):
+    workers = resolve_workers(workers)
+    groups = channel_groups(channels, workers)
+    if mode == "echo":
+        delay_samples = int(sample_rate * (delay_ms / 1000.0))
+        histories = [None] * len(groups)
 
-        # Prevent clipping
-        output = np.clip(output, -1.0, 1.0)
+        def echo_group(index, part):
+            output, histories[index] = comb_filter(part, delay_samples, decay, histories[index])
+            return output
+
+        def process(block):
+            return np.clip(map_channel_groups(echo_group, block, groups, workers), -1.0, 1.0)
+
+        return process, None
+
+    if mode != "convolution":
+        raise ValueError(f"unknown reverb mode '{mode}'")
+
+    ir = load_impulse_response(impulse_response, sample_rate, reverb_time)
+    convolvers = [PartitionedConvolver(group_impulse_response(ir, group, channels), group.stop - group.start,
+                                       block_size, dtype) for group in groups]
+    tail_length = convolvers[0].tail_length
+    pending = [np.zeros((0, channels), dtype=dtype)]
+
+    def convolve(padded):
+        return map_channel_groups(lambda index, part: convolvers[index].process(part), padded, groups, workers)
 
-        sf.write(output_file, output, sample_rate)
+    def process(block):
+        frames = len(block)
+        padded = np.zeros((block_size, channels), dtype=dtype)
+        padded[:frames] = block
+        wet_block = convolve(padded)
+        pending[0] = wet_block[frames:]
+        return np.clip((1.0 - wet) * block + wet * wet_block[:frames], -1.0, 1.0)
+
+    def flush():
+        tail = [pending[0]]
+        remaining = tail_length - len(pending[0])
+        while remaining > 0:
+            tail.append(convolve(np.zeros((block_size, channels), dtype=dtype)))
+            remaining -= block_size
+        return np.clip(wet * np.concatenate(tail)[:tail_length], -1.0, 1.0)
+
+    return process, flush
+
+
+def apply_reverb(input_file, output_file, delay_ms=50, decay=0.4, mode="echo", impulse_response=None,
+                 reverb_time=1.5, wet=0.3, block_size=None, progress=None, workers=None, precision=DEFAULT_PRECISION):
+    try:
+        dtype = precision_dtype(precision)
+        if block_size:
+            stream_audio(input_file, output_file,
+                         lambda sample_rate, channels: reverb_processor(
+                             sample_rate, channels, delay_ms, decay, mode, impulse_response, reverb_time, wet,
+                             block_size, workers, dtype),
+                         block_size, progress, precision=precision)
+        else:
+            data, sample_rate = read_audio(input_file, dtype)
+            report_progress(progress, 0.3)
+            output = reverb_buffer(data, sample_rate, delay_ms, decay, mode, impulse_response, reverb_time, wet,
+                                   workers)
+            report_progress(progress, 0.8)
+            write_audio(output_file, output, sample_rate, dither=dtype != np.float64)
         return f"Reverb applied and saved to {output_file}"
 
     except Exception as e:
         return f"Error applying reverb: {str(e)}"
 
 
-def reverse_audio(input_path, output_path):
+# normalizes an in-memory buffer. by default its loudest sample ends up headroom dB below
+# full scale; see limited_normalization for the rms and lufs modes.
+def normalize_buffer(data, sample_rate, headroom=1.0, mode="peak", target=None, true_peak_ceiling=None,
+                     workers=None):
+    return normalize_limited(data, sample_rate, headroom, mode, target, true_peak_ceiling, workers)[0]
+
+
+# normalize_buffer that also returns the stats of the limited output (None when nothing was limited)
+def normalize_limited(data, sample_rate, headroom=1.0, mode="peak", target=None, true_peak_ceiling=None,
+                      workers=None):
+    workers = resolve_workers(workers)
+    ceiling = resolve_ceiling(mode, true_peak_ceiling)
+    gain, limited = limited_normalization(
+        measure_loudness(data, sample_rate, workers),
+        lambda gain: measure_loudness(normalized_buffer(data, sample_rate, gain, ceiling), sample_rate, workers),
+        mode, target, true_peak_ceiling, headroom)
+    return normalized_buffer(data, sample_rate, gain, None if limited is None else ceiling, workers), limited
+
+
+def apply_gain(data, gain, workers=None):
+    return map_segments(lambda part: np.clip(part * gain, -1.0, 1.0), data, resolve_workers(workers))
+
+
+def reverse_buffer(data, sample_rate, workers=None):
+    workers = resolve_workers(workers)
+    if workers == 1:
+        return data[::-1].copy()
+    output = np.empty_like(data)
+    frames = len(data)
+
+    def copy_segment(bounds):
+        start, stop = bounds
+        output[start:stop] = data[frames - stop:frames - start][::-1]
+
+    parallel_map(copy_segment, segment_bounds(frames, workers), workers)
+    return output
+
+
+def trim_buffer(data, sample_rate, start_seconds=0.0, end_seconds=None):
+    start = int(start_seconds * sample_rate)
+    stop = len(data) if end_seconds is None else int(end_seconds * sample_rate)
+    return data[start:stop].copy()
+
+
+# pure reorder/trim operations copy the raw frames of a WAV's data chunk through a memory map,
+# REORDER_BLOCK_BYTES at a time, without decoding anything
+REORDER_BLOCK_BYTES = 8 * 1024 * 1024
+
+
+# the file's WAV layout (see read_wav_layout) when its frames can be copied as they are, i.e. it is
+# a RIFF/WAVE file of plain PCM or float samples; None for anything else (FLAC, RF64, ADPCM, ...),
+# which has to be decoded instead
+def copyable_wav_layout(file_path):
     try:
-        audio = AudioSegment.from_wav(input_path)
-        reversed_audio = audio.reverse()
-        reversed_audio.export(output_path, format="wav")
-        return f"Reversed audio saved to {output_path}"
-    except Exception as e:
-        return f"Error reversing audio: {str(e)}"
+        layout = read_wav_layout(file_path)
+    except (OSError, ValueError, struct.error):
+        return None
+    fmt, block_align = layout[0], layout[3]
+    encoding = wav_sample_format(fmt)
+    if encoding is None or block_align != struct.unpack("<H", fmt[2:4])[0] * encoding[1] // 8:
+        return None
+    return layout
+
 
+# copies frames [start, stop) of a WAV file, optionally in reverse order, through a memory-mapped
+# view of its data chunk. memory use is bounded by REORDER_BLOCK_BYTES whatever the file size.
+def copy_wav_frames(input_path, output_path, start=0, stop=None, reverse=False, progress=None, layout=None):
+    fmt, data_offset, data_size, block_align = layout or read_wav_layout(input_path)
+    total = data_size // block_align
+    stop = total if stop is None else min(stop, total)
+    start = max(0, min(start, stop))
+    count = stop - start
+    block_frames = max(1, REORDER_BLOCK_BYTES // block_align)
 
-def play_with_meter(file_path, window):
-    def run():
-        try:
-            wf = wave.open(file_path, 'rb')
-            audio_data = wf.readframes(wf.getnframes())
-            samples = np.frombuffer(audio_data, dtype=np.int16)
+    frames = None
+    if total:
+        frames = np.memmap(input_path, dtype=np.uint8, mode="r", offset=data_offset, shape=(total, block_align))
+    try:
+        with open(output_path, "wb") as output:
+            write_wav_header(output, fmt, count * block_align)
+            for done in range(0, count, block_frames):
+                size = min(block_frames, count - done)
+                with instrumentation.stage("decode"):
+                    if reverse:
+                        chunk = frames[stop - done - size:stop - done][::-1].tobytes()
+                    else:
+                        chunk = frames[start + done:start + done + size].tobytes()
+                with instrumentation.stage("encode"):
+                    output.write(chunk)
+                report_progress(progress, (done + size) / count)
+            if (count * block_align) & 1:
+                output.write(b"\0")
+    finally:
+        del frames
+    channels = struct.unpack("<H", fmt[2:4])[0]
+    instrumentation.count(bytes_read=count * block_align, bytes_written=os.path.getsize(output_path),
+                          samples=count * channels)
 
-            num_channels = wf.getnchannels()
-            if num_channels == 2:
-                samples = samples[::2]  # down mix stereo to mono
 
-            chunk_size = 1024
-            step_size = chunk_size // 2  # 50% overlap
-            sample_rate = wf.getframerate()
+# PCM and float WAVs are reordered on disk, which is bound by I/O, and their samples are only moved,
+# never changed. workers and precision only apply to other files, which are decoded and written
+# back in the source's subtype (dithered in float32 mode, like the other operations).
+def reverse_audio(input_path, output_path, progress=None, workers=None, precision=DEFAULT_PRECISION):
+    try:
+        layout = copyable_wav_layout(input_path)
+        if layout is not None:
+            copy_wav_frames(input_path, output_path, reverse=True, progress=progress, layout=layout)
+        else:
+            subtype = sf.info(input_path).subtype
+            dtype = precision_dtype(precision)
+            data, sample_rate = read_audio(input_path, dtype)
+            write_audio(output_path, reverse_buffer(data, sample_rate, workers), sample_rate, subtype=subtype,
+                        dither=dtype != np.float64)
+        return f"Reversed audio saved to {output_path}"
+    except Exception as e:
+        return f"Error reversing audio: {str(e)}"
 
-            wave_obj = sa.WaveObject(audio_data, wf.getnchannels(), wf.getsampwidth(), sample_rate)
-            play_obj = wave_obj.play()
 
-            smoothed_level = 0
-            decay_rate = 2  # lower = slower falloff
+# keeps only start_seconds to end_seconds (or the end of the file) of the selected audio file
+def trim_audio(input_path, output_path, start_seconds=0.0, end_seconds=None, progress=None,
+               precision=DEFAULT_PRECISION):
+    try:
+        layout = copyable_wav_layout(input_path)
+        if layout is not None:
+            sample_rate = sf.info(input_path).samplerate
+            stop = None if end_seconds is None else int(end_seconds * sample_rate)
+            copy_wav_frames(input_path, output_path, int(start_seconds * sample_rate), stop, progress=progress,
+                            layout=layout)
+        else:
+            subtype = sf.info(input_path).subtype
+            dtype = precision_dtype(precision)
+            data, sample_rate = read_audio(input_path, dtype)
+            write_audio(output_path, trim_buffer(data, sample_rate, start_seconds, end_seconds), sample_rate,
+                        subtype=subtype, dither=dtype != np.float64)
+        return f"Trimmed audio saved to {output_path}"
+    except Exception as e:
+        return f"Error trimming audio: {str(e)}"
 
-            for i in range(0, len(samples) - chunk_size, step_size):
-                if not play_obj.is_playing():
-                    break
 
-                chunk = samples[i:i + chunk_size]
-                rms = np.sqrt(np.mean(chunk ** 2))
-                level = int(min(40, rms / 1000))  # scale for 0–40 meter
+# operations that can be chained in memory. each one takes (data, sample_rate, **params)
+# and returns the processed frames x channels float buffer.
+CHAIN_OPERATIONS = {
+    "remove_silence": remove_silence_buffer,
+    "equalize": equalize_buffer,
+    "bass_boost": bass_boost_buffer,
+    "reverb": reverb_buffer,
+    "normalize": normalize_buffer,
+    "reverse": reverse_buffer,
+    "trim": trim_buffer,
+}
 
-                # Apply smoothing
-                if level > smoothed_level:
-                    smoothed_level = level
-                else:
-                    smoothed_level = max(0, smoothed_level - decay_rate)
+# the operations (chain and file versions) that accept workers for parallel mode
+PARALLEL_OPERATIONS = ("equalize", "bass_boost", "reverb", "normalize", "reverse")
 
-                window.write_event_value("-METER-UPDATE-", smoothed_level)
-                time.sleep(step_size / sample_rate)
 
-            play_obj.wait_done()
-            window.write_event_value("-METER-UPDATE-", 0)
+# runs several operations on one decoded buffer and encodes a single output file.
+# steps is a list of (operation name, params dict) pairs, e.g.
+# [("remove_silence", {}), ("equalize", {"bands": bands}), ("normalize", {})]
+def process_chain(input_file, output_file, steps, progress=None, workers=None, precision=DEFAULT_PRECISION):
+    try:
+        dtype = precision_dtype(precision)
+        data, sample_rate = read_audio(input_file, dtype)
 
-        except Exception as e:
-            window.write_event_value("-OUTPUT-APPEND-", f"Error in volume meter: {str(e)}\n")
+        for i, (name, params) in enumerate(steps):
+            if name not in CHAIN_OPERATIONS:
+                return f"Error running chain: unknown operation '{name}'"
+            params = dict(params or {})
+            if workers is not None and name in PARALLEL_OPERATIONS:
+                params.setdefault("workers", workers)
+            data = CHAIN_OPERATIONS[name](data, sample_rate, **params)
+            report_progress(progress, (i + 1) / (len(steps) + 1))
 
-    threading.Thread(target=run, daemon=True).start()
+        write_audio(output_file, data, sample_rate, dither=dtype != np.float64)
+        names = " -> ".join(name for name, _ in steps)
+        return f"Chain ({names}) saved to {output_file}"
 
+    except Exception as e:
+        return f"Error running chain: {str(e)}"
@@ -0,0 +1,176 @@
+# headless batch processing for audio_tools.
+# applies one operation, or a chain of them, to every .wav in the given files, folders or
+# globs, spreading the files over a process pool so every core is used.
+#
+# examples:
+#   python batch.py stems/ --op normalize
+#   python batch.py "stems/**/*.wav" --op remove_silence --op equalize --op normalize -j 16
+#   python batch.py take1.wav --op bass_boost:gain_db=8,cutoff=120 --output-dir boosted
+#   python batch.py stems/ --op equalize --op normalize --precision float32
+import argparse
+import ast
+import glob
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import audio_tools
+from audio_io import PRECISIONS, DEFAULT_PRECISION
+
+# single operations run through their file functions (so large files can stream),
+# chains of several operations run in memory through process_chain
+FILE_OPERATIONS = {
+    "normalize": audio_tools.normalize_audio,
+    "remove_silence": audio_tools.remove_silence,
+    "equalize": audio_tools.apply_equalizer,
+    "bass_boost": audio_tools.bass_boost,
+    "reverb": audio_tools.apply_reverb,
+    "reverse": audio_tools.reverse_audio,
+    "trim": audio_tools.trim_audio,
+}
+
+
+# parses "name" or "name:key=value,key=value" into (name, params)
+def parse_operation(text):
+    name, _, arguments = text.partition(":")
+    if name not in audio_tools.CHAIN_OPERATIONS:
+        raise argparse.ArgumentTypeError(
+            f"unknown operation '{name}' (choose from {', '.join(audio_tools.CHAIN_OPERATIONS)})")
+
+    params = {}
+    for argument in filter(None, arguments.split(",")):
+        key, _, value = argument.partition("=")
+        try:
+            params[key] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            params[key] = value
+    return name, params
+
+
+# checks every step's settings against the function that will run it, so a misspelled setting
+# stops the run before any file is processed. returns a list of problems (empty if all is well).
+def check_steps(steps):
+    problems = []
+    for name, params in steps:
+        if len(steps) == 1:
+            function, positional = FILE_OPERATIONS[name], ("input.wav", "output.wav")
+        else:
+            function, positional = audio_tools.CHAIN_OPERATIONS[name], (None, 44100)
+        try:
+            inspect.signature(function).bind(*positional, **params)
+        except TypeError as e:
+            problems.append(f"--op {name}: {str(e)}")
+    return problems
+
+
+# expands files, folders and glob patterns into a sorted list of .wav paths
+def collect_inputs(patterns, recursive=False):
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "**", "*.wav") if recursive else os.path.join(pattern, "*.wav")
+        for path in glob.glob(pattern, recursive=True):
+            if os.path.isfile(path) and path.lower().endswith(".wav"):
+                paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+
+# <name>_<operations>_<settings hash>.wav. the hash covers every step's settings and the precision
+# (as render_cache.output_path does), so a run with other settings writes a new file instead of
+# finding the old one "up to date"
+def output_path_for(input_path, output_dir, steps, precision=DEFAULT_PRECISION):
+    suffix = "_".join(name for name, _ in steps)
+    payload = json.dumps({"steps": steps, "precision": precision}, sort_keys=True, default=str)
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(input_path))[0] + f"_{suffix}_{digest}.wav")
+
+
+def is_up_to_date(input_path, output_path):
+    return os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(input_path)
+
+
+# runs in a worker process. returns (input, output, ok, seconds, message)
+# threads > 1 also splits each file's DSP over that many threads (useful for a few long files)
+def process_file(input_path, output_path, steps, threads=1, precision=DEFAULT_PRECISION):
+    started = time.perf_counter()
+    workers = threads if threads > 1 else None
+    try:
+        if len(steps) == 1:
+            name, params = steps[0]
+            if workers and name in audio_tools.PARALLEL_OPERATIONS:
+                params = dict(params, workers=workers)
+            message = FILE_OPERATIONS[name](input_path, output_path, precision=precision, **params)
+        else:
+            message = audio_tools.process_chain(input_path, output_path, steps, workers=workers,
+                                                precision=precision)
+    except Exception as e:
+        message = f"Error processing {os.path.basename(input_path)}: {str(e)}"
+    ok = not message.startswith("Error")
+    return input_path, output_path, ok, time.perf_counter() - started, message
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply audio_tools operations to many .wav files in parallel.")
+    parser.add_argument("inputs", nargs="+", help="wav files, folders or glob patterns")
+    parser.add_argument("--op", dest="steps", action="append", type=parse_operation, required=True,
+                        help="operation to apply, optionally name:key=value,...; repeat to build a chain")
+    parser.add_argument("-o", "--output-dir", default="processed audio", help="where processed files are written")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("-t", "--threads", type=int, default=1,
+                        help="DSP threads per file (channels and segments are processed in parallel)")
+    parser.add_argument("-p", "--precision", choices=list(PRECISIONS), default=DEFAULT_PRECISION,
+                        help="float32 halves memory and bandwidth; 8 to 24-bit outputs are then dithered")
+    parser.add_argument("-r", "--recursive", action="store_true", help="also search sub-folders of folders")
+    parser.add_argument("-f", "--force", action="store_true", help="reprocess files whose output is up to date")
+    args = parser.parse_args(argv)
+    problems = check_steps(args.steps)
+    if problems:
+        parser.error("; ".join(problems))
+
+    inputs = collect_inputs(args.inputs, args.recursive)
+    if not inputs:
+        print("No .wav files found.")
+        return 1
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = []
+    skipped = 0
+    for input_path in inputs:
+        output_path = output_path_for(input_path, args.output_dir, args.steps, args.precision)
+        if not args.force and is_up_to_date(input_path, output_path):
+            skipped += 1
+            print(f"SKIP   {os.path.basename(input_path)} (output is up to date)")
+        else:
+            jobs.append((input_path, output_path))
+
+    started = time.perf_counter()
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(process_file, input_path, output_path, args.steps, args.threads, args.precision):
+                   (input_path, output_path) for input_path, output_path in jobs}
+        for future in as_completed(futures):
+            try:
+                input_path, output_path, ok, seconds, message = future.result()
+            except Exception as e:
+                # the worker process itself failed (e.g. it ran out of memory)
+                input_path, output_path = futures[future]
+                ok, seconds, message = False, 0.0, f"Error: {str(e)}"
+            if not ok:
+                failures += 1
+            # successful files only show a warning (e.g. a loudness target the true-peak ceiling kept out of reach)
+            note = message if not ok else message[message.find("Warning:"):] if "Warning:" in message else ""
+            print(f"{'OK' if ok else 'FAIL':<6} {seconds:8.2f}s  {os.path.basename(input_path)}"
+                  + (f"  {note}" if note else ""))
+
+    elapsed = time.perf_counter() - started
+    print(f"\n{len(jobs) - failures} processed, {failures} failed, {skipped} skipped "
+          f"in {elapsed:.2f}s with {args.workers} workers")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+# reproducible benchmarks for every audio_tools operation.
+# synthetic WAVs are generated (and kept) in a bench folder, every operation runs in a fresh
+# interpreter so peak memory is measured per run, and results are written to JSON.
+#
+#   python benchmark.py                              (quick sweep, one axis at a time)
+#   python benchmark.py --full                       (every combination, up to 1 hour files)
+#   python benchmark.py --ops bass_boost apply_reverb --durations 60 600
+#   python benchmark.py --output after.json --compare before.json
+#   python benchmark.py --precision float32           (time the float32 mode)
+#   python benchmark.py --check-precision             (float32 results against float64, no timing)
+import argparse
+import inspect
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import soundfile as sf
+from audio_io import AudioWriter, PRECISIONS, PRECISION_BOUND_DB, PRECISION_CHECKS, read_audio
+
+BENCH_DIR = "bench audio"
+
+OPERATIONS = ("detect_bpm", "normalize_audio", "remove_silence", "apply_equalizer", "bass_boost", "apply_reverb",
+              "reverse_audio")
+
+# the quick sweep varies one axis at a time around this base case
+BASE_CASE = {"duration": 10, "channels": 2, "subtype": "PCM_16", "sample_rate": 44100}
+QUICK_SWEEP = {
+    "duration": (10, 60),
+    "channels": (1, 2, 6),
+    "subtype": ("PCM_16", "PCM_24", "FLOAT"),
+    "sample_rate": (44100, 48000, 96000),
+}
+FULL_SWEEP = {
+    "duration": (10, 60, 600, 3600),
+    "channels": (1, 2, 6),
+    "subtype": ("PCM_16", "PCM_24", "FLOAT"),
+    "sample_rate": (44100, 48000, 96000),
+}
+
+# a run is a regression when it is this much slower (or uses this much more memory) than the baseline
+DEFAULT_THRESHOLD = 0.15
+
+GENERATE_BLOCK_SECONDS = 10
+
+
+def case_name(case):
+    return f"{case['duration']}s_{case['channels']}ch_{case['subtype']}_{case['sample_rate']}"
+
+
+# the full sweep is every combination; the quick one varies each axis in turn around base
+def sweep_cases(sweep, full, base=BASE_CASE):
+    if full:
+        keys = list(sweep)
+        return [dict(zip(keys, values)) for values in itertools.product(*(sweep[key] for key in keys))]
+    cases = []
+    for key, values in sweep.items():
+        for value in values:
+            case = dict(base, **{key: value})
+            if case not in cases:
+                cases.append(case)
+    return cases
+
+
+# writes a deterministic test signal: a 120 BPM click over a quiet tone and noise bed, with two
+# seconds of silence every ten seconds so remove_silence has something to cut. it is written in
+# blocks, so even hour-long multichannel files are generated in bounded memory.
+def generate_case(case, folder=BENCH_DIR):
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, case_name(case) + ".wav")
+    if os.path.exists(path):
+        return path
+
+    sample_rate, channels = case["sample_rate"], case["channels"]
+    total = case["duration"] * sample_rate
+    block = GENERATE_BLOCK_SECONDS * sample_rate
+    rng = np.random.default_rng(1234)
+    beat = sample_rate // 2
+    click = np.exp(-np.arange(sample_rate // 50) / (sample_rate / 2000.0))
+
+    with AudioWriter(path + ".tmp", sample_rate, channels, case["subtype"], format="WAV") as output:
+        for start in range(0, total, block):
+            frames = min(block, total - start)
+            n = np.arange(start, start + frames)
+            mono = 0.1 * np.sin(2 * np.pi * 220.0 * n / sample_rate)
+            offsets = n % beat
+            clicks = offsets < len(click)
+            mono[clicks] += 0.6 * click[offsets[clicks]]
+            data = mono[:, np.newaxis] + 0.02 * rng.standard_normal((frames, channels))
+            data[(n % (10 * sample_rate)) >= 8 * sample_rate] = 0.0
+            output.write(data)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+# measured in a child process: the operation's wall time and the process's peak RSS
+def run_one(operation, path, workers=None, precision=None):
+    import audio_tools
+    from lazy_imports import LazyModule
+
+    # import the lazily loaded modules first so the timing covers the operation only
+    for module in (audio_tools.signal, audio_tools.librosa):
+        if isinstance(module, LazyModule):
+            try:
+                module._load()
+            except ImportError:
+                pass
+
+    function = getattr(audio_tools, operation)
+    parameters = inspect.signature(function).parameters
+    kwargs = {"workers": workers} if workers is not None and "workers" in parameters else {}
+    if precision is not None and "precision" in parameters:
+        kwargs["precision"] = precision
+    output_path = os.path.splitext(path)[0] + f"_{operation}_out.wav"
+    started = time.perf_counter()
+    if operation == "detect_bpm":
+        message = function(path, **kwargs)
+    else:
+        message = function(path, output_path, **kwargs)
+    seconds = time.perf_counter() - started
+    if os.path.exists(output_path):
+        os.remove(output_path)
+
+    return {"seconds": seconds, "peak_rss_mb": peak_rss_mb(), "ok": not str(message).startswith("Error"),
+            "message": str(message)}
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # linux reports kilobytes, macOS bytes
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+        except (ImportError, AttributeError):
+            return None
+
+
+def measure(operation, path, repeat, workers=None, precision=None):
+    command = [sys.executable, os.path.abspath(__file__), "--run-one", operation, path]
+    if workers is not None:
+        command += ["--workers", str(workers)]
+    if precision is not None:
+        command += ["--precision", precision]
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            return {"ok": False, "message": completed.stderr.strip().splitlines()[-1:]}
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    # the fastest run is the least disturbed by the rest of the machine
+    best = min(runs, key=lambda run: run["seconds"])
+    best["peak_rss_mb"] = max((run["peak_rss_mb"] or 0) for run in runs) or None
+    return best
+
+
+def run_benchmarks(cases, operations, repeat, workers=None, precision=None):
+    results = []
+    for case in cases:
+        path = generate_case(case)
+        samples = case["duration"] * case["sample_rate"] * case["channels"]
+        for operation in operations:
+            result = measure(operation, path, repeat, workers, precision)
+            entry = {"case": case_name(case), **case, "operation": operation, "workers": workers,
+                     "precision": precision or "float64", **result}
+            if result.get("ok"):
+                entry["samples_per_second"] = samples / result["seconds"]
+                rss = f"{result['peak_rss_mb']:8.1f} MB" if result["peak_rss_mb"] else "       n/a"
+                print(f"{case_name(case):<28} {operation:<16} {result['seconds']:9.3f}s "
+                      f"{entry['samples_per_second'] / 1e6:9.2f} Msamples/s {rss}")
+            else:
+                print(f"{case_name(case):<28} {operation:<16} FAILED {result.get('message')}")
+            results.append(entry)
+    return results
+
+
+# runs PRECISION_CHECKS on each case's audio in float64 and in float32 and returns a list of
+# messages for every check whose float32 result is not float32, has another shape, or differs
+# from the float64 result by more than bound_db dBFS
+def check_precision(cases, bound_db=PRECISION_BOUND_DB):
+    import audio_tools
+
+    failures = []
+    for case in cases:
+        data, sample_rate = read_audio(generate_case(case))
+        single = data.astype(np.float32)
+        for name, params in PRECISION_CHECKS:
+            operation = audio_tools.CHAIN_OPERATIONS[name]
+            reference = operation(data, sample_rate, **params)
+            result = operation(single, sample_rate, **params)
+            label = f"{case_name(case):<28} {name:<16} {json.dumps(params)}"
+            if result.dtype != np.float32 or result.shape != reference.shape:
+                failures.append(f"{label}: got {result.dtype} {result.shape}, expected float32 {reference.shape}")
+                print(f"{label} FAILED")
+                continue
+            difference = float(np.max(np.abs(result - reference))) if result.size else 0.0
+            error_db = 20 * np.log10(difference) if difference > 0 else float("-inf")
+            print(f"{label} max difference {error_db:8.1f} dBFS")
+            if error_db > bound_db:
+                failures.append(f"{label}: {error_db:.1f} dBFS is above the {bound_db:.0f} dBFS bound")
+    return failures
+
+
+def environment():
+    import scipy
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "soundfile": sf.__version__,
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+# runs are only comparable with the same case, operation, worker count and precision
+# (baselines from before precision was recorded ran in float64)
+def result_key(entry):
+    return entry["case"], entry["operation"], entry.get("workers"), entry.get("precision") or "float64"
+
+
+def describe_key(key):
+    case, operation, workers, precision = key
+    return f"{case} {operation} (workers {workers}, {precision})"
+
+
+# returns (regressions, unmatched, matched): messages for every run that got slower or heavier than
+# the matching baseline run and for the runs that only one side has, which are not compared, and
+# how many runs were compared
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    previous = {result_key(entry): entry for entry in baseline["results"] if entry.get("ok")}
+    current = {result_key(entry) for entry in results if entry.get("ok")}
+    matched = len(current & set(previous))
+    unmatched = [f"{describe_key(key)}: not in this run" for key in previous if key not in current]
+    unmatched += [f"{describe_key(key)}: not in the baseline" for key in current if key not in previous]
+    regressions = []
+    for entry in results:
+        before = previous.get(result_key(entry))
+        if before is None or not entry.get("ok"):
+            continue
+        for key, label in (("seconds", "time"), ("peak_rss_mb", "peak memory")):
+            if entry.get(key) and before.get(key) and entry[key] > before[key] * (1 + threshold):
+                regressions.append(f"{describe_key(result_key(entry))}: {label} {before[key]:.3f} -> "
+                                   f"{entry[key]:.3f} (+{(entry[key] / before[key] - 1) * 100:.0f}%)")
+    return regressions, unmatched, matched
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every audio_tools operation.")
+    parser.add_argument("--full", action="store_true", help="run every combination instead of a one-axis sweep")
+    parser.add_argument("--ops", nargs="+", choices=OPERATIONS, default=list(OPERATIONS))
+    parser.add_argument("--durations", nargs="+", type=int, help="override the durations (seconds)")
+    parser.add_argument("--channels", nargs="+", type=int, help="override the channel counts")
+    parser.add_argument("--formats", nargs="+", help="override the WAV subtypes, e.g. PCM_16 PCM_24 FLOAT")
+    parser.add_argument("--rates", nargs="+", type=int, help="override the sample rates")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (the fastest is kept)")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the results")
+    parser.add_argument("--compare", help="baseline results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown before a result counts as a regression (0.15 = 15%%)")
+    parser.add_argument("--workers", type=int, help="DSP threads for operations that support them (0 = every core)")
+    parser.add_argument("--precision", choices=list(PRECISIONS),
+                        help="processing precision for operations that take it")
+    parser.add_argument("--check-precision", action="store_true",
+                        help="check float32 results against float64 instead of timing")
+    parser.add_argument("--run-one", nargs=2, metavar=("OPERATION", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_one:
+        print(json.dumps(run_one(*args.run_one, workers=args.workers, precision=args.precision)))
+        return 0
+
+    # an override replaces that axis of the sweep and, in the quick sweep, the base case the other
+    # axes vary around, so e.g. --formats PCM_24 runs every case as PCM_24
+    sweep = dict(FULL_SWEEP if args.full else QUICK_SWEEP)
+    base = dict(BASE_CASE)
+    for key, override in (("duration", args.durations), ("channels", args.channels), ("subtype", args.formats),
+                          ("sample_rate", args.rates)):
+        if override:
+            sweep[key] = tuple(override)
+            base[key] = override[0]
+
+    if args.check_precision:
+        failures = check_precision(sweep_cases(sweep, args.full, base))
+        if failures:
+            print(f"\n{len(failures)} precision check(s) failed:")
+            for failure in failures:
+                print("  " + failure)
+            return 1
+        print(f"\nfloat32 stays within {PRECISION_BOUND_DB:.0f} dBFS of float64.")
+        return 0
+
+    results = run_benchmarks(sweep_cases(sweep, args.full, base), args.ops, args.repeat, args.workers, args.precision)
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump({"environment": environment(), "results": results}, output, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as baseline_file:
+            regressions, unmatched, matched = compare(results, json.load(baseline_file), args.threshold)
+        if unmatched:
+            print(f"\n{len(unmatched)} run(s) without a counterpart in {args.compare} (not compared):")
+            for line in unmatched:
+                print("  " + line)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.compare}:")
+            for regression in regressions:
+                print("  " + regression)
+            return 1
+        if not matched:
+            print(f"\nNothing was compared: no run matches a run in {args.compare} "
+                  f"(same case, operation, workers and precision).")
+            return 1
+        print(f"No regressions against {args.compare}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+import cProfile
+import io
+import os
+import pstats
+import sqlite3
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# metrics live next to the feedback suggestions table
+METRICS_DB_FILE = "suggestions.db"
+PROFILE_DIR = "profiles"
+
+STAGES = ("decode", "dsp", "encode")
+
+_current = threading.local()
+_tracing_lock = threading.Lock()
+# traced runs as metrics -> [traced memory when the run started, peak so far, overlapped]
+_traced_runs = {}
+_sampler = None
+TRACE_SAMPLE_SECONDS = 0.01
+
+
+# what one operation run cost: time per stage, bytes read and written, samples processed and
+# peak memory. profiled runs record the peak traced memory above what was traced when they
+# started: tracemalloc is process wide and has a single peak, so a run alone uses that exact
+# peak; once runs overlap, none of them resets it and each samples the traced memory every
+# TRACE_SAMPLE_SECONDS instead (the other run's allocations are included then). every other run
+# records the process's peak resident memory, which costs nothing to read.
+class OperationMetrics:
+    def __init__(self, operation, file_path=None):
+        self.operation = operation
+        self.file_name = os.path.basename(file_path) if file_path else ""
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.total_seconds = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.samples = 0
+        self.peak_memory = 0
+        self.memory_traced = False
+        self.ok = True
+        self.profile_text = None
+        self.profile_path = None
+
+    # anything not spent decoding or encoding is counted as processing
+    def finalize(self, total_seconds):
+        self.total_seconds = total_seconds
+        timed = self.stages["decode"] + self.stages["encode"]
+        self.stages["dsp"] = max(0.0, total_seconds - timed)
+
+    def summary(self):
+        stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.stages.items())
+        return (f"⏱ {self.operation}: {self.total_seconds:.2f}s ({stages}) | "
+                f"{self.bytes_read / 1e6:.1f} MB read, {self.bytes_written / 1e6:.1f} MB written | "
+                f"{self.samples / 1e6:.2f}M samples | "
+                f"{'peak traced memory' if self.memory_traced else 'process peak RSS'} "
+                f"{self.peak_memory / 1e6:.1f} MB")
+
+
+def current_metrics():
+    return getattr(_current, "metrics", None)
+
+
+# times a stage of the operation running on this thread. does nothing outside instrument().
+@contextmanager
+def stage(name):
+    metrics = current_metrics()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.stages[name] = metrics.stages.get(name, 0.0) + time.perf_counter() - started
+
+
+def count(bytes_read=0, bytes_written=0, samples=0):
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.bytes_read += bytes_read
+        metrics.bytes_written += bytes_written
+        metrics.samples += samples
+
+
+# the process's resident memory high-water mark in bytes, or 0 where it cannot be read
+def peak_rss_bytes():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # linux reports kilobytes, macOS bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset
+        except (ImportError, AttributeError):
+            return 0
+
+
+def _start_tracing(metrics):
+    global _sampler
+    with _tracing_lock:
+        if not _traced_runs:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            _traced_runs[metrics] = [tracemalloc.get_traced_memory()[0], 0, False]
+            return
+        # the exact peak so far is kept, then every run switches to sampling
+        current, peak = tracemalloc.get_traced_memory()
+        for run in _traced_runs.values():
+            if not run[2]:
+                run[1] = max(run[1], peak - run[0])
+                run[2] = True
+        _traced_runs[metrics] = [current, 0, True]
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_tracing, daemon=True)
+            _sampler.start()
+
+
+def _sample_tracing():
+    global _sampler
+    while True:
+        with _tracing_lock:
+            overlapped = [run for run in _traced_runs.values() if run[2]]
+            if not overlapped:
+                _sampler = None
+                return
+            current = tracemalloc.get_traced_memory()[0]
+            for run in overlapped:
+                run[1] = max(run[1], current - run[0])
+        time.sleep(TRACE_SAMPLE_SECONDS)
+
+
+def _stop_tracing(metrics):
+    with _tracing_lock:
+        baseline, peak, overlapped = _traced_runs.pop(metrics)
+        current, traced_peak = tracemalloc.get_traced_memory()
+        peak = max(peak, current - baseline) if overlapped else traced_peak - baseline
+        if not _traced_runs:
+            tracemalloc.stop()
+    return max(0, peak)
+
+
+# runs function(*args, **kwargs) while collecting its metrics and returns (result, metrics).
+# profile=True also captures a cProfile of the run: the top functions go into
+# metrics.profile_text and the full profile is dumped to the profiles folder. tracemalloc slows
+# every thread in the process, including background jobs and the LLM, so only profiled runs
+# trace memory.
+def instrument(operation, file_path, function, *args, profile=False, **kwargs):
+    metrics = OperationMetrics(operation, file_path)
+    metrics.memory_traced = profile
+    previous = current_metrics()
+    _current.metrics = metrics
+    if profile:
+        _start_tracing(metrics)
+    profiler = cProfile.Profile() if profile else None
+    started = time.perf_counter()
+    try:
+        if profiler is not None:
+            result = profiler.runcall(function, *args, **kwargs)
+        else:
+            result = function(*args, **kwargs)
+        metrics.ok = not (isinstance(result, str) and result.startswith("Error"))
+        return result, metrics
+    except BaseException:
+        metrics.ok = False
+        raise
+    finally:
+        metrics.finalize(time.perf_counter() - started)
+        metrics.peak_memory = _stop_tracing(metrics) if profile else peak_rss_bytes()
+        _current.metrics = previous
+        if profiler is not None:
+            save_profile(metrics, profiler)
+
+
+def save_profile(metrics, profiler, top=15):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{metrics.operation.replace(' ', '_')}_{time.strftime('%Y%m%d-%H%M%S')}.prof"
+    metrics.profile_path = os.path.join(PROFILE_DIR, name)
+    profiler.dump_stats(metrics.profile_path)
+
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(top)
+    metrics.profile_text = text.getvalue()
+
+
+def create_metrics_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS operation_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recorded_at TEXT NOT NULL,
+            operation TEXT NOT NULL,
+            file_name TEXT NOT NULL,
+            ok INTEGER NOT NULL,
+            total_seconds REAL NOT NULL,
+            decode_seconds REAL NOT NULL,
+            dsp_seconds REAL NOT NULL,
+            encode_seconds REAL NOT NULL,
+            bytes_read INTEGER NOT NULL,
+            bytes_written INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            peak_memory_bytes INTEGER NOT NULL
+        )
+    ''')
+
+
+def save_metrics(metrics, db_file=METRICS_DB_FILE):
+    conn = sqlite3.connect(db_file)
+    try:
+        create_metrics_table(conn)
+        conn.execute("INSERT INTO operation_metrics (recorded_at, operation, file_name, ok, total_seconds, "
+                     "decode_seconds, dsp_seconds, encode_seconds, bytes_read, bytes_written, samples, "
+                     "peak_memory_bytes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     (time.strftime("%Y-%m-%d %H:%M:%S"), metrics.operation, metrics.file_name, int(metrics.ok),
+                      metrics.total_seconds, metrics.stages["decode"], metrics.stages["dsp"],
+                      metrics.stages["encode"], metrics.bytes_read, metrics.bytes_written, metrics.samples,
+                      metrics.peak_memory))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# the slowest recorded runs, optionally for one operation
+def slowest_operations(limit=20, operation=None, db_file=METRICS_DB_FILE):
+    conn = sqlite3.connect(db_file)
+    try:
+        create_metrics_table(conn)
+        query = ("SELECT recorded_at, operation, file_name, total_seconds, samples, peak_memory_bytes "
+                 "FROM operation_metrics")
+        params = ()
+        if operation:
+            query += " WHERE operation = ?"
+            params = (operation,)
+        return conn.execute(query + " ORDER BY total_seconds DESC LIMIT ?", params + (limit,)).fetchall()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show the slowest recorded audio operations.")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--operation", help="only show this operation")
+    args = parser.parse_args()
+    for recorded_at, operation, file_name, seconds, samples, peak in slowest_operations(args.limit, args.operation):
+        throughput = samples / seconds / 1e6 if seconds else 0.0
+        print(f"{recorded_at}  {operation:<16} {seconds:8.2f}s  {throughput:7.2f} Msamples/s  "
+              f"{peak / 1e6:8.1f} MB  {file_name}")
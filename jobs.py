@@ -0,0 +1,121 @@
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# raised inside a job when the user cancels it. it derives from BaseException so the
+# audio_tools functions' "except Exception" error handling doesn't swallow it.
+class JobCancelled(BaseException):
+    pass
+
+
+# one queued or running operation. tasks receive their Job and may call job.report(fraction)
+# as they go, which both publishes progress and is the point where a cancel takes effect.
+class Job:
+    def __init__(self, job_id, name, on_done=None, output_path=None):
+        self.id = job_id
+        self.name = name
+        self.on_done = on_done
+        self.output_path = output_path
+        self.status = "queued"
+        self.progress = 0.0
+        self.result = None
+        self.future = None
+        self._cancel_event = threading.Event()
+        self._executor = None
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def report(self, fraction):
+        if self.cancelled:
+            raise JobCancelled()
+        # only publish whole-percent changes to keep the GUI event queue quiet
+        if int(fraction * 100) != int(self.progress * 100):
+            self.progress = fraction
+            self._executor.post("-JOB-UPDATE-", self)
+
+    def describe(self):
+        if self.status == "running":
+            return f"#{self.id} {self.name} - running {self.progress * 100:.0f}%"
+        return f"#{self.id} {self.name} - {self.status}"
+
+
+# runs audio operations and AI calls on a thread pool so window.read() never blocks.
+# scipy's filters and the network calls release the GIL, so several jobs really run at once.
+# background jobs (cache builds started automatically, which nobody is waiting on) run on their
+# own smaller pool, so they never hold up an operation the user asked for.
+# events sent to the window:
+#   -JOB-UPDATE-  a job was queued, started, made progress or was cancelled
+#   -JOB-DONE-    a job finished; the event loop should call executor.finish(job)
+class JobExecutor:
+    def __init__(self, window, max_workers=2, background_workers=1):
+        self.window = window
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.background_pool = ThreadPoolExecutor(max_workers=background_workers, thread_name_prefix="background")
+        self.jobs = {}
+        self._ids = itertools.count(1)
+
+    def post(self, event, value):
+        self.window.write_event_value(event, value)
+
+    # task(job) does the work and returns its result. on_done(result) runs on the GUI
+    # thread when the job succeeds. output_path is deleted if the job is cancelled part way.
+    # background=True queues it on the background pool.
+    def submit(self, name, task, on_done=None, output_path=None, background=False):
+        job = Job(next(self._ids), name, on_done, output_path)
+        job._executor = self
+        self.jobs[job.id] = job
+        job.future = (self.background_pool if background else self.pool).submit(self._run, job, task)
+        self.post("-JOB-UPDATE-", job)
+        return job
+
+    def _run(self, job, task):
+        if job.cancelled:
+            return
+        job.status = "running"
+        self.post("-JOB-UPDATE-", job)
+        try:
+            job.result = task(job)
+            job.status = "cancelled" if job.cancelled else "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            job.result = f"Error in {job.name}: {str(e)}"
+            job.status = "failed"
+
+        if job.status == "cancelled" and job.output_path and os.path.exists(job.output_path):
+            os.remove(job.output_path)
+        self.post("-JOB-DONE-", job)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job.status in ("done", "failed", "cancelled"):
+            return False
+        job._cancel_event.set()
+        if job.future.cancel():
+            job.status = "cancelled"
+            self.post("-JOB-DONE-", job)
+        return True
+
+    # called from the event loop for -JOB-DONE-; runs the job's GUI callback
+    def finish(self, job):
+        if job.status == "done" and job.on_done is not None:
+            job.on_done(job.result)
+
+    def active_jobs(self):
+        return [job for job in self.jobs.values() if job.status in ("queued", "running")]
+
+    # clears finished jobs out of the list, keeping the most recent few for reference
+    def prune(self, keep_finished=5):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status not in ("queued", "running")]
+        for job_id in finished[:-keep_finished] if keep_finished else finished:
+            del self.jobs[job_id]
+
+    def shutdown(self):
+        for job in self.active_jobs():
+            job._cancel_event.set()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.background_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,44 @@
+import importlib
+import threading
+
+
+# stands in for a heavy module and imports it the first time one of its attributes is used.
+# this keeps librosa, scipy and the Gemini client out of the GUI's startup time.
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+# imports the given modules (and runs any extra setup callables) on a background thread,
+# so they are usually ready by the time the user clicks something that needs them
+def warm_up(module_names, *setup, on_error=None):
+    def run():
+        for name in module_names:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                if on_error is not None:
+                    on_error(name, e)
+        for step in setup:
+            try:
+                step()
+            except Exception as e:
+                if on_error is not None:
+                    on_error(getattr(step, "__name__", "setup"), e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# persistent cache of AI replies so an identical request to the same model and settings (for
+# example the audio summary of a file nobody has touched since) is not sent and billed twice.
+# a request is the whole message list sent, chat context included, so a reply given in one
+# conversation is never served in another; a prompt sent with no history before it matches any
+# other time it is sent that way.
+CACHE_DB_FILE = "llm_cache.db"
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+
+
+def cache_key(messages, model_config):
+    payload = json.dumps({"messages": messages, "model": model_config}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# entries expire after ttl_seconds; once the stored replies pass max_bytes the least
+# recently used ones are evicted. safe to share between job threads.
+class ResponseCache:
+    def __init__(self, db_file=CACHE_DB_FILE, ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.db_file = db_file
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self._conn.commit()
+
+    def get(self, messages, model_config):
+        key = cache_key(messages, model_config)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, messages, model_config, response):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses (key, response, size, created_at, last_used) "
+                               "VALUES (?, ?, ?, ?, ?)", (cache_key(messages, model_config), response, size, now, now))
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
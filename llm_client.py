@@ -0,0 +1,356 @@
+import asyncio
+import concurrent.futures
+import json
+import os
+import random
+import threading
+from lazy_imports import LazyModule
+
+# asyncio client for the AI assistant. replies stream in chunk by chunk from a provider, with a
+# timeout between chunks, an overall deadline, retries with backoff and cancellation. the event
+# loop runs on its own thread so neither the GUI nor the job threads block on the network.
+genai = LazyModule("google.generativeai")
+
+GEMINI_MODEL = "gemini-2.0-flash-exp"
+DEFAULT_GENERATION_CONFIG = {
+    "temperature": 1,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 8192,
+    "response_mime_type": "text/plain",
+}
+
+# set to "stub" (or "stub:<port>") to talk to the local stub server instead of Gemini
+PROVIDER_ENV = "AUDIO_ASSISTANT_LLM"
+STUB_HOST = "127.0.0.1"
+STUB_PORT = 8765
+
+DEFAULT_CHUNK_TIMEOUT = 30.0
+DEFAULT_TOTAL_TIMEOUT = 180.0
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+
+# google api errors worth another try, matched by name so the Gemini package stays optional
+RETRYABLE_ERROR_NAMES = ("ServiceUnavailable", "ResourceExhausted", "TooManyRequests", "DeadlineExceeded",
+                         "InternalServerError", "GatewayTimeout")
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMTimeout(LLMError):
+    pass
+
+
+# a failure the provider expects to clear up (rate limits, overloaded server)
+class LLMRetryableError(LLMError):
+    pass
+
+
+def is_retryable(error):
+    if isinstance(error, (LLMTimeout, LLMRetryableError, ConnectionError)):
+        return True
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+# providers turn a chat history into an async stream of text chunks. messages are dicts
+# {"role": "user" | "model", "text": ...}, oldest first, ending with the new prompt.
+class Provider:
+    name = "provider"
+
+    def load(self):
+        pass
+
+    # the settings that change what the model replies, for the response cache key
+    def config(self):
+        return {"provider": self.name}
+
+    async def stream(self, messages):
+        raise NotImplementedError
+        yield
+
+
+class GeminiProvider(Provider):
+    name = "Gemini"
+
+    def __init__(self, api_key_file="secret.txt", model_name=GEMINI_MODEL, **generation_config):
+        self.api_key_file = api_key_file
+        self.model_name = model_name
+        self.generation_config = dict(DEFAULT_GENERATION_CONFIG, **generation_config)
+        self._model = None
+        self._lock = threading.Lock()
+
+    # reads the API key and builds the model the first time the AI is used
+    def load(self):
+        with self._lock:
+            if self._model is None:
+                with open(self.api_key_file, "r", encoding="utf-8") as api_file:
+                    api_key = api_file.read().strip()
+                genai.configure(api_key=api_key)
+                self._model = genai.GenerativeModel(
+                    model_name=self.model_name,
+                    generation_config=genai.types.GenerationConfig(**self.generation_config),
+                )
+            return self._model
+
+    def config(self):
+        return {"provider": self.name, "model": self.model_name, **self.generation_config}
+
+    async def stream(self, messages):
+        contents = [{"role": message["role"], "parts": [message["text"]]} for message in messages]
+        response = await self.load().generate_content_async(contents, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+# talks to the stub server below over plain HTTP; the reply is one JSON object per line
+class StubProvider(Provider):
+    name = "stub server"
+
+    def __init__(self, host=STUB_HOST, port=STUB_PORT):
+        self.host = host
+        self.port = port
+
+    async def stream(self, messages):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            body = json.dumps({"messages": messages}).encode("utf-8")
+            writer.write(f"POST /stream HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                         f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                         f"Connection: close\r\n\r\n".encode("ascii") + body)
+            await writer.drain()
+
+            status = int((await reader.readline()).split()[1])
+            while (await reader.readline()) not in (b"\r\n", b""):
+                pass
+            if status != 200:
+                error = LLMRetryableError if status == 429 or status >= 500 else LLMError
+                raise error(f"stub server returned HTTP {status}")
+
+            async for line in reader:
+                if line.strip():
+                    yield json.loads(line)["text"]
+        finally:
+            writer.close()
+
+
+def make_provider(setting=None):
+    setting = setting if setting is not None else os.environ.get(PROVIDER_ENV, "gemini")
+    name, _, port = setting.partition(":")
+    if name == "stub":
+        return StubProvider(port=int(port) if port else STUB_PORT)
+    return GeminiProvider()
+
+
+class LLMClient:
+    def __init__(self, provider, chunk_timeout=DEFAULT_CHUNK_TIMEOUT, total_timeout=DEFAULT_TOTAL_TIMEOUT,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+        self.provider = provider
+        self.chunk_timeout = chunk_timeout
+        self.total_timeout = total_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="llm-client", daemon=True)
+        self._thread.start()
+
+    async def _attempt(self, messages, on_chunk, received):
+        chunks = self.provider.stream(messages).__aiter__()
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), self.chunk_timeout)
+                except StopAsyncIteration:
+                    return "".join(received)
+                except asyncio.TimeoutError:
+                    raise LLMTimeout(f"no reply from {self.provider.name} for {self.chunk_timeout:g}s")
+                received.append(chunk)
+                on_chunk(chunk)
+        finally:
+            await chunks.aclose()
+
+    # retries only before the first chunk arrives: once text has been shown a replay would duplicate it.
+    # total_timeout is the deadline for the whole request: every attempt, and the backoff between
+    # them, only gets the time that is left of it.
+    async def _complete(self, messages, on_chunk):
+        deadline = self.loop.time() + self.total_timeout
+        timed_out = LLMTimeout(f"{self.provider.name} did not finish within {self.total_timeout:g}s")
+        for attempt in range(self.retries + 1):
+            received = []
+            try:
+                return await asyncio.wait_for(self._attempt(messages, on_chunk, received),
+                                              max(0.0, deadline - self.loop.time()))
+            except asyncio.TimeoutError:
+                raise timed_out
+            except Exception as e:
+                error = e
+            if received or attempt == self.retries or not is_retryable(error):
+                raise error
+            delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.0)
+            if self.loop.time() + delay >= deadline:
+                raise timed_out from error
+            await asyncio.sleep(delay)
+
+    # starts a request and returns a concurrent future for the full reply. on_chunk(text) runs on
+    # the client thread for every chunk as it arrives; cancelling the future stops the request.
+    def submit(self, messages, on_chunk=None):
+        return asyncio.run_coroutine_threadsafe(
+            self._complete(list(messages), on_chunk or (lambda text: None)), self.loop)
+
+    # blocking form for job threads. returns the reply, or None if should_cancel() turned true first
+    def complete(self, messages, on_chunk=None, should_cancel=None, poll_seconds=0.1):
+        future = self.submit(messages, on_chunk)
+        while True:
+            try:
+                return future.result(timeout=poll_seconds)
+            except concurrent.futures.TimeoutError:
+                if should_cancel is not None and should_cancel():
+                    future.cancel()
+                    return None
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+DEFAULT_HISTORY_TOKENS = 6000
+DEFAULT_SUMMARY_TOKENS = 800
+SUMMARY_LINE_CHARS = 240
+
+
+# a rough token count (about four characters per token) that is good enough for budgeting
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+# the chat context resent with every prompt. once the turns pass token_budget the oldest ones are
+# folded into a short running summary (the first few lines of each exchange), and the summary
+# itself drops its oldest lines past summary_budget, so the request size stays flat over a session.
+class ChatHistory:
+    def __init__(self, token_budget=DEFAULT_HISTORY_TOKENS, summary_budget=DEFAULT_SUMMARY_TOKENS):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.turns = []  # (prompt, reply) pairs, oldest first
+        self.summary = []
+        self._lock = threading.Lock()
+
+    # the messages to send for a new prompt: summary, recent turns, then the prompt
+    def messages_for(self, prompt):
+        with self._lock:
+            messages = []
+            if self.summary:
+                messages.append({"role": "user", "text": "Summary of our earlier conversation:\n"
+                                                         + "\n".join(self.summary)})
+                messages.append({"role": "model", "text": "Understood."})
+            for user_text, model_text in self.turns:
+                messages.append({"role": "user", "text": user_text})
+                messages.append({"role": "model", "text": model_text})
+            messages.append({"role": "user", "text": prompt})
+            return messages
+
+    def add(self, prompt, reply):
+        with self._lock:
+            self.turns.append((prompt, reply))
+            self._compact()
+
+    def _compact(self):
+        # the newest exchange is always kept whole, even on its own over budget
+        while len(self.turns) > 1 and self._turn_tokens() > self.token_budget:
+            user_text, model_text = self.turns.pop(0)
+            self.summary.append(f"- asked: {shorten(user_text)} / answered: {shorten(model_text)}")
+        while self.summary and sum(estimate_tokens(line) for line in self.summary) > self.summary_budget:
+            self.summary.pop(0)
+
+    def _turn_tokens(self):
+        return sum(estimate_tokens(user_text) + estimate_tokens(model_text) for user_text, model_text in self.turns)
+
+    def clear(self):
+        with self._lock:
+            self.turns.clear()
+            self.summary.clear()
+
+
+def shorten(text, limit=SUMMARY_LINE_CHARS // 2):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+STUB_REPLY = ("This is the local stub server. Your audio summary was received; the levels look reasonable, "
+              "consider a gentle high-pass filter below 30 Hz and normalizing to -14 LUFS for streaming.")
+
+
+# a local stand-in for the real API for trying the client without a network or API key.
+# the first fail_first requests get HTTP 503 to exercise retries, and stall_seconds pauses
+# half way through every reply to exercise the chunk timeout.
+async def serve_stub(host=STUB_HOST, port=STUB_PORT, delay=0.05, fail_first=0, stall_seconds=0.0):
+    requests = 0
+
+    async def handle(reader, writer):
+        nonlocal requests
+        requests += 1
+        try:
+            await reader.readline()
+            length = 0
+            while True:
+                header = await reader.readline()
+                if header in (b"\r\n", b""):
+                    break
+                name, _, value = header.decode("latin-1").partition(":")
+                if name.strip().lower() == "content-length":
+                    length = int(value)
+            messages = json.loads(await reader.readexactly(length))["messages"]
+
+            if requests <= fail_first:
+                writer.write(b"HTTP/1.1 503 Service Unavailable\r\nConnection: close\r\n\r\n")
+                return
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n")
+            words = f"(reply to {len(messages)} message(s)) {STUB_REPLY}".split(" ")
+            for index, word in enumerate(words):
+                if stall_seconds and index == len(words) // 2:
+                    await asyncio.sleep(stall_seconds)
+                writer.write((json.dumps({"text": word + " "}) + "\n").encode("utf-8"))
+                await writer.drain()
+                await asyncio.sleep(delay)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Run the local LLM stub server, or stream one prompt.")
+    parser.add_argument("prompt", nargs="?", help="prompt to send (omit to run the stub server)")
+    parser.add_argument("--provider", default=None, help="gemini or stub[:port] (default: $%s or gemini)"
+                                                         % PROVIDER_ENV)
+    parser.add_argument("--port", type=int, default=STUB_PORT, help="stub server port")
+    parser.add_argument("--delay", type=float, default=0.05, help="stub server seconds between chunks")
+    parser.add_argument("--fail-first", type=int, default=0, help="stub server answers this many requests with 503")
+    parser.add_argument("--stall", type=float, default=0.0, help="stub server pause in the middle of each reply")
+    args = parser.parse_args()
+
+    if args.prompt is None:
+        print(f"stub server listening on {STUB_HOST}:{args.port}")
+        try:
+            asyncio.run(serve_stub(port=args.port, delay=args.delay, fail_first=args.fail_first,
+                                   stall_seconds=args.stall))
+        except KeyboardInterrupt:
+            pass
+    else:
+        client = LLMClient(make_provider(args.provider))
+        try:
+            client.complete([{"role": "user", "text": args.prompt}],
+                            on_chunk=lambda text: print(text, end="", flush=True))
+            print()
+        except Exception as e:
+            print(f"\nError contacting {client.provider.name}: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            client.close()
@@ -1,67 +1,92 @@
 # project 2 joseph pignatone.
 import PySimpleGUI as sg
 import os
-import google.generativeai as genai
-import simpleaudio as sa
+from lazy_imports import warm_up
 # from huggingface_hub import InferenceClient (old import)
-from audio_tools import detect_bpm, normalize_audio, remove_silence, apply_equalizer, bass_boost, apply_reverb, \
-    reverse_audio, play_with_meter
+from audio_tools import normalize_audio, remove_silence, apply_equalizer, bass_boost, apply_reverb, \
+    reverse_audio, process_chain, auto_block_size, LiveEqualizer, EQ_BAND_TYPES, WARM_UP_MODULES, \
+    NORMALIZE_MODES, DEFAULT_NORMALIZE_TARGETS
 from feedback import open_feedback_window
+from jobs import JobExecutor
+import instrumentation
+from llm_client import LLMClient, ChatHistory, make_provider
+from llm_cache import ResponseCache
+from render_cache import RenderCache
+from analysis import analyze_file, describe_analysis
+from tempo import estimate_tempo, describe_tempo, format_time, MIN_CONFIDENCE as MIN_TEMPO_CONFIDENCE
+from playback import PlaybackEngine, run_meter, METER_FLOOR_DB
+from peaks import load_peaks, describe_peaks
+from spectrum import load_spectrum, run_spectrum, SPECTRUM_BANDS, SPECTRUM_FLOOR_DB
+
+# replies stream from the provider on the client's own event loop thread.
+# set AUDIO_ASSISTANT_LLM=stub to use the local stub server (python llm_client.py) instead of Gemini.
+llm = LLMClient(make_provider())
+chat_history = ChatHistory()  # recent turns within a token budget, older ones summarized
+response_cache = ResponseCache()
+DSP_WORKERS = 0  # operations spread channels and segments over every core
+render_cache = RenderCache()  # processed files, reused when the same settings run on the same audio again
+
+
+# runs inside a job: streams the reply to on_chunk as it arrives and returns the full text,
+# or None if the job was cancelled. a prompt already answered by the same model is served
+# from the response cache. the exchange is added to the chat history once it completes.
+def query_llm(job, prompt, on_chunk=None):
+    # the cache is keyed on everything sent, so a reply is only reused with the same chat context
+    messages = chat_history.messages_for(prompt)
+    reply = response_cache.get(messages, llm.provider.config())
+    if reply is not None:
+        if on_chunk is not None:
+            on_chunk(reply)
+    else:
+        try:
+            reply = llm.complete(messages, on_chunk, should_cancel=lambda: job.cancelled)
+        except Exception as e:
+            return f"Error contacting {llm.provider.name}: {str(e)}"
+        if reply is None:
+            return None
+        response_cache.put(messages, llm.provider.config(), reply)
+    chat_history.add(prompt, reply)
+    return reply
 
-with open("secret.txt", "r", encoding="utf-8") as api_file:
-    api_key = api_file.read().strip()
 
-genai.configure(api_key=api_key)
+def stream_to_output(text):
+    window.write_event_value("-LLM-CHUNK-", text)
 
-# altered from python dictionary to resolve error
-generation_config = genai.types.GenerationConfig(
-    temperature=1,
-    top_p=0.95,
-    top_k=40,
-    max_output_tokens=8192,
-    response_mime_type="text/plain",
-)
 
-model = genai.GenerativeModel(
-    model_name="gemini-2.0-flash-exp",
-    generation_config=generation_config,
-)
+player = PlaybackEngine()  # streams the selected file to the sound device; play, pause, seek and stop share it
+shown_position = 0.0  # playback position last shown on the seek slider
 
-chat_session = model.start_chat(history=[])
 
-
-def query_llm(prompt: str) -> str:
-    try:
-        response = chat_session.send_message(prompt)
-        return response.text
-    except Exception as e:
-        return f"Error contacting Gemini: {str(e)}"
+# the peak pyramid of the playing file, or None while it is still being computed
+def playing_peaks():
+    return waveform_peaks if player.file_path == waveform_path else None
 
 
-play_obj = None  # controls audio playback
+# the spectrum frames of the playing file, or None while they are still being computed
+def playing_spectrum():
+    return spectrum_frames if player.file_path == waveform_path else None
 
 
-def play_audio(file_path):
-    global play_obj
+# starts playback (from start seconds) and the meter and spectrum analyzer that follow it
+def play_audio(file_path, start=0.0):
     try:
         if not file_path.lower().endswith(".wav"):
             return "Only .wav files can be played."
 
-        wave_obj = sa.WaveObject.from_wave_file(file_path)
-        play_obj = wave_obj.play()
+        player.play(file_path, start=start)
+        run_meter(player, window, playing_peaks)
+        run_spectrum(player, window, playing_spectrum)
         return f"▶️ Playing {os.path.basename(file_path)}..."
     except Exception as e:
         return f"Error playing audio: {str(e)}"
 
 
 def stop_audio():
-    global play_obj
     try:
-        if play_obj is not None and hasattr(play_obj, "stop"):
-            play_obj.stop()
-            return "⏹️ Playback stopped."
-        else:
-            return "Cannot stop playback, unsupported or not started."
+        if not player.active:
+            return "Cannot stop playback, nothing is playing."
+        player.stop()
+        return "⏹️ Playback stopped."
     except Exception as e:
         return f"Error stopping playback: {str(e)}"
 
@@ -80,11 +105,132 @@ latest_bpm = None  # stores last detected BPM
 # tracks the last edited file for LLM
 previous_file = None
 
-
-# summary for the LLM based on previous operations (if any)
+# operations that can be queued in the chain, mapped to their audio_tools chain names
+CHAIN_STEPS = {
+    "Remove Silence": "remove_silence",
+    "Equalize": "equalize",
+    "Bass Boost": "bass_boost",
+    "Reverb": "reverb",
+    "Normalize": "normalize",
+    "Reverse Audio": "reverse",
+}
+
+# queued chain steps as (display name, chain operation, params)
+chain_steps = []
+
+
+# draws the stereo meter: a bar per channel for the level and a white line for the held peak.
+# mono files show the same level on both bars, and levels is None when playback ends.
+def draw_meter(graph, levels):
+    graph.erase()
+    if levels is None:
+        return
+    rms, peaks = levels
+    if len(rms) == 1:
+        rms, peaks = rms * 2, peaks * 2
+    for row, (level, peak) in enumerate(zip(rms[:2], peaks[:2])):
+        top = 2 - row - 0.1
+        bottom = 1 - row + 0.1
+        color = "red" if level > -3 else "yellow" if level > -12 else "green"
+        graph.draw_rectangle((METER_FLOOR_DB, top), (level, bottom), fill_color=color, line_color=color)
+        graph.draw_line((peak, top), (peak, bottom), color="white", width=2)
+
+
+# the spectrum analyzer: one bar per log-spaced band, levels in dB, None when playback ends
+SPECTRUM_WIDTH = 400
+
+
+def draw_spectrum(graph, levels):
+    graph.erase()
+    if levels is None:
+        return
+    width = SPECTRUM_WIDTH / len(levels)
+    for band, level in enumerate(levels):
+        if level <= SPECTRUM_FLOOR_DB:
+            continue
+        color = "red" if level > -6 else "yellow" if level > -18 else "green"
+        graph.draw_rectangle((band * width + 1, SPECTRUM_FLOOR_DB), ((band + 1) * width - 1, level),
+                             fill_color=color, line_color=color)
+
+
+# the waveform overview: the selected file's peak pyramid and the part of it on screen.
+# silence_marks are the pauses a remove silence preview found, drawn in red.
+WAVEFORM_WIDTH = 800
+waveform_path = None
+waveform_peaks = None
+view_start = 0.0
+view_span = 0.0
+silence_marks = []
+waveform_cursor = None  # figure id of the playback position line
+spectrum_frames = None  # the selected file's precomputed spectrum analyzer frames
+
+
+def draw_waveform(graph):
+    global waveform_cursor
+    graph.erase()
+    waveform_cursor = None
+    if waveform_peaks is None or view_span <= 0:
+        return
+    view_end = view_start + view_span
+    for start, end in silence_marks:
+        if end > view_start and start < view_end:
+            left = (max(start, view_start) - view_start) / view_span * WAVEFORM_WIDTH
+            right = (min(end, view_end) - view_start) / view_span * WAVEFORM_WIDTH
+            graph.draw_rectangle((left, -1), (right, 1), fill_color="#402020", line_color="#402020")
+    mins, maxs, rms = waveform_peaks.view(view_start, view_end, WAVEFORM_WIDTH)
+    step = WAVEFORM_WIDTH / max(1, len(mins))
+    for column in range(len(mins)):
+        x = column * step
+        graph.draw_line((x, mins[column].min()), (x, maxs[column].max()), color="steel blue")
+        level = rms[column].max()
+        graph.draw_line((x, -level), (x, level), color="light sky blue")
+
+
+def draw_cursor(graph, position):
+    global waveform_cursor
+    if waveform_cursor is not None:
+        graph.delete_figure(waveform_cursor)
+        waveform_cursor = None
+    if waveform_peaks is not None and view_span > 0 and view_start <= position <= view_start + view_span:
+        x = (position - view_start) / view_span * WAVEFORM_WIDTH
+        waveform_cursor = graph.draw_line((x, -1), (x, 1), color="white")
+
+
+# keeps the view inside the file after zooming or scrolling
+def set_view(start, span):
+    global view_start, view_span
+    duration = waveform_peaks.duration
+    view_span = min(duration, max(0.05, span))
+    view_start = min(max(0.0, start), duration - view_span)
+    draw_waveform(window["-WAVEFORM-"])
+
+
+def show_spectrum(file_path, frames):
+    global spectrum_frames
+    if file_path == waveform_path:
+        spectrum_frames = frames
+
+
+def show_waveform(file_path, pyramid):
+    global waveform_peaks, silence_marks
+    if file_path != waveform_path:
+        return  # another file was selected while this one was being scanned
+    waveform_peaks = pyramid
+    silence_marks = []
+    set_view(0.0, pyramid.duration)
+
+
+# summary for the LLM based on previous operations (if any) and the file's measured analysis
 # this allows the LLM to offer help based on what the user has done
-def generate_summary(file_path, bpm=None):
+def generate_summary(file_path, bpm=None, analysis=None, peaks=None):
     summary = f"File: {os.path.basename(file_path)}\n\n"
+    measurements = (describe_analysis(analysis) if analysis is not None else []) + \
+        (describe_peaks(peaks) if peaks is not None else [])
+    if measurements:
+        summary += "Measurements:\n"
+        for line in measurements:
+            summary += f"• {line}\n"
+        summary += "\n"
     if applied_operations:
         summary += "Operations applied:\n"
         for op in applied_operations:
@@ -103,12 +249,22 @@ layout = [
 
     # audio file selection window
     [sg.Text("🎵 Select an audio file:", font=FONT_TEXT),
-     sg.Input(key="-FILE-", font=FONT_TEXT, expand_x=True),
+     sg.Input(key="-FILE-", font=FONT_TEXT, expand_x=True, enable_events=True),
      sg.FileBrowse(file_types=(("Audio Files", "*.wav"),), font=FONT_TEXT)],
     [sg.Push(),
      sg.Button("▶️ Play Audio", button_color=("white", "green"), font=FONT_TEXT),
+     sg.Button("⏯️ Pause", font=FONT_TEXT),
      sg.Button("⏹️ Stop", button_color=("white", "red"), font=FONT_TEXT),
      sg.Push()],
+    [sg.Slider(range=(0, 1), resolution=0.1, orientation='h', disable_number_display=True, enable_events=True,
+               expand_x=True, key="-SEEK-"),
+     sg.Text("0:00 / 0:00", font=FONT_TEXT, key="-POSITION-")],
+    [sg.Graph(canvas_size=(WAVEFORM_WIDTH, 120), graph_bottom_left=(0, -1), graph_top_right=(WAVEFORM_WIDTH, 1),
+              background_color="black", enable_events=True, key="-WAVEFORM-")],
+    [sg.Push(),
+     sg.Button("Zoom In", font=FONT_TEXT), sg.Button("Zoom Out", font=FONT_TEXT),
+     sg.Button("◀", font=FONT_TEXT), sg.Button("▶", font=FONT_TEXT),
+     sg.Push()],
 
     # Audio tool buttons
     [sg.Frame("🛠 Manual Operations", [
@@ -118,21 +274,46 @@ layout = [
          sg.Button("Detect BPM", size=(15, 1), font=FONT_TEXT)],
         [sg.Button("Bass Boost", size=(15, 1), font=FONT_TEXT),
          sg.Button("Reverb", size=(15, 1), font=FONT_TEXT)],
-        [sg.Button("Reverse Audio", size=(15, 1), font=FONT_TEXT)],
+        [sg.Button("Reverse Audio", size=(15, 1), font=FONT_TEXT),
+         sg.Checkbox("Profile next run", key="-PROFILE-", font=FONT_TEXT),
+         sg.Checkbox("Float32 processing", key="-FLOAT32-", font=FONT_TEXT,
+                     tooltip="half the memory; 16/24-bit results are dithered")],
         [sg.Button("*New* Suggest Feature", button_color=('white', 'blue'), font=FONT_TEXT)]
     ], expand_x=True)],
 
+    # operation chain: decodes once, runs every queued step in memory, writes one file
+    [sg.Frame("🔗 Operation Chain", [
+        [sg.Combo(list(CHAIN_STEPS), default_value="Remove Silence", readonly=True, key="-CHAIN-OP-",
+                  font=FONT_TEXT),
+         sg.Button("Add Step", font=FONT_TEXT),
+         sg.Button("Clear Chain", font=FONT_TEXT),
+         sg.Button("Run Chain", button_color=('white', 'green'), font=FONT_TEXT)],
+        [sg.Listbox(values=[], size=(60, 4), key="-CHAIN-", font=FONT_TEXT)]
+    ], expand_x=True)],
+
     # AI assistant window
     [sg.Frame("🤖 AI Assistant", [
         [sg.Button("Analyze with AI Assistant", button_color=('white', 'green'), font=FONT_TEXT, key="AI Assistant")],
         [sg.Button("*New* Generate Audio Code", button_color=('white', 'green'), font=FONT_TEXT)]
     ], expand_x=True)],
 
+    # background jobs: operations and AI calls run here so the window stays responsive
+    [sg.Frame("⏳ Jobs", [
+        [sg.Listbox(values=[], size=(60, 4), key="-JOBS-", font=FONT_TEXT),
+         sg.Button("Cancel Job", button_color=('white', 'firebrick'), font=FONT_TEXT)]
+    ], expand_x=True)],
+
     # output log window
     [sg.Text("📝 Output Log", font=FONT_TEXT)],
     [sg.Multiline(size=(90, 20), key="-OUTPUT-", autoscroll=True, disabled=True, font=("Courier New", 12))],
     [sg.Text("🔊 Live Volume Meter", font=FONT_TEXT)],
-    [sg.ProgressBar(max_value=40, orientation='h', size=(40, 20), key='-METER-')],
+    [sg.Column([[sg.Text("L", font=FONT_TEXT)], [sg.Text("R", font=FONT_TEXT)]]),
+     sg.Graph(canvas_size=(400, 40), graph_bottom_left=(METER_FLOOR_DB, 0), graph_top_right=(0, 2),
+              background_color="black", key='-METER-')],
+    [sg.Text("📊 Spectrum", font=FONT_TEXT)],
+    [sg.Graph(canvas_size=(SPECTRUM_WIDTH, 100), graph_bottom_left=(0, SPECTRUM_FLOOR_DB),
+              graph_top_right=(SPECTRUM_WIDTH, 0), background_color="black", key="-SPECTRUM-",
+              tooltip=f"{SPECTRUM_BANDS} log-spaced frequency bands")],
 
     [sg.Push(), sg.Button("Exit", font=FONT_TEXT, button_color=("white", "red"))]
 ]
@@ -140,42 +321,273 @@ layout = [
 
 # launches a separate EQ window for the user when "equalize" is selected.
 # this allows the user to make custom EQ moves.
-# there are four EQ bands for the user to utilize at preset frequencies.
-def show_eq_popup():
+# the user can add, edit and remove any number of parametric bands (peak, shelf or notch).
+# it starts with the original four bands at 0 dB.
+# with "Preview" ticked the selected file loops through a live equalizer, and moving the controls
+# changes the selected band as you listen. the file is only rendered when the user clicks Apply EQ.
+def format_band(band):
+    return f"{band['type']:<10} {band['frequency']:>7.0f} Hz  {band['gain']:+5.1f} dB  Q {band['q']:.2f}"
+
+
+def show_eq_popup(file_path=None):
+    bands = [{'type': "peak", 'frequency': frequency, 'gain': 0.0, 'q': 1.0} for frequency in (60, 250, 1000, 4000)]
+
     layout = [
-        [sg.Text("Adjust Equalizer Gains (in dB)")],
-        [sg.Text("60 Hz", size=(8, 1)),
-         sg.Slider(range=(-12, 12), resolution=1, orientation='h', size=(30, 15), key="-EQ60-")],
-        [sg.Text("250 Hz", size=(8, 1)),
-         sg.Slider(range=(-12, 12), resolution=1, orientation='h', size=(30, 15), key="-EQ250-")],
-        [sg.Text("1 kHz", size=(8, 1)),
-         sg.Slider(range=(-12, 12), resolution=1, orientation='h', size=(30, 15), key="-EQ1K-")],
-        [sg.Text("4 kHz", size=(8, 1)),
-         sg.Slider(range=(-12, 12), resolution=1, orientation='h', size=(30, 15), key="-EQ4K-")],
+        [sg.Text("Equalizer bands")],
+        [sg.Listbox(values=[format_band(band) for band in bands], size=(50, 8), key="-BANDS-",
+                    enable_events=True, font=("Courier New", 10))],
+        [sg.Text("Type", size=(10, 1)),
+         sg.Combo(list(EQ_BAND_TYPES), default_value="peak", readonly=True, enable_events=True, key="-TYPE-")],
+        [sg.Text("Frequency (Hz)", size=(10, 1)), sg.Input("1000", size=(10, 1), enable_events=True, key="-FREQ-")],
+        [sg.Text("Gain (dB)", size=(10, 1)),
+         sg.Slider(range=(-12, 12), resolution=0.5, orientation='h', size=(30, 15), enable_events=True,
+                   key="-GAIN-")],
+        [sg.Text("Q", size=(10, 1)),
+         sg.Slider(range=(0.1, 10), resolution=0.1, default_value=1.0, orientation='h', size=(30, 15),
+                   enable_events=True, key="-Q-")],
+        [sg.Button("Add Band"), sg.Button("Update Band"), sg.Button("Remove Band"),
+         sg.Checkbox("Preview", enable_events=True, key="-PREVIEW-",
+                     disabled=file_path is None or not os.path.isfile(file_path))],
         [sg.Button("Apply EQ", button_color=('white', 'green')),
          sg.Button("Cancel", button_color=('white', 'firebrick'))]
     ]
 
     eq_window = sg.Window("Adjust Equalizer", layout, modal=True)
 
+    def band_from_values(values):
+        frequency = float(values["-FREQ-"])
+        if frequency <= 0:
+            raise ValueError("frequency must be positive")
+        return {'type': values["-TYPE-"], 'frequency': frequency, 'gain': values["-GAIN-"], 'q': values["-Q-"]}
+
+    def selected_index():
+        indexes = eq_window["-BANDS-"].get_indexes()
+        return indexes[0] if indexes else None
+
+    # the bands as heard: the list, with the selected band following the controls
+    def preview_bands(values):
+        current = list(bands)
+        index = selected_index()
+        if index is not None:
+            try:
+                current[index] = band_from_values(values)
+            except ValueError:
+                pass
+        return current
+
+    preview = None  # the LiveEqualizer being heard, while "Preview" is ticked
+
+    def make_preview(sample_rate, channels, values):
+        nonlocal preview
+        preview = LiveEqualizer(preview_bands(values), sample_rate, channels)
+        return preview.process
+
     while True:
         event, values = eq_window.read()
+        # the selected band follows the controls, so what is applied is what was heard
+        if event == "Apply EQ" and selected_index() is not None:
+            try:
+                band_from_values(values)
+            except ValueError:
+                sg.popup_error("Frequency must be a positive number.", title="Invalid Band")
+                continue
+        if event in (sg.WINDOW_CLOSED, "Cancel", "Apply EQ") and preview is not None:
+            player.stop()
         if event in (sg.WINDOW_CLOSED, "Cancel"):
             eq_window.close()
             return None  # User clicked cancel
         elif event == "Apply EQ":  # apply EQ moves set by user
+            applied = preview_bands(values)
             eq_window.close()
-            return [
-                {'frequency': 60, 'gain': values["-EQ60-"]},
-                {'frequency': 250, 'gain': values["-EQ250-"]},
-                {'frequency': 1000, 'gain': values["-EQ1K-"]},
-                {'frequency': 4000, 'gain': values["-EQ4K-"]},
-            ]
+            return applied
+        elif event == "-PREVIEW-":
+            if values["-PREVIEW-"]:
+                try:
+                    player.play(file_path, on_finish=lambda: player.seek(0),
+                                make_processor=lambda sample_rate, channels, values=values:
+                                    make_preview(sample_rate, channels, values))
+                except Exception as e:
+                    sg.popup_error(f"Error playing audio: {str(e)}", title="Preview")
+                    eq_window["-PREVIEW-"].update(False)
+            else:
+                player.stop()
+                preview = None
+            continue
+        elif event in ("-TYPE-", "-FREQ-", "-GAIN-", "-Q-"):
+            if preview is not None:
+                preview.set_bands(preview_bands(values))
+            continue
+        elif event == "-BANDS-" and selected_index() is not None:
+            band = bands[selected_index()]
+            eq_window["-TYPE-"].update(band['type'])
+            eq_window["-FREQ-"].update(f"{band['frequency']:g}")
+            eq_window["-GAIN-"].update(band['gain'])
+            eq_window["-Q-"].update(band['q'])
+            continue
+        elif event in ("Add Band", "Update Band"):
+            try:
+                band = band_from_values(values)
+            except ValueError:
+                sg.popup_error("Frequency must be a positive number.", title="Invalid Band")
+                continue
+            index = selected_index()
+            if event == "Add Band":
+                bands.append(band)
+            elif index is not None:
+                bands[index] = band
+        elif event == "Remove Band" and selected_index() is not None:
+            bands.pop(selected_index())
+
+        eq_window["-BANDS-"].update([format_band(band) for band in bands])
+        if preview is not None:
+            preview.set_bands(preview_bands(values))
+
+
+# asks how to normalize: peak (dBFS), RMS (dBFS) or integrated loudness (LUFS) and the target level.
+# returns the normalize_audio settings, or None if the user cancels.
+def show_normalize_popup():
+    default_targets = {"peak": -1.0, **DEFAULT_NORMALIZE_TARGETS}
+    layout = [
+        [sg.Text("Normalize to", size=(12, 1)),
+         sg.Combo(list(NORMALIZE_MODES), default_value="peak", readonly=True, enable_events=True, key="-MODE-")],
+        [sg.Text("Target level", size=(12, 1)), sg.Input(str(default_targets["peak"]), size=(8, 1), key="-TARGET-"),
+         sg.Text("dBFS", key="-UNIT-", size=(5, 1))],
+        [sg.Button("Normalize", button_color=('white', 'green')),
+         sg.Button("Cancel", button_color=('white', 'firebrick'))]
+    ]
+
+    normalize_window = sg.Window("Normalize", layout, modal=True)
+    while True:
+        event, values = normalize_window.read()
+        if event in (sg.WINDOW_CLOSED, "Cancel"):
+            normalize_window.close()
+            return None
+        elif event == "-MODE-":
+            normalize_window["-TARGET-"].update(str(default_targets[values["-MODE-"]]))
+            normalize_window["-UNIT-"].update("LUFS" if values["-MODE-"] == "lufs" else "dBFS")
+        elif event == "Normalize":
+            try:
+                target = float(values["-TARGET-"])
+            except ValueError:
+                sg.popup_error("The target level must be a number.", title="Invalid Target")
+                continue
+            normalize_window.close()
+            return {"mode": values["-MODE-"], "target": target}
 
 
 # window
 window = sg.Window("Audio Processing Assistant", layout, finalize=True, resizable=True)
 
+# load the heavy audio modules and the Gemini client in the background while the user reads the welcome message.
+# a missing secret.txt is reported later, when the AI assistant is actually used.
+warm_up(WARM_UP_MODULES + ("google.generativeai",), llm.provider.load)
+
+# audio operations and AI calls run as background jobs, several at a time; the waveform and
+# spectrum caches built on file selection get a worker of their own
+jobs = JobExecutor(window, max_workers=2, background_workers=1)
+listed_job_ids = []  # job ids in the order they are shown in the jobs list
+
+
+def refresh_jobs():
+    jobs.prune()
+    listed_job_ids[:] = list(jobs.jobs)
+    window["-JOBS-"].update([jobs.jobs[job_id].describe() for job_id in listed_job_ids])
+
+
+# the "Profile next run" box applies to one operation and then clears itself
+def take_profile_request():
+    profile = bool(window["-PROFILE-"].get())
+    if profile:
+        window["-PROFILE-"].update(False)
+    return profile
+
+
+# runs an audio_tools function inside a job with stage timings, byte/sample counts and peak memory
+# recorded, stores the metrics next to the suggestions table and returns (result, metrics)
+def run_instrumented(name, file_path, function, *args, profile=False, **kwargs):
+    result, metrics = instrumentation.instrument(name, file_path, function, *args, profile=profile, **kwargs)
+    try:
+        instrumentation.save_metrics(metrics)
+    except Exception as e:
+        # this runs on a job thread, so the message goes through the window's event queue
+        window.write_event_value("-OUTPUT-APPEND-", f"Could not save metrics: {str(e)}\n")
+    return result, metrics
+
+
+def show_metrics(metrics):
+    window["-OUTPUT-"].update(metrics.summary() + "\n", append=True)
+    if metrics.profile_text:
+        window["-OUTPUT-"].update(f"Profile saved to {metrics.profile_path}\n{metrics.profile_text}\n", append=True)
+
+
+# queues an audio operation as a background job. the result is written to the processed audio
+# folder (or an identical earlier render is reused) and, once the job succeeds, the operation
+# is recorded for the LLM. the "Float32 processing" box picks the precision it runs in.
+def start_operation(name, file_path, suffix, operation, record, **kwargs):
+    profile = take_profile_request()
+    kwargs.setdefault("precision", "float32" if window["-FLOAT32-"].get() else "float64")
+
+    def task(job):
+        # the output name depends on the file's content hash, so the job learns it once rendering starts
+        def set_output_path(path):
+            job.output_path = path
+
+        return run_instrumented(name, file_path, render_cache.render, name, operation, file_path, suffix,
+                                progress=job.report, on_output_path=set_output_path, profile=profile, **kwargs)
+
+    def on_done(outcome):
+        result, metrics = outcome
+        window["-OUTPUT-"].update(result + "\n", append=True)
+        show_metrics(metrics)
+        if file_path == previous_file and not result.startswith("Error"):
+            applied_operations.append(record)
+
+    jobs.submit(f"{name} {os.path.basename(file_path)}", task, on_done=on_done)
+
+
+# the fast estimate answers most files in a fraction of a second. when its confidence is low the
+# tempo comes from the full file analysis instead, which also prepares the AI summary.
+def detect_tempo(file_path, progress=None):
+    estimate = estimate_tempo(file_path, progress)
+    if estimate["bpm"] is None or estimate["confidence"] < MIN_TEMPO_CONFIDENCE:
+        estimate = dict(estimate, bpm=analyze_file(file_path, progress)["bpm"], method="full")
+    if estimate["bpm"] is None:
+        return "Error detecting BPM: no steady beat found"
+    return estimate
+
+
+# runs inside a job: analyzes the file (or reads the stored analysis), then asks the assistant
+def ask_assistant(job, file_path, bpm):
+    try:
+        analysis = analyze_file(file_path, job.report)
+    except Exception as e:
+        stream_to_output(f"(file analysis failed: {str(e)})\n")
+        analysis = None
+    try:
+        peaks = load_peaks(file_path)
+    except Exception:
+        peaks = None
+    summary = generate_summary(file_path, bpm=bpm, analysis=analysis, peaks=peaks)
+
+    prompt = (
+        "You are a professional audio engineer. "
+        "Analyze the following audio summary and provide feedback on any remaining issues, and suggest improvements"
+        "that could help make the audio sound more professional:\n\n"
+        f"{summary}"
+    )
+    return query_llm(job, prompt, stream_to_output)
+
+
+def bpm_detected(file_path, estimate):
+    global latest_bpm
+    if isinstance(estimate, str):
+        window["-OUTPUT-"].update(f"{estimate}\n", append=True)
+        return
+    window["-OUTPUT-"].update("\n".join(describe_tempo(estimate)) + "\n", append=True)
+    if file_path == previous_file:
+        latest_bpm = f"{estimate['bpm']:.2f}"  # store the bpm number for LLM
+        applied_operations.append(f"Detected BPM: {latest_bpm}")
+
 # welcome message for the user
 sg.popup_ok(
     "🎧 Welcome to Audio Processing Assistant!",
@@ -194,16 +606,30 @@ while True:
     event, values = window.read()
 
     if event in (sg.WIN_CLOSED, "Exit"):
+        player.stop()
+        jobs.shutdown()
+        llm.close()
+        response_cache.close()
         break
 
     file_path = values["-FILE-"]
 
-    # clears AI history when a new file is selected
+    # clears AI history when a new file is selected, and scans it for the waveform overview and
+    # the spectrum analyzer
     if file_path != previous_file and os.path.isfile(file_path):
         applied_operations.clear()
         latest_bpm = None
         window["-OUTPUT-"].update(f"Selected file: {os.path.basename(file_path)}\n")
         previous_file = file_path
+        waveform_path, waveform_peaks = file_path, None
+        draw_waveform(window["-WAVEFORM-"])
+        jobs.submit(f"Waveform {os.path.basename(file_path)}",
+                    lambda job, path=file_path: load_peaks(path, job.report),
+                    on_done=lambda pyramid, path=file_path: show_waveform(path, pyramid), background=True)
+        spectrum_frames = None
+        jobs.submit(f"Spectrum {os.path.basename(file_path)}",
+                    lambda job, path=file_path: load_spectrum(path, job.report),
+                    on_done=lambda frames, path=file_path: show_spectrum(path, frames), background=True)
 
     if event == "*New* Suggest Feature":
         open_feedback_window()
@@ -236,8 +662,10 @@ while True:
                 )
 
                 sg.popup_quick_message("Generating code with Gemini...", auto_close_duration=2)
-                result = query_llm(base_prompt)
-                sg.popup_scrolled(result, title="AI-Generated Code", size=(100, 30), font=("Courier New", 10))
+                stream_to_output("\n\n NEW AI-GENERATED CODE \n\n")
+                jobs.submit("Generate audio code", lambda job: query_llm(job, base_prompt, stream_to_output),
+                            on_done=lambda result: sg.popup_scrolled(result, title="AI-Generated Code",
+                                                                     size=(100, 30), font=("Courier New", 10)))
                 break
 
         window.close()
@@ -250,19 +678,111 @@ while True:
         if not os.path.isfile(file_path):
             window["-OUTPUT-"].update("Please select a valid .wav file.\n", append=True)
             continue
-        window["-OUTPUT-"].update(f"▶️ Playing {os.path.basename(file_path)}...\n", append=True)
-        play_with_meter(file_path, window)
+        window["-OUTPUT-"].update(play_audio(file_path) + "\n", append=True)
+
+    elif event == "⏯️ Pause":
+        if player.active:
+            if player.paused:
+                player.resume()
+            else:
+                player.pause()
+
+    # the slider also reports its own updates, so only a real drag (away from the shown position) seeks.
+    # after the end of the file the engine has stopped, so playback restarts from the chosen point.
+    elif event == "-SEEK-":
+        target = values["-SEEK-"]
+        if abs(target - shown_position) >= 0.5 and player.file_path is not None:
+            if player.active:
+                player.seek(target)
+            else:
+                window["-OUTPUT-"].update(play_audio(player.file_path, start=target) + "\n", append=True)
+            shown_position = target
+
+    elif event == "-PLAYBACK-POSITION-":
+        shown_position, duration = values[event]
+        window["-SEEK-"].update(value=shown_position, range=(0, max(duration, 0.1)))
+        window["-POSITION-"].update(f"{format_time(shown_position)} / {format_time(duration)}")
+        if player.file_path == waveform_path:
+            draw_cursor(window["-WAVEFORM-"], shown_position)
+
+    elif event in ("Zoom In", "Zoom Out", "◀", "▶") and waveform_peaks is not None:
+        if event == "Zoom In":
+            set_view(view_start + view_span / 4, view_span / 2)
+        elif event == "Zoom Out":
+            set_view(view_start - view_span / 2, view_span * 2)
+        else:
+            set_view(view_start + (view_span if event == "▶" else -view_span) / 2, view_span)
+
+    # clicking the waveform plays from that point
+    elif event == "-WAVEFORM-" and waveform_peaks is not None and values[event][0] is not None:
+        target = view_start + values[event][0] / WAVEFORM_WIDTH * view_span
+        if player.active and player.file_path == waveform_path:
+            player.seek(target)
+        else:
+            window["-OUTPUT-"].update(play_audio(waveform_path, start=target) + "\n", append=True)
 
     elif event == "⏹️ Stop":
         result = stop_audio()
         window["-OUTPUT-"].update(result + "\n", append=True)
 
     elif event == "-METER-UPDATE-":
-        window["-METER-"].update_bar(values[event])
+        draw_meter(window["-METER-"], values[event])
+
+    elif event == "-SPECTRUM-UPDATE-":
+        draw_spectrum(window["-SPECTRUM-"], values[event])
 
     elif event == "-OUTPUT-APPEND-":
         window["-OUTPUT-"].update(values[event], append=True)
 
+    elif event == "-LLM-CHUNK-":
+        window["-OUTPUT-"].update(values[event], append=True)
+
+    elif event == "-JOB-UPDATE-":
+        refresh_jobs()
+
+    elif event == "-JOB-DONE-":
+        job = values[event]
+        if job.status == "failed":
+            window["-OUTPUT-"].update(job.result + "\n", append=True)
+        elif job.status == "cancelled":
+            window["-OUTPUT-"].update(f"Cancelled {job.name}.\n", append=True)
+        jobs.finish(job)
+        refresh_jobs()
+
+    elif event == "Cancel Job":
+        selected = window["-JOBS-"].get_indexes()
+        if not selected:
+            window["-OUTPUT-"].update("Select a job to cancel first.\n", append=True)
+        elif not jobs.cancel(listed_job_ids[selected[0]]):
+            window["-OUTPUT-"].update("That job has already finished.\n", append=True)
+        refresh_jobs()
+
+    elif event == "Add Step":
+        step_name = values["-CHAIN-OP-"]
+        params = {}
+        if step_name == "Equalize":
+            bands = show_eq_popup(file_path)
+            if bands is None:
+                continue
+            params = {"bands": bands}
+        chain_steps.append((step_name, CHAIN_STEPS[step_name], params))
+        window["-CHAIN-"].update([f"{i + 1}. {name}" for i, (name, _, _) in enumerate(chain_steps)])
+
+    elif event == "Clear Chain":
+        chain_steps.clear()
+        window["-CHAIN-"].update([])
+
+    elif event == "Run Chain":
+        if not os.path.isfile(file_path):
+            window["-OUTPUT-"].update("Please select a valid audio file.\n", append=True)
+            continue
+        if not chain_steps:
+            window["-OUTPUT-"].update("Add at least one step to the chain first.\n", append=True)
+            continue
+        start_operation("Chain", file_path, "_chain.wav", process_chain,
+                        "Ran chain: " + " -> ".join(name for name, _, _ in chain_steps),
+                        steps=[(op, params) for _, op, params in chain_steps], workers=DSP_WORKERS)
+
     if event in ("Normalize", "Equalize", "Remove Silence", "Detect BPM", "Bass Boost", "Reverb", "Reverse Audio"):
         if not os.path.isfile(file_path):
             window["-OUTPUT-"].update("Please select a valid audio file.\n", append=True)
@@ -270,74 +790,56 @@ while True:
         window["-OUTPUT-"].update(f"Performing {event.lower()} on {file_path}...\n", append=True)
 
         # all if statements follow this structure:
-        # perform specified audio tool when button is clicked
+        # queue the specified audio tool as a background job when the button is clicked
         # output file to processed audio folder
-        # record operation for the LLM
+        # record operation for the LLM when the job finishes
         if event == "Detect BPM":
-            bpm_result = detect_bpm(file_path)
-            window["-OUTPUT-"].update(f"{bpm_result}\n", append=True)
-            bpm_result = detect_bpm(file_path)
-            latest_bpm = bpm_result.split(": ")[-1]  # store the bpm number for LLM
-            applied_operations.append(f"Detected BPM: {latest_bpm}")
+            jobs.submit(f"Detect BPM {os.path.basename(file_path)}",
+                        lambda job, path=file_path, profile=take_profile_request():
+                            run_instrumented("Detect BPM", path, detect_tempo, path, progress=job.report,
+                                             profile=profile),
+                        on_done=lambda outcome, path=file_path: (bpm_detected(path, outcome[0]),
+                                                                 show_metrics(outcome[1])))
 
         elif event == "Normalize":
-            os.makedirs("processed audio", exist_ok=True)
-            output_filename = os.path.splitext(os.path.basename(file_path))[0] + "_normalized.wav"
-            output_path = os.path.join("processed audio", output_filename)
-            result = normalize_audio(file_path, output_path)
-            window["-OUTPUT-"].update(result + "\n", append=True)
-            applied_operations.append("Normalized audio")
+            settings = show_normalize_popup()
+            if settings is None:
+                window["-OUTPUT-"].update("Normalize canceled by user.\n", append=True)
+                continue
+            unit = "LUFS" if settings["mode"] == "lufs" else "dBFS"
+            start_operation(event, file_path, "_normalized.wav", normalize_audio,
+                            f"Normalized audio ({settings['mode']} to {settings['target']:g} {unit})",
+                            block_size=auto_block_size(file_path), workers=DSP_WORKERS, **settings)
 
         elif event == "Remove Silence":
-            os.makedirs("processed audio", exist_ok=True)
-            output_filename = os.path.splitext(os.path.basename(file_path))[0] + "_nosilence.wav"
-            output_path = os.path.join("processed audio", output_filename)
-            result = remove_silence(file_path, output_path)
-            window["-OUTPUT-"].update(result + "\n", append=True)
-            applied_operations.append("Removed silence")
+            # the waveform's pyramid gives an instant preview of what the cut will remove
+            if waveform_peaks is not None and waveform_path == file_path:
+                silence_marks = waveform_peaks.silent_spans()
+                draw_waveform(window["-WAVEFORM-"])
+                window["-OUTPUT-"].update(f"Preview: about {sum(end - start for start, end in silence_marks):.1f} s "
+                                          f"in {len(silence_marks)} pause(s) will be cut (red in the waveform).\n",
+                                          append=True)
+            start_operation(event, file_path, "_nosilence.wav", remove_silence, "Removed silence",
+                            block_size=auto_block_size(file_path))
 
         elif event == "Equalize":
-            bands = show_eq_popup()
+            bands = show_eq_popup(file_path)
             if bands is None:
                 window["-OUTPUT-"].update("Equalizer canceled by user.\n", append=True)
                 continue
-            os.makedirs("processed audio", exist_ok=True)
-            output_filename = os.path.splitext(os.path.basename(file_path))[0] + "_Equalized.wav"
-            output_path = os.path.join("processed audio", output_filename)
-            result = apply_equalizer(file_path, output_path, bands)
-            window["-OUTPUT-"].update(result + "\n", append=True)
-            applied_operations.append("Applied equalizer (users settings)")
+            start_operation(event, file_path, "_Equalized.wav", apply_equalizer, "Applied equalizer (users settings)",
+                            bands=bands, block_size=auto_block_size(file_path), workers=DSP_WORKERS)
 
         elif event == "Bass Boost":
-            if not os.path.isfile(file_path):
-                window["-OUTPUT-"].update("Please select a valid audio file.\n", append=True)
-                continue
-            os.makedirs("processed audio", exist_ok=True)
-            output_filename = os.path.splitext(os.path.basename(file_path))[0] + "_bass.wav"
-            output_path = os.path.join("processed audio", output_filename)
-            result = bass_boost(file_path, output_path)
-            window["-OUTPUT-"].update(result + "\n", append=True)
-            applied_operations.append("Boosted bass frequencies")
+            start_operation(event, file_path, "_bass.wav", bass_boost, "Boosted bass frequencies",
+                            block_size=auto_block_size(file_path), workers=DSP_WORKERS)
 
         elif event == "Reverb":
-            if not os.path.isfile(file_path):
-                window["-OUTPUT-"].update("Please select a valid audio file.\n", append=True)
-                continue
-            os.makedirs("processed audio", exist_ok=True)
-            output_filename = os.path.splitext(os.path.basename(file_path))[0] + "_reverb.wav"
-            output_path = os.path.join("processed audio", output_filename)
-
-            result = apply_reverb(file_path, output_path)
-            window["-OUTPUT-"].update(result + "\n", append=True)
-            applied_operations.append("Added reverb effect")
+            start_operation(event, file_path, "_reverb.wav", apply_reverb, "Added reverb effect",
+                            block_size=auto_block_size(file_path), workers=DSP_WORKERS)
 
         elif event == "Reverse Audio":
-            os.makedirs("processed audio", exist_ok=True)
-            output_filename = os.path.splitext(os.path.basename(file_path))[0] + "_reversed.wav"
-            output_path = os.path.join("processed audio", output_filename)
-            result = reverse_audio(file_path, output_path)
-            window["-OUTPUT-"].update(result + "\n", append=True)
-            applied_operations.append("Reversed audio")
+            start_operation(event, file_path, "_reversed.wav", reverse_audio, "Reversed audio", workers=DSP_WORKERS)
 
     # if the user selects AI assistant, request response from LLM
     # the LLM will help the user create a professional audio file.
@@ -346,18 +848,11 @@ while True:
             window["-OUTPUT-"].update("Please select a valid audio file.\n", append=True)
             continue
 
-        # uses previous operations (if any) to give user accurate feedback.
-        summary = generate_summary(file_path, bpm=latest_bpm)
-
-        prompt = (
-            "You are a professional audio engineer. "
-            "Analyze the following audio summary and provide feedback on any remaining issues, and suggest improvements"
-            "that could help make the audio sound more professional:\n\n"
-            f"{summary}"
-        )
-
+        # uses previous operations (if any) and the file's measurements to give user accurate feedback.
         window["-OUTPUT-"].update("\n\n NEW AI RESPONSE \n\n Sending audio summary to AI assistant...\n", append=True)
-        ai_response = query_llm(prompt)
-        window["-OUTPUT-"].update(ai_response + "\n", append=True)
+        # the reply is already in the log chunk by chunk; only errors still need printing
+        jobs.submit("AI Assistant", lambda job, path=file_path, bpm=latest_bpm: ask_assistant(job, path, bpm),
+                    on_done=lambda result: window["-OUTPUT-"].update(
+                        (result if result.startswith("Error") else "") + "\n", append=True))
 
 window.close()
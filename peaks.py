@@ -0,0 +1,192 @@
+import os
+import struct
+import numpy as np
+from audio_io import open_audio
+
+# waveform overview data. one streaming pass over the file stores the min, max and RMS of every
+# PEAK_BASE_FRAMES frames per channel, and each further level summarizes PEAK_FACTOR entries of
+# the one below, so any zoom reads at most a few thousand entries whatever the file's length.
+# the pyramid is saved next to the audio as <file>.peaks (16-bit values, about 1% of a 16-bit
+# WAV) and memory-mapped when loaded, so reopening a two-hour file is instant.
+PEAK_BASE_FRAMES = 512
+PEAK_FACTOR = 4
+PEAK_MIN_ENTRIES = 256  # levels stop once they are this short
+PEAK_BLOCK_FRAMES = PEAK_BASE_FRAMES * 256
+PEAK_EXTENSION = ".peaks"
+PEAK_MAGIC = b"PEAK"
+PEAK_VERSION = 1
+
+# magic, version, channels, sample rate, frames, source size, source mtime_ns, base frames,
+# factor, level count; then one entry count per level, then the levels as int16
+# (entries x channels x (min, max, rms)), each scaled by 32767
+HEADER = struct.Struct("<4sHHIQQqIII")
+SCALE = 32767.0
+
+
+class PeakPyramid:
+    def __init__(self, levels, sample_rate, channels, frames, base_frames=PEAK_BASE_FRAMES, factor=PEAK_FACTOR):
+        self.levels = levels
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frames = frames
+        self.base_frames = base_frames
+        self.factor = factor
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate
+
+    # (mins, maxs, rms) as float arrays of columns x channels for start to end seconds, read from
+    # the coarsest level that still has an entry per column. when zoomed in past the base level
+    # fewer columns than asked for come back, one per entry.
+    def view(self, start, end, columns):
+        start, end = max(0.0, start), min(self.duration, end)
+        span = (end - start) * self.sample_rate
+        if span <= 0 or columns <= 0:
+            empty = np.zeros((0, self.channels))
+            return empty, empty, empty
+        level = 0
+        while level + 1 < len(self.levels) and self.base_frames * self.factor ** (level + 1) <= span / columns:
+            level += 1
+        entry_frames = self.base_frames * self.factor ** level
+        first = int(start * self.sample_rate // entry_frames)
+        last = max(first + 1, min(len(self.levels[level]), -(-int(end * self.sample_rate) // entry_frames)))
+        entries = np.asarray(self.levels[level][first:last], dtype=np.float64) / SCALE
+
+        bounds = np.unique(np.linspace(0, len(entries), min(columns, len(entries)) + 1).astype(int)[:-1])
+        mins = np.minimum.reduceat(entries[:, :, 0], bounds, axis=0)
+        maxs = np.maximum.reduceat(entries[:, :, 1], bounds, axis=0)
+        counts = np.diff(np.append(bounds, len(entries)))[:, np.newaxis]
+        rms = np.sqrt(np.add.reduceat(entries[:, :, 2] ** 2, bounds, axis=0) / counts)
+        return mins, maxs, rms
+
+    # silent runs as (start, end) seconds, the way remove_silence finds them but measured on
+    # PEAK_BASE_FRAMES windows, so it is a fast preview rather than the exact cut
+    def silent_spans(self, threshold=-40.0, min_silence_len=1000):
+        rms = np.asarray(self.levels[0][:, :, 2], dtype=np.float64) / SCALE
+        silent = np.all(rms < 10 ** (threshold / 20.0), axis=1)
+        edges = np.diff(np.concatenate(([0], silent.view(np.int8), [0])))
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        seconds = self.base_frames / self.sample_rate
+        return [(float(start * seconds), float(min(self.duration, end * seconds)))
+                for start, end in zip(starts, ends) if (end - start) * seconds * 1000 >= min_silence_len]
+
+
+def peaks_path(file_path):
+    return file_path + PEAK_EXTENSION
+
+
+# min, max and mean square of every base_frames frames of a block (the last entry may be partial).
+# channels are made contiguous first: reducing along the last axis is many times faster.
+def summarize_block(block, base_frames):
+    count = -(-len(block) // base_frames)
+    tail = len(block) - (count - 1) * base_frames
+    if tail < base_frames:
+        block = np.concatenate((block, np.zeros((base_frames - tail, block.shape[1]), dtype=block.dtype)))
+    entries = np.ascontiguousarray(block.T).reshape(block.shape[1], count, base_frames)
+    summary = np.empty((count, block.shape[1], 3))
+    summary[:, :, 0] = entries.min(axis=2).T
+    summary[:, :, 1] = entries.max(axis=2).T
+    summary[:, :, 2] = np.einsum('ijk,ijk->ji', entries, entries) / base_frames
+    if tail < base_frames:
+        last = entries[:, -1, :tail]
+        summary[-1] = np.stack((last.min(axis=1), last.max(axis=1), np.mean(last * last, axis=1)), axis=1)
+    return summary
+
+
+# one streaming pass over the file, then every coarser level from the base level
+def build_pyramid(file_path, progress=None):
+    with open_audio(file_path) as source:
+        sample_rate, channels, frames = source.sample_rate, source.channels, source.frames
+        parts = []
+        for start, block in source.blocks(PEAK_BLOCK_FRAMES):
+            parts.append(summarize_block(block, PEAK_BASE_FRAMES).astype(np.float32))
+            if progress is not None:
+                progress(0.95 * (start + len(block)) / max(1, frames))
+
+    summary = np.concatenate(parts) if parts else np.zeros((0, channels, 3), dtype=np.float32)
+    levels = [summary]
+    while len(levels[-1]) > PEAK_MIN_ENTRIES:
+        below = levels[-1]
+        bounds = np.arange(0, len(below), PEAK_FACTOR)
+        counts = np.diff(np.append(bounds, len(below)))[:, np.newaxis]
+        level = np.empty((len(bounds), channels, 3), dtype=np.float32)
+        level[:, :, 0] = np.minimum.reduceat(below[:, :, 0], bounds, axis=0)
+        level[:, :, 1] = np.maximum.reduceat(below[:, :, 1], bounds, axis=0)
+        level[:, :, 2] = np.add.reduceat(below[:, :, 2], bounds, axis=0) / counts
+        levels.append(level)
+
+    # mean squares become RMS, then everything is stored as 16-bit
+    quantized = []
+    for level in levels:
+        level = level.copy()
+        level[:, :, 2] = np.sqrt(level[:, :, 2])
+        quantized.append(np.round(np.clip(level, -1.0, 1.0) * SCALE).astype(np.int16))
+    return PeakPyramid(quantized, sample_rate, channels, frames)
+
+
+def save_pyramid(path, pyramid, source_stat):
+    with open(path, "wb") as destination:
+        destination.write(HEADER.pack(PEAK_MAGIC, PEAK_VERSION, pyramid.channels, pyramid.sample_rate, pyramid.frames,
+                                      source_stat.st_size, source_stat.st_mtime_ns, pyramid.base_frames,
+                                      pyramid.factor, len(pyramid.levels)))
+        destination.write(struct.pack(f"<{len(pyramid.levels)}Q", *(len(level) for level in pyramid.levels)))
+        for level in pyramid.levels:
+            destination.write(np.ascontiguousarray(level, dtype="<i2").tobytes())
+
+
+# the saved pyramid, memory-mapped, or None if it is missing, unreadable or older than the audio
+def read_pyramid(path, source_stat):
+    try:
+        with open(path, "rb") as source:
+            header = source.read(HEADER.size)
+            (magic, version, channels, sample_rate, frames, size, mtime_ns, base_frames, factor,
+             level_count) = HEADER.unpack(header)
+            if (magic, version, size, mtime_ns) != (PEAK_MAGIC, PEAK_VERSION, source_stat.st_size,
+                                                    source_stat.st_mtime_ns):
+                return None
+            counts = struct.unpack(f"<{level_count}Q", source.read(8 * level_count))
+        levels = []
+        offset = HEADER.size + 8 * level_count
+        for count in counts:
+            levels.append(np.memmap(path, dtype="<i2", mode="r", offset=offset, shape=(count, channels, 3)))
+            offset += count * channels * 3 * 2
+        return PeakPyramid(levels, sample_rate, channels, frames, base_frames, factor)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+# the file's pyramid: read from <file>.peaks when it is up to date, otherwise built and saved.
+# a folder that can't be written to only means the pyramid is rebuilt next time.
+def load_peaks(file_path, progress=None):
+    source_stat = os.stat(file_path)
+    path = peaks_path(file_path)
+    pyramid = read_pyramid(path, source_stat)
+    if pyramid is not None:
+        return pyramid
+    pyramid = build_pyramid(file_path, progress)
+    try:
+        save_pyramid(path, pyramid, source_stat)
+    except OSError:
+        pass
+    if progress is not None:
+        progress(1.0)
+    return pyramid
+
+
+def level_db(value):
+    return f"{20 * np.log10(value):.0f}" if value > 0 else "-inf"
+
+
+# readable lines for the AI summary: how the level moves through the file
+def describe_peaks(pyramid, parts=10):
+    mins, maxs, rms = pyramid.view(0.0, pyramid.duration, parts)
+    if not len(rms):
+        return []
+    loudest = rms.max(axis=1)
+    lines = [f"Level over time (RMS dBFS, {len(loudest)} equal parts): " + ", ".join(level_db(v) for v in loudest)]
+    silent = pyramid.silent_spans()
+    if silent:
+        total = sum(end - start for start, end in silent)
+        lines.append(f"Pauses of 1 s or more below -40 dBFS: {len(silent)}, {total:.1f} s in total")
+    return lines
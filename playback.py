@@ -0,0 +1,289 @@
+import functools
+import threading
+import time
+import numpy as np
+from audio_io import open_audio
+from lazy_imports import LazyModule
+
+# streaming playback. a reader thread decodes the file in small blocks into a ring buffer and the
+# sound device's callback plays from it, so playback starts after the first block instead of
+# after the whole file, and memory stays at a couple of seconds of audio however long the file.
+# one engine is shared by play, pause, seek and stop, and its position drives the meter, which
+# reads its levels from the file's precomputed peak pyramid (peaks.py) rather than the audio thread.
+sd = LazyModule("sounddevice")
+
+PLAYBACK_BLOCK_FRAMES = 1024  # frames per device callback
+READ_FRAMES = 8192  # frames decoded per disk read
+RING_SECONDS = 2.0  # decoded audio buffered ahead of the device
+
+# the live meter shows levels in dBFS between METER_FLOOR_DB and 0, refreshed at METER_FRAME_RATE
+METER_FRAME_RATE = 30
+METER_FLOOR_DB = -60.0
+METER_FALL_DB = 1.5  # how far the bar can fall per display frame
+METER_PEAK_HOLD_SECONDS = 1.5
+POSITION_STEP_SECONDS = 0.25  # how often the position display is refreshed
+
+
+def to_meter_db(levels):
+    return np.clip(20 * np.log10(np.maximum(levels, 1e-10)), METER_FLOOR_DB, 0.0)
+
+
+# (rms, peak) per channel of the display frame that ends at the given time, looked up in the
+# file's PeakPyramid, or None at the very start
+def meter_levels(pyramid, seconds):
+    mins, maxs, rms = pyramid.view(seconds - 1.0 / METER_FRAME_RATE, seconds, 1)
+    if not len(rms):
+        return None
+    return rms[0], np.maximum(-mins[0], maxs[0])
+
+
+# fixed-size frames x channels float32 ring. not locked itself: the engine's lock guards it.
+class RingBuffer:
+    def __init__(self, frames, channels):
+        self.data = np.zeros((frames, channels), dtype=np.float32)
+        self.start = 0
+        self.count = 0
+
+    def space(self):
+        return len(self.data) - self.count
+
+    def write(self, block):
+        size = len(self.data)
+        count = min(len(block), self.space())
+        index = (self.start + self.count) % size
+        first = min(count, size - index)
+        self.data[index:index + first] = block[:first]
+        self.data[:count - first] = block[first:count]
+        self.count += count
+        return count
+
+    def read(self, out):
+        size = len(self.data)
+        count = min(len(out), self.count)
+        first = min(count, size - self.start)
+        out[:first] = self.data[self.start:self.start + first]
+        out[first:count] = self.data[:count - first]
+        self.start = (self.start + count) % size
+        self.count -= count
+        return count
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+
+
+class PlaybackEngine:
+    def __init__(self, block_frames=PLAYBACK_BLOCK_FRAMES, buffer_seconds=RING_SECONDS):
+        self.block_frames = block_frames
+        self.buffer_seconds = buffer_seconds
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._stream = None
+        self._reader = None
+        self._ring = None
+        self.file_path = None
+        self.sample_rate = 0
+        self.channels = 0
+        self.frames = 0
+        self.session = 0  # increases with every play, so helpers of an older playback can tell
+        self.paused = False
+        self._position = 0  # file frame the device callback plays next
+        self._seek_to = None
+        self._generation = 0  # bumped by seek, so a block read before the seek is dropped
+        self._eof = False
+        self._finished = False
+        self._stopping = False
+        self.on_finish = None
+        self.processor = None  # process(block) applied on the audio thread, e.g. a live EQ preview
+
+    # starts playing file_path from start seconds, stopping anything already playing.
+    # on_finish() is called from the audio thread when the end of the file has been played; if it
+    # seeks, playback carries on from there (the EQ preview loops this way), otherwise the stream
+    # stops and the sound device is released.
+    # make_processor(sample_rate, channels), if given, returns a process(block) the audio passes
+    # through on its way to the device, so changes to it are heard within one device block.
+    def play(self, file_path, start=0.0, on_finish=None, make_processor=None):
+        self.stop()
+        source = open_audio(file_path)
+        with self._lock:
+            self.file_path = file_path
+            self.sample_rate, self.channels, self.frames = source.sample_rate, source.channels, source.frames
+            self._ring = RingBuffer(max(READ_FRAMES * 2, int(self.buffer_seconds * self.sample_rate)), self.channels)
+            self._position = min(self.frames, max(0, int(start * self.sample_rate)))
+            self._seek_to = self._position
+            self._eof = self._finished = self._stopping = False
+            self.paused = False
+            self.on_finish = on_finish
+            self.processor = make_processor(self.sample_rate, self.channels) if make_processor else None
+            self.session += 1
+        self._reader = threading.Thread(target=self._read_loop, args=(source,), daemon=True)
+        self._reader.start()
+        try:
+            self._stream = sd.OutputStream(samplerate=self.sample_rate, channels=self.channels, dtype="float32",
+                                           blocksize=self.block_frames, callback=self._callback,
+                                           finished_callback=functools.partial(self._stream_finished, self.session))
+            self._stream.start()
+        except Exception:
+            self.stop()
+            raise
+
+    # decodes ahead of the device until the ring is full, then waits for the callback to make room
+    def _read_loop(self, source):
+        next_frame = 0
+        try:
+            while True:
+                with self._lock:
+                    while not self._stopping and self._seek_to is None and (
+                            self._eof or self._ring.space() < READ_FRAMES):
+                        self._changed.wait()
+                    if self._stopping:
+                        return
+                    if self._seek_to is not None:
+                        next_frame = self._seek_to
+                        self._seek_to = None
+                    generation = self._generation
+                block = source.read(next_frame, next_frame + READ_FRAMES)
+                with self._lock:
+                    if generation != self._generation:
+                        continue
+                    self._ring.write(block)
+                    next_frame += len(block)
+                    if len(block) < READ_FRAMES:
+                        self._eof = True
+        finally:
+            source.close()
+
+    # runs on the audio thread: copies the next frames out of the ring (through the preview
+    # processor, if any) and nothing more; the meter's levels are looked up elsewhere.
+    # an empty ring before the end of the file (disk too slow) plays silence without moving on.
+    def _callback(self, outdata, frames, time_info, status):
+        with self._lock:
+            if self.paused or self._finished:
+                outdata.fill(0)
+                return
+            count = self._ring.read(outdata)
+            self._position += count
+            finished = self._eof and self._ring.count == 0
+            self._finished = finished
+            self._changed.notify_all()
+        outdata[count:] = 0
+        if count and self.processor is not None:
+            outdata[:count] = self.processor(outdata[:count])
+        if finished:
+            if self.on_finish is not None:
+                self.on_finish()
+            with self._lock:
+                finished = self._finished
+            if finished:
+                # the device plays out this last block, then the stream stops and _stream_finished runs
+                raise sd.CallbackStop()
+
+    # runs when the stream has stopped. after the end of the file this releases the sound device with
+    # stop(session), from another thread: PortAudio can't close a stream from its own thread
+    def _stream_finished(self, session):
+        threading.Thread(target=self.stop, args=(session,), daemon=True).start()
+
+    # moves playback to the given time in seconds; buffered audio from the old position is dropped
+    def seek(self, seconds):
+        with self._lock:
+            if self._ring is None:
+                return
+            self._position = min(self.frames, max(0, int(seconds * self.sample_rate)))
+            self._seek_to = self._position
+            self._generation += 1
+            self._ring.clear()
+            self._eof = self._finished = False
+            self._changed.notify_all()
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    # may run on the GUI thread and on the release thread at once, so each takes the stream and the
+    # reader out under the lock and only one of them closes them. with a session, only stops that
+    # playback: a stream already stopped or replaced by a newer play() is left alone.
+    def stop(self, session=None):
+        with self._lock:
+            if session is not None and (self._stopping or self.session != session):
+                return
+            self._stopping = True
+            self.paused = False
+            self._changed.notify_all()
+            stream, self._stream = self._stream, None
+            reader, self._reader = self._reader, None
+        try:
+            if stream is not None:
+                stream.close()
+        finally:
+            if reader is not None:
+                reader.join()
+
+    # True from play until stop or the end of the file, including while paused
+    @property
+    def active(self):
+        return self._stream is not None and not self._finished
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate if self.sample_rate else 0.0
+
+    # the time being heard, in seconds: frames handed to the device minus its output latency
+    def position(self):
+        with self._lock:
+            frames = self._position
+        latency = self._stream.latency if self._stream is not None else 0.0
+        return max(0.0, frames / self.sample_rate - latency) if self.sample_rate else 0.0
+
+
+# drives the meter from the engine: posts a -METER-UPDATE- event of (levels, peak holds) per
+# channel in dBFS when the display changes, and -PLAYBACK-POSITION- (seconds, duration) as
+# playback moves. get_peaks() returns the playing file's PeakPyramid, or None while it is still
+# being built. ends with a None meter update when this playback stops or finishes.
+def run_meter(engine, window, get_peaks):
+    session = engine.session
+
+    def run():
+        try:
+            channels = engine.channels
+            smoothed = np.full(channels, METER_FLOOR_DB)
+            held = np.full(channels, METER_FLOOR_DB)
+            held_since = np.zeros(channels)
+            shown = None
+            shown_position = None
+            started = time.perf_counter()
+
+            while engine.active and engine.session == session:
+                now = time.perf_counter() - started
+                pyramid = get_peaks()
+                levels = None if pyramid is None else meter_levels(pyramid, engine.position())
+                if levels is not None and not engine.paused:
+                    rms_db, peak_db = to_meter_db(levels[0]), to_meter_db(levels[1])
+
+                    # Apply smoothing: jump up instantly, fall back slowly
+                    smoothed = np.maximum(rms_db, smoothed - METER_FALL_DB)
+
+                    # peak hold: keep the highest peak until it is beaten or has been held long enough
+                    replace = (peak_db >= held) | (now - held_since > METER_PEAK_HOLD_SECONDS)
+                    held = np.where(replace, peak_db, held)
+                    held_since = np.where(replace, now, held_since)
+
+                # only post when the display would actually change
+                value = (tuple(np.round(smoothed, 1)), tuple(np.round(held, 1)))
+                if value != shown:
+                    window.write_event_value("-METER-UPDATE-", value)
+                    shown = value
+                position = engine.position()
+                if shown_position is None or abs(position - shown_position) >= POSITION_STEP_SECONDS:
+                    window.write_event_value("-PLAYBACK-POSITION-", (position, engine.duration))
+                    shown_position = position
+
+                time.sleep(1.0 / METER_FRAME_RATE)
+
+            window.write_event_value("-METER-UPDATE-", None)
+
+        except Exception as e:
+            window.write_event_value("-OUTPUT-APPEND-", f"Error in volume meter: {str(e)}\n")
+
+    threading.Thread(target=run, daemon=True).start()
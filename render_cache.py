@@ -0,0 +1,172 @@
+import hashlib
+import importlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+# content-addressed cache of rendered files. a render is keyed by the input file's content hash,
+# the operation, its parameters and the audio_tools code version, so running the same settings on
+# the same audio again returns the earlier file instantly, and different settings no longer
+# overwrite each other. the index lives in the output folder next to the files it tracks.
+OUTPUT_DIR = "processed audio"
+INDEX_FILE = "render_cache.db"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+HASH_BLOCK_BYTES = 1024 * 1024
+
+# parameters that change how an operation runs but not what it writes
+NEUTRAL_PARAMS = ("block_size", "progress", "workers")
+
+
+# the modules whose code decides what a render writes: the DSP and the decoding, encoding and dither
+RENDER_MODULES = ("audio_tools", "audio_io")
+
+
+# a hash of the render code, so renders made by an older audio_tools or audio_io are not reused
+@lru_cache(maxsize=None)
+def code_version():
+    digest = hashlib.sha256()
+    for name in RENDER_MODULES:
+        with open(importlib.import_module(name).__file__, "rb") as source:
+            digest.update(source.read())
+    return digest.hexdigest()[:16]
+
+
+# sha256 of a file's bytes. hashing a long recording takes a while, so hashes are remembered
+# per path, size and mtime in a file_hashes table of the given SQLite database.
+def content_hash(path, db_file):
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT NOT NULL
+            )
+        ''')
+        row = conn.execute("SELECT size, mtime_ns, hash FROM file_hashes WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[:2] == (stat.st_size, stat.st_mtime_ns):
+            return row[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as source:
+            for block in iter(lambda: source.read(HASH_BLOCK_BYTES), b""):
+                digest.update(block)
+        conn.execute("INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, hash) VALUES (?, ?, ?, ?)",
+                     (path, stat.st_size, stat.st_mtime_ns, digest.hexdigest()))
+        conn.commit()
+        return digest.hexdigest()
+    finally:
+        conn.close()
+
+
+def render_key(file_hash, operation, params):
+    params = {name: value for name, value in params.items() if name not in NEUTRAL_PARAMS}
+    payload = json.dumps({"input": file_hash, "operation": operation, "params": params,
+                          "version": code_version()}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, directory=OUTPUT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.db_file = os.path.join(directory, INDEX_FILE)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.db_file)
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS renders (
+                    key TEXT PRIMARY KEY,
+                    output_path TEXT NOT NULL,
+                    operation TEXT NOT NULL,
+                    source_name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_file, timeout=30)
+
+    # where a render is written: the usual <name><suffix> with a short key so settings don't collide
+    def output_path(self, input_path, suffix, key):
+        stem, extension = os.path.splitext(suffix)
+        name = os.path.splitext(os.path.basename(input_path))[0] + f"{stem}_{key[:8]}{extension}"
+        return os.path.join(self.directory, name)
+
+    # the path of an earlier render with this key, or None (a file deleted by hand is forgotten)
+    def lookup(self, key):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT output_path FROM renders WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(row[0]):
+                conn.execute("DELETE FROM renders WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE renders SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            return row[0]
+        finally:
+            conn.close()
+
+    def store(self, key, output_path, operation, input_path):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO renders (key, output_path, operation, source_name, size, "
+                         "created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (key, output_path, operation, os.path.basename(input_path),
+                          os.path.getsize(output_path), now, now))
+            self._evict(conn, keep=key)
+            conn.commit()
+        finally:
+            conn.close()
+
+    # removes the least recently used renders until the folder is under max_bytes.
+    # only files the index created are ever deleted.
+    def _evict(self, conn, keep=None):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM renders").fetchone()[0]
+        for key, path, size in conn.execute("SELECT key, output_path, size FROM renders "
+                                            "ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            if os.path.exists(path):
+                os.remove(path)
+            conn.execute("DELETE FROM renders WHERE key = ?", (key,))
+            total -= size
+
+    def _key_lock(self, key):
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    # runs function(input_path, output_path, progress=progress, **params) unless the same render
+    # already exists, and returns the message to show. on_output_path(path) is called before
+    # rendering starts, so a cancelled job knows which partial file to clean up.
+    def render(self, operation, function, input_path, suffix, progress=None, on_output_path=None, **params):
+        key = render_key(content_hash(input_path, self.db_file), operation, params)
+        output_path = self.output_path(input_path, suffix, key)
+        with self._key_lock(key):
+            cached = self.lookup(key)
+            if cached is not None:
+                return f"♻️ Same file and settings as an earlier run, reused {cached}"
+            if on_output_path is not None:
+                on_output_path(output_path)
+            message = function(input_path, output_path, progress=progress, **params)
+            if not message.startswith("Error") and os.path.exists(output_path):
+                self.store(key, output_path, operation, input_path)
+            return message
@@ -0,0 +1,198 @@
+import os
+import struct
+import threading
+import time
+import numpy as np
+from audio_io import open_audio
+
+# spectrum analyzer data. one streaming pass over the file runs a vectorized STFT of the mono mix
+# and keeps only the energy of SPECTRUM_BANDS log-spaced bands per frame, stored as 8-bit dB.
+# the frames are saved next to the audio as <file>.spectrum (about 1.4 kB per second) and
+# memory-mapped when loaded, so during playback the display only looks up the frame at the current
+# position: no FFTs run while the file plays, whatever its length.
+SPECTRUM_N_FFT = 2048
+SPECTRUM_HOP = 1024  # about 43 frames per second at 44.1 kHz, more than the display shows
+SPECTRUM_BANDS = 32
+SPECTRUM_MIN_HZ = 30.0
+SPECTRUM_MAX_HZ = 16000.0
+SPECTRUM_FLOOR_DB = -90.0
+SPECTRUM_STEP_DB = 0.5  # one stored step
+SPECTRUM_BLOCK_FRAMES = SPECTRUM_HOP * 256
+SPECTRUM_EXTENSION = ".spectrum"
+SPECTRUM_MAGIC = b"SPEC"
+SPECTRUM_VERSION = 1
+
+# the display is refreshed at most SPECTRUM_FRAME_RATE times a second and bars fall by at most
+# SPECTRUM_FALL_DB per refresh, like the level meter
+SPECTRUM_FRAME_RATE = 30
+SPECTRUM_FALL_DB = 3.0
+
+# magic, version, bands, sample rate, source size, source mtime_ns, n_fft, hop, frame count;
+# then the band centre frequencies as float32, then frames x bands uint8 steps above the floor
+HEADER = struct.Struct("<4sHHIQqIIQ")
+
+
+class SpectrumFrames:
+    def __init__(self, frames, sample_rate, centres, hop=SPECTRUM_HOP):
+        self.frames = frames
+        self.sample_rate = sample_rate
+        self.centres = centres
+        self.hop = hop
+
+    @property
+    def frame_rate(self):
+        return self.sample_rate / self.hop
+
+    # band levels in dB (SPECTRUM_FLOOR_DB to 0) of the frame centred nearest to the given time
+    def at(self, seconds):
+        if not len(self.frames):
+            return np.full(len(self.centres), SPECTRUM_FLOOR_DB)
+        index = min(len(self.frames) - 1, max(0, int(round(seconds * self.frame_rate))))
+        return SPECTRUM_FLOOR_DB + self.frames[index].astype(np.float64) * SPECTRUM_STEP_DB
+
+
+def spectrum_path(file_path):
+    return file_path + SPECTRUM_EXTENSION
+
+
+# band edges in Hz, log-spaced between SPECTRUM_MIN_HZ and SPECTRUM_MAX_HZ (or just below nyquist)
+def band_edges(sample_rate, bands=SPECTRUM_BANDS):
+    return np.geomspace(SPECTRUM_MIN_HZ, min(SPECTRUM_MAX_HZ, 0.45 * sample_rate), bands + 1)
+
+
+# bins x bands matrix summing each FFT bin's power into its band. a low band narrower than one bin
+# takes the bin nearest its centre, so no band is left permanently empty.
+def band_matrix(sample_rate, bands=SPECTRUM_BANDS):
+    edges = band_edges(sample_rate, bands)
+    frequencies = np.fft.rfftfreq(SPECTRUM_N_FFT, 1.0 / sample_rate)
+    matrix = np.zeros((len(frequencies), bands), dtype=np.float32)
+    index = np.searchsorted(edges, frequencies, side='right') - 1
+    inside = (index >= 0) & (index < bands)
+    matrix[np.flatnonzero(inside), index[inside]] = 1.0
+    for band in np.flatnonzero(matrix.sum(axis=0) == 0):
+        centre = np.sqrt(edges[band] * edges[band + 1])
+        matrix[np.argmin(np.abs(frequencies - centre)), band] = 1.0
+    return matrix
+
+
+# STFT band levels of a mono signal fed one block at a time. frame i is centred on sample i * hop
+# (the signal is padded with half a window of silence at both ends).
+class BandAnalyzer:
+    def __init__(self, sample_rate, bands=SPECTRUM_BANDS):
+        self.window = np.hanning(SPECTRUM_N_FFT + 1)[:-1].astype(np.float32)
+        self.matrix = band_matrix(sample_rate, bands)
+        # a full-scale sine reads 0 dB in its band
+        self.scale = (2.0 / self.window.sum()) ** 2
+        self.pending = np.zeros(SPECTRUM_N_FFT // 2, dtype=np.float32)
+        self.values = []
+
+    def add(self, samples):
+        samples = np.concatenate((self.pending, samples.astype(np.float32, copy=False)))
+        count = (len(samples) - SPECTRUM_N_FFT) // SPECTRUM_HOP + 1
+        if count <= 0:
+            self.pending = samples
+            return
+        frames = np.lib.stride_tricks.sliding_window_view(samples, SPECTRUM_N_FFT)[::SPECTRUM_HOP][:count]
+        spectra = np.fft.rfft(frames * self.window, axis=1)
+        power = spectra.real ** 2 + spectra.imag ** 2
+        levels = 10 * np.log10(np.maximum(power @ self.matrix * self.scale, 1e-12))
+        steps = np.round((np.clip(levels, SPECTRUM_FLOOR_DB, 0.0) - SPECTRUM_FLOOR_DB) / SPECTRUM_STEP_DB)
+        self.values.append(steps.astype(np.uint8))
+        self.pending = samples[count * SPECTRUM_HOP:]
+
+    def finish(self):
+        self.add(np.zeros(SPECTRUM_N_FFT // 2, dtype=np.float32))
+        return np.concatenate(self.values) if self.values else np.zeros((0, self.matrix.shape[1]), dtype=np.uint8)
+
+
+# one streaming pass over the file in float32
+def build_spectrum(file_path, progress=None):
+    with open_audio(file_path) as source:
+        sample_rate, frames = source.sample_rate, source.frames
+        analyzer = BandAnalyzer(sample_rate)
+        for start, block in source.blocks(SPECTRUM_BLOCK_FRAMES, dtype=np.float32):
+            analyzer.add(block.mean(axis=1))
+            if progress is not None:
+                progress(0.95 * (start + len(block)) / max(1, frames))
+    centres = np.sqrt(band_edges(sample_rate)[:-1] * band_edges(sample_rate)[1:]).astype(np.float32)
+    return SpectrumFrames(analyzer.finish(), sample_rate, centres)
+
+
+def save_spectrum(path, spectrum, source_stat):
+    with open(path, "wb") as destination:
+        destination.write(HEADER.pack(SPECTRUM_MAGIC, SPECTRUM_VERSION, len(spectrum.centres), spectrum.sample_rate,
+                                      source_stat.st_size, source_stat.st_mtime_ns, SPECTRUM_N_FFT, spectrum.hop,
+                                      len(spectrum.frames)))
+        destination.write(np.ascontiguousarray(spectrum.centres, dtype="<f4").tobytes())
+        destination.write(np.ascontiguousarray(spectrum.frames, dtype=np.uint8).tobytes())
+
+
+# the saved frames, memory-mapped, or None if they are missing, unreadable, older than the audio
+# or made with other analysis settings
+def read_spectrum(path, source_stat):
+    try:
+        with open(path, "rb") as source:
+            (magic, version, bands, sample_rate, size, mtime_ns, n_fft, hop,
+             count) = HEADER.unpack(source.read(HEADER.size))
+            if (magic, version, size, mtime_ns, n_fft, hop, bands) != (
+                    SPECTRUM_MAGIC, SPECTRUM_VERSION, source_stat.st_size, source_stat.st_mtime_ns, SPECTRUM_N_FFT,
+                    SPECTRUM_HOP, SPECTRUM_BANDS):
+                return None
+            centres = np.frombuffer(source.read(4 * bands), dtype="<f4")
+        offset = HEADER.size + 4 * bands
+        if count:
+            frames = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(count, bands))
+        else:
+            frames = np.zeros((0, bands), dtype=np.uint8)
+        return SpectrumFrames(frames, sample_rate, centres, hop)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+# the file's spectrum frames: read from <file>.spectrum when up to date, otherwise built and saved.
+# a folder that can't be written to only means they are rebuilt next time.
+def load_spectrum(file_path, progress=None):
+    source_stat = os.stat(file_path)
+    path = spectrum_path(file_path)
+    spectrum = read_spectrum(path, source_stat)
+    if spectrum is not None:
+        return spectrum
+    spectrum = build_spectrum(file_path, progress)
+    try:
+        save_spectrum(path, spectrum, source_stat)
+    except OSError:
+        pass
+    if progress is not None:
+        progress(1.0)
+    return spectrum
+
+
+# drives the analyzer from a playback engine: posts -SPECTRUM-UPDATE- with the band levels (dB,
+# rounded to whole dB) at the engine's position whenever they change, at most SPECTRUM_FRAME_RATE
+# times a second. get_spectrum() returns the playing file's SpectrumFrames, or None while they
+# are still being built. ends with a None update when this playback stops or finishes.
+def run_spectrum(engine, window, get_spectrum):
+    session = engine.session
+
+    def run():
+        try:
+            shown = None
+            smoothed = None
+            while engine.active and engine.session == session:
+                spectrum = get_spectrum()
+                if spectrum is not None and not engine.paused:
+                    levels = spectrum.at(engine.position())
+                    # jump up instantly, fall back slowly
+                    smoothed = levels if smoothed is None else np.maximum(levels, smoothed - SPECTRUM_FALL_DB)
+                    value = tuple(np.round(smoothed))
+                    if value != shown:
+                        window.write_event_value("-SPECTRUM-UPDATE-", value)
+                        shown = value
+                time.sleep(1.0 / SPECTRUM_FRAME_RATE)
+
+            window.write_event_value("-SPECTRUM-UPDATE-", None)
+
+        except Exception as e:
+            window.write_event_value("-OUTPUT-APPEND-", f"Error in spectrum analyzer: {str(e)}\n")
+
+    threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,67 @@
+# startup-time regression check for the GUI.
+# imports everything main.py loads before the window appears in a fresh interpreter,
+# and fails if it takes longer than the target or pulls in a module that should load lazily.
+#
+#   python startup_check.py            (median of 5 runs against the target)
+#   python startup_check.py --runs 10 --target 0.5
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# modules main.py imports at startup (the GUI modules are timed too when PySimpleGUI is installed)
+STARTUP_MODULES = ("lazy_imports", "audio_tools", "instrumentation", "llm_client", "llm_cache", "render_cache",
+                   "analysis", "tempo", "playback", "peaks", "audio_io", "spectrum")
+OPTIONAL_STARTUP_MODULES = ("PySimpleGUI", "feedback")
+
+# these must not be imported until an operation needs them
+LAZY_MODULES = ("librosa", "scipy.signal", "sounddevice", "google.generativeai")
+
+# the lazy startup imports measured about 0.12 s without PySimpleGUI; the target leaves room for the GUI toolkit
+STARTUP_TARGET_SECONDS = 0.75
+
+PROBE = """
+import importlib, json, sys, time
+started = time.perf_counter()
+for name in {required!r}:
+    importlib.import_module(name)
+for name in {optional!r}:
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        pass
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "eager": [name for name in {lazy!r} if name in sys.modules]}}))
+"""
+
+
+def measure_once():
+    code = PROBE.format(required=STARTUP_MODULES, optional=OPTIONAL_STARTUP_MODULES, lazy=LAZY_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check GUI startup import time.")
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh interpreters to time")
+    parser.add_argument("--target", type=float, default=STARTUP_TARGET_SECONDS, help="allowed median seconds")
+    args = parser.parse_args(argv)
+
+    results = [measure_once() for _ in range(args.runs)]
+    median = statistics.median(result["seconds"] for result in results)
+    eager = sorted({name for result in results for name in result["eager"]})
+
+    print(f"startup imports: median {median:.3f}s over {args.runs} runs (target {args.target:.3f}s)")
+    if eager:
+        print(f"FAIL: loaded at startup but should be lazy: {', '.join(eager)}")
+    if median > args.target:
+        print("FAIL: startup is slower than the target")
+    if eager or median > args.target:
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
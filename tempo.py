@@ -0,0 +1,182 @@
+import math
+import numpy as np
+from audio_io import open_audio
+from lazy_imports import LazyModule
+
+# fast tempo estimation. the audio is downmixed and resampled to a low analysis rate, an onset
+# envelope is built block by block, and the tempo is read from the envelope's autocorrelation.
+# long files are not decoded in full: evenly spaced excerpts are sampled instead. every section
+# (excerpt, or 30 s slice of a short file) gets its own tempo and confidence, so tempo changes
+# show up, and a low overall confidence tells the caller to fall back to full beat tracking.
+signal = LazyModule("scipy.signal")
+
+ANALYSIS_RATE = 11025
+TEMPO_N_FFT = 1024
+TEMPO_HOP = 256
+FRAME_RATE = ANALYSIS_RATE / TEMPO_HOP  # about 43 onset frames per second
+
+MIN_BPM = 40.0
+MAX_BPM = 240.0
+# tempos far from PRIOR_BPM (in octaves) are down-weighted, which settles half/double tempo ambiguity
+PRIOR_BPM = 120.0
+PRIOR_OCTAVES = 1.0
+
+SECTION_SECONDS = 30.0
+FULL_SCAN_SECONDS = 240.0  # files up to this long are scanned completely
+EXCERPTS = 8
+TEMPO_BLOCK_SECONDS = 10.0
+AGREEMENT_TOLERANCE = 0.04  # sections within 4% count as the same tempo
+MIN_CONFIDENCE = 0.3
+
+
+# reads frames start to stop as mono at ANALYSIS_RATE, one block at a time. each block is read
+# with enough context on both sides for the resampling filter, so the blocks join seamlessly.
+def resampled_blocks(source, start, stop, block_seconds=TEMPO_BLOCK_SECONDS):
+    divisor = math.gcd(ANALYSIS_RATE, source.sample_rate)
+    up, down = ANALYSIS_RATE // divisor, source.sample_rate // divisor
+    context = -(-(10 * max(up, down) // up + 1) // down) * down
+    block_frames = max(down, int(block_seconds * source.sample_rate) // down * down)
+    skip = context * up // down
+
+    position = start
+    while position < stop:
+        end = min(stop, position + block_frames)
+        low, high = max(0, position - context), min(source.frames, end + context)
+        chunk = source.read(low, high)
+        padded = np.zeros(end - position + 2 * context)
+        offset = context - (position - low)
+        padded[offset:offset + len(chunk)] = chunk.mean(axis=1)
+        resampled = signal.resample_poly(padded, up, down)
+        yield resampled[skip:skip + -(-(end - position) * up // down)]
+        position = end
+
+
+# log-compressed spectral flux at FRAME_RATE, fed one block of analysis-rate samples at a time
+class OnsetEnvelope:
+    def __init__(self):
+        self.window = np.hanning(TEMPO_N_FFT + 1)[:-1]
+        self.pending = np.zeros(TEMPO_N_FFT // 2)
+        self.previous = None
+        self.values = []
+
+    def add(self, samples):
+        samples = np.concatenate((self.pending, samples))
+        count = (len(samples) - TEMPO_N_FFT) // TEMPO_HOP + 1
+        if count <= 0:
+            self.pending = samples
+            return
+        frames = np.lib.stride_tricks.sliding_window_view(samples, TEMPO_N_FFT)[::TEMPO_HOP][:count]
+        spectrum = np.log1p(100.0 * np.abs(np.fft.rfft(frames * self.window, axis=1)))
+        previous = spectrum[:1] if self.previous is None else self.previous
+        self.values.append(np.maximum(0.0, np.diff(np.vstack((previous, spectrum)), axis=0)).mean(axis=1))
+        self.previous = spectrum[-1:]
+        self.pending = samples[count * TEMPO_HOP:]
+
+    def finish(self):
+        self.add(np.zeros(TEMPO_N_FFT // 2))
+        return np.concatenate(self.values) if self.values else np.zeros(0)
+
+
+# the tempo of an onset envelope and its salience: the normalized autocorrelation at the beat
+# period (near 1 for a steady click, near 0 for noise). returns (None, 0.0) if there is no pulse.
+def envelope_tempo(envelope, frame_rate=FRAME_RATE):
+    shortest = int(frame_rate * 60.0 / MAX_BPM)
+    longest = min(len(envelope) - 2, int(frame_rate * 60.0 / MIN_BPM) + 1)
+    if longest <= shortest:
+        return None, 0.0
+    centered = envelope - envelope.mean()
+    size = 1 << (2 * len(centered) - 1).bit_length()
+    acf = np.fft.irfft(np.abs(np.fft.rfft(centered, size)) ** 2, size)[:len(centered)]
+    if acf[0] <= 0:
+        return None, 0.0
+    acf /= acf[0]
+
+    lags = np.arange(shortest, longest + 1)
+    bpms = 60.0 * frame_rate / lags
+    prior = np.exp(-0.5 * (np.log2(bpms / PRIOR_BPM) / PRIOR_OCTAVES) ** 2)
+    best = int(lags[np.argmax(acf[lags] * prior)])
+    if acf[best] <= 0:
+        return None, 0.0
+
+    # parabolic interpolation between lags for a tempo finer than one frame
+    before, peak, after = acf[best - 1], acf[best], acf[best + 1]
+    curvature = before - 2 * peak + after
+    shift = 0.5 * (before - after) / curvature if curvature < 0 else 0.0
+    return float(60.0 * frame_rate / (best + shift)), float(peak)
+
+
+def section(start, end, envelope):
+    bpm, confidence = envelope_tempo(envelope)
+    return {"start": start, "end": end, "bpm": bpm, "confidence": confidence}
+
+
+# the tempo most sections agree on. confidence is how much of the sections' salience agrees,
+# times the agreeing sections' average salience.
+def combine_sections(sections):
+    found = [item for item in sections if item["bpm"] is not None]
+    total = sum(item["confidence"] for item in found)
+    if not found or total <= 0:
+        return None, 0.0
+
+    def agreeing(bpm):
+        return [item for item in found if abs(item["bpm"] - bpm) <= AGREEMENT_TOLERANCE * bpm]
+
+    best = max(found, key=lambda item: sum(other["confidence"] for other in agreeing(item["bpm"])))
+    group = agreeing(best["bpm"])
+    support = sum(item["confidence"] for item in group)
+    bpm = sum(item["bpm"] * item["confidence"] for item in group) / support
+    return float(bpm), float(support / total * support / len(group))
+
+
+# returns {"bpm", "confidence", "sections", "method"}; sections list start/end seconds, bpm and
+# confidence. progress is called with the fraction of the regions scanned.
+def estimate_tempo(file_path, progress=None):
+    with open_audio(file_path) as source:
+        sample_rate, frames = source.sample_rate, source.frames
+        duration = frames / sample_rate
+        section_frames = int(SECTION_SECONDS * sample_rate)
+        if duration <= FULL_SCAN_SECONDS:
+            regions = [(0, frames)]
+        else:
+            starts = np.linspace(0, frames - section_frames, EXCERPTS).astype(int)
+            regions = [(int(start), int(start) + section_frames) for start in starts]
+
+        sections = []
+        for index, (start, stop) in enumerate(regions):
+            onsets = OnsetEnvelope()
+            for block in resampled_blocks(source, start, stop):
+                onsets.add(block)
+            envelope = onsets.finish()
+            step = int(SECTION_SECONDS * FRAME_RATE)
+            for offset in range(0, max(1, len(envelope)), step):
+                part = envelope[offset:offset + step]
+                # a short remainder is measured together with the section before it
+                if offset and len(part) < step // 2:
+                    sections[-1] = section(sections[-1]["start"], stop / sample_rate,
+                                           envelope[offset - step:])
+                    break
+                section_start = start / sample_rate + offset / FRAME_RATE
+                sections.append(section(section_start, min(stop / sample_rate, section_start + SECTION_SECONDS),
+                                        part))
+            if progress is not None:
+                progress((index + 1) / len(regions))
+
+    bpm, confidence = combine_sections(sections)
+    return {"bpm": bpm, "confidence": confidence, "sections": sections, "method": "fast"}
+
+
+def format_time(seconds):
+    seconds = int(round(seconds))
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+# readable lines for the output log. sections are listed when their tempos differ.
+def describe_tempo(estimate):
+    method = "fast estimate" if estimate["method"] == "fast" else "full beat tracking"
+    lines = [f"Detected BPM: {estimate['bpm']:.2f} ({method}, confidence {estimate['confidence']:.2f})"]
+    tempos = [item["bpm"] for item in estimate["sections"] if item["bpm"] is not None]
+    if len(tempos) > 1 and max(tempos) - min(tempos) > AGREEMENT_TOLERANCE * min(tempos):
+        lines.append("Tempo by section: " + ", ".join(
+            f"{format_time(item['start'])}-{format_time(item['end'])} "
+            + (f"{item['bpm']:.1f}" if item["bpm"] is not None else "?") for item in estimate["sections"]))
+    return lines
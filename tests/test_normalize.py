@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+import audio_tools
+
+SAMPLE_RATE = 44100
+
+
+# a quiet stereo tone with loud noise hits four times a second: about 20 dB of crest factor, so
+# reaching -14 LUFS takes several dB more gain than the peaks leave room for
+@pytest.fixture
+def high_crest_file(tmp_path):
+    rng = np.random.default_rng(3)
+    n = np.arange(8 * SAMPLE_RATE)
+    data = 0.1 * np.sin(2 * np.pi * 220.0 * n / SAMPLE_RATE)[:, np.newaxis] * np.ones((1, 2))
+    hit = 0.9 * np.exp(-np.arange(600) / 80.0)[:, np.newaxis]
+    for start in range(0, len(n), SAMPLE_RATE // 4):
+        data[start:start + 600] += hit * rng.standard_normal((600, 2))
+    path = str(tmp_path / "crest.wav")
+    sf.write(path, np.clip(data, -1.0, 1.0), SAMPLE_RATE, subtype="PCM_24")
+    return path
+
+
+def measure(path):
+    data, sample_rate = sf.read(path, always_2d=True)
+    stats = audio_tools.measure_loudness(data, sample_rate)
+    return stats["lufs"], audio_tools.to_db(stats["true_peak"])
+
+
+@pytest.mark.parametrize("block_size", [None, 20000], ids=["in-memory", "streaming"])
+@pytest.mark.parametrize("precision", ["float64", "float32"])
+def test_lufs_target_reached_under_true_peak_ceiling(tmp_path, high_crest_file, block_size, precision):
+    lufs, true_peak = measure(high_crest_file)
+    # without limiting the gain to -14 LUFS would put the true peak far above -1 dBTP
+    assert true_peak + (-14.0 - lufs) > 3.0
+
+    output = str(tmp_path / "normalized.wav")
+    message = audio_tools.normalize_audio(high_crest_file, output, mode="lufs", target=-14.0, true_peak_ceiling=-1.0,
+                                          block_size=block_size, precision=precision)
+    assert "Warning" not in message and not message.startswith("Error")
+    lufs, true_peak = measure(output)
+    assert abs(lufs + 14.0) <= 0.1
+    assert true_peak <= -1.0
+
+
+def test_limiter_keeps_length_and_leaves_quiet_audio_alone():
+    rng = np.random.default_rng(5)
+    data = 0.1 * rng.standard_normal((50000, 2))
+    limited = audio_tools.limit_buffer(data, SAMPLE_RATE, -1.0)
+    assert limited.shape == data.shape
+    np.testing.assert_allclose(limited, data, atol=1e-12)
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+import audio_io
+import audio_tools
+from audio_io import AudioWriter, read_audio, PRECISION_BOUND_DB, PRECISION_CHECKS
+
+SAMPLE_RATE = 44100
+
+
+# two seconds of stereo tone, clicks and noise with a silent gap, on the 16-bit grid
+@pytest.fixture(scope="module")
+def signal_buffer():
+    rng = np.random.default_rng(7)
+    n = np.arange(2 * SAMPLE_RATE)
+    mono = 0.2 * np.sin(2 * np.pi * 220.0 * n / SAMPLE_RATE)
+    mono[n % (SAMPLE_RATE // 2) < 200] += 0.5
+    data = mono[:, np.newaxis] + 0.02 * rng.standard_normal((len(n), 2))
+    data[SAMPLE_RATE // 2:SAMPLE_RATE] = 0.0
+    return np.round(np.clip(data, -1.0, 1.0) * 32767) / 32768
+
+
+@pytest.fixture
+def wav_file(tmp_path, signal_buffer):
+    path = str(tmp_path / "input.wav")
+    sf.write(path, signal_buffer, SAMPLE_RATE, subtype="PCM_16")
+    return path
+
+
+def difference_db(a, b):
+    difference = float(np.max(np.abs(a - b))) if a.size else 0.0
+    return 20 * np.log10(difference) if difference > 0 else float("-inf")
+
+
+@pytest.mark.parametrize("name, params", PRECISION_CHECKS, ids=lambda value: str(value))
+def test_float32_stays_within_bound(signal_buffer, name, params):
+    operation = audio_tools.CHAIN_OPERATIONS[name]
+    reference = operation(signal_buffer, SAMPLE_RATE, **params)
+    result = operation(signal_buffer.astype(np.float32), SAMPLE_RATE, **params)
+    assert result.dtype == np.float32
+    assert result.shape == reference.shape
+    assert difference_db(result, reference) <= PRECISION_BOUND_DB
+
+
+def test_float32_file_differs_by_dither_only(tmp_path, wav_file):
+    assert audio_tools.apply_equalizer(wav_file, str(tmp_path / "64.wav")).startswith("Equalized")
+    assert audio_tools.apply_equalizer(wav_file, str(tmp_path / "32.wav"), precision="float32").startswith("Equalized")
+    reference, _ = read_audio(str(tmp_path / "64.wav"))
+    result, _ = read_audio(str(tmp_path / "32.wav"))
+    # TPDF dither moves a sample by at most two 16-bit steps
+    assert np.max(np.abs(result - reference)) * 32768 <= 2
+
+
+def test_float32_streaming_matches_in_memory(tmp_path, wav_file):
+    audio_tools.bass_boost(wav_file, str(tmp_path / "memory.wav"), precision="float32")
+    audio_tools.bass_boost(wav_file, str(tmp_path / "stream.wav"), block_size=4096, precision="float32")
+    memory, _ = read_audio(str(tmp_path / "memory.wav"))
+    stream, _ = read_audio(str(tmp_path / "stream.wav"))
+    assert np.max(np.abs(memory - stream)) * 32768 <= 2
+
+
+def test_dithered_output_is_deterministic(tmp_path, signal_buffer):
+    block = signal_buffer.astype(np.float32)
+    paths = [str(tmp_path / f"{index}.wav") for index in range(2)]
+    for path in paths:
+        with AudioWriter(path, SAMPLE_RATE, 2, "PCM_16", dither=True) as writer:
+            writer.write(block[:SAMPLE_RATE])
+            writer.write(block[SAMPLE_RATE:])
+    first, second = (sf.read(path, dtype="int16")[0] for path in paths)
+    assert np.array_equal(first, second)
+
+    undithered = str(tmp_path / "undithered.wav")
+    with AudioWriter(undithered, SAMPLE_RATE, 2, "PCM_16") as writer:
+        writer.write(block)
+    assert not np.array_equal(first, sf.read(undithered, dtype="int16")[0])
+
+
+def test_dither_follows_seed(tmp_path, signal_buffer, monkeypatch):
+    block = signal_buffer.astype(np.float32)
+    outputs = []
+    for seed in (audio_io.DITHER_SEED, audio_io.DITHER_SEED + 1):
+        monkeypatch.setattr(audio_io, "DITHER_SEED", seed)
+        path = str(tmp_path / f"seed_{seed}.wav")
+        with AudioWriter(path, SAMPLE_RATE, 2, "PCM_16", dither=True) as writer:
+            writer.write(block)
+        outputs.append(sf.read(path, dtype="int16")[0])
+    assert not np.array_equal(outputs[0], outputs[1])
+
+
+def test_float_output_is_not_dithered(tmp_path, signal_buffer):
+    block = signal_buffer.astype(np.float32)
+    path = str(tmp_path / "float.wav")
+    with AudioWriter(path, SAMPLE_RATE, 2, "FLOAT", dither=True) as writer:
+        writer.write(block)
+    assert np.array_equal(sf.read(path, dtype="float32")[0], block)